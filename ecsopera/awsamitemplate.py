@@ -0,0 +1,142 @@
+# pylint: disable=C0111,C0103,R0902,R0913
+from botocore.exceptions import ClientError, WaiterError
+from ecsopera.awsamiupdate import AWSECSAmiUpdate
+from ecsopera.awsasgindex import launch_template_name
+from ecsopera.awsclients import client_registry
+from ecsopera.raiseexception import exception_handler
+
+
+class AWSECSAmiTemplateUpdate(AWSECSAmiUpdate):
+    """
+    A class to assist with updating the AMI of ASGs launched from an EC2
+    launch template. The new AMI is published as a new template version
+    and the new ASGs are pinned to it, so no launch configuration is
+    copied or deleted. A failed rollout is rolled back by restoring the
+    old default version and the old ASGs' capacity, see rollback.
+    """
+
+    asgsource = staticmethod(launch_template_name)
+
+    def __init__(self, akey, skey, ami, cluster, ltname, timeout, log,
+                 **kwargs):
+        super(AWSECSAmiTemplateUpdate, self).__init__(akey, skey, ami,
+                                                      cluster, ltname,
+                                                      timeout, log, **kwargs)
+        created = self.journal.get('template-version-created')
+        self.newversion = created['version'] if created else None
+
+    @property
+    def oldversion(self):
+        return self.currentlc['VersionNumber']
+
+    @exception_handler(errors=(ClientError, IndexError, KeyError))
+    def get_asg_launch_conf(self):
+        """Return the default version of the launch template."""
+        return self.client('ec2').describe_launch_template_versions(
+            LaunchTemplateName=self._lcname,
+            Versions=['$Default'])['LaunchTemplateVersions'][0]
+
+    def copy_launch_conf(self):
+        """Launch templates are versioned, so nothing is copied."""
+        return None
+
+    def launch_source(self):
+        """Return the launch parameters new ASGs are created with."""
+        return {'LaunchTemplate': {'LaunchTemplateName': self._lcname,
+                                   'Version': str(self.newversion)}}
+
+    @exception_handler(errors=(ClientError, KeyError))
+    def create_template_version(self):
+        """Publish a new template version running the new AMI."""
+        return self.client('ec2').create_launch_template_version(
+            LaunchTemplateName=self._lcname,
+            SourceVersion=str(self.oldversion),
+            VersionDescription='ecsopera AMI update to {0}'.format(self.ami),
+            LaunchTemplateData={'ImageId': self.ami}
+        )['LaunchTemplateVersion']['VersionNumber']
+
+    @exception_handler(errors=(ClientError,))
+    def set_default_version(self, version):
+        """Make the passed version the default version of the template."""
+        return self.client('ec2').modify_launch_template(
+            LaunchTemplateName=self._lcname,
+            DefaultVersion=str(version))
+
+    @exception_handler(errors=(ClientError,))
+    def set_asg_template_version(self, asgname, version):
+        """Pin the specified ASG to the passed template version."""
+        return self.client('autoscaling').update_auto_scaling_group(
+            AutoScalingGroupName=asgname,
+            LaunchTemplate={'LaunchTemplateName': self._lcname,
+                            'Version': str(version)})
+
+    def rollback(self):
+        """
+        Switch the template and the new ASGs back to the old version and
+        scale the old ASGs back to their original capacity, replacing the
+        instances drained so far from the old version. Old container
+        instances left DRAINING are returned to ACTIVE. This is not
+        instant: the old capacity has to launch again, and the instances
+        the new ASGs launched keep running the new AMI until those ASGs
+        are removed.
+        """
+        self.set_default_version(self.oldversion)
+        for asgname in self.newasgs.values():
+            self.set_asg_template_version(asgname, self.oldversion)
+        existing = self.get_existing_asg_names(
+            [asg['AutoScalingGroupName'] for asg in self.currentasgs])
+        for asg in self.currentasgs:
+            asgname = asg['AutoScalingGroupName']
+            if asgname not in existing:
+                continue
+            if asg.get('LaunchTemplate', {}).get('Version') == '$Latest':
+                self.set_asg_template_version(asgname, self.oldversion)
+            self.set_asg_capacity(asgname, minsize=asg['MinSize'],
+                                  maxsize=asg['MaxSize'],
+                                  desired=asg['DesiredCapacity'])
+        reactivated = self.activate_ecs_container_instances(
+            self._remaining(self.cinstances))
+        if reactivated:
+            self.log.info('Returned {0} draining container instances to '
+                          'ACTIVE....'.format(len(reactivated)))
+        self.log.warn('Rolled back launch template {0} to version {1} and '
+                      'restored the capacity of ASGs {2}. Remove the new '
+                      'ASGs {3} once the old capacity is back....'.format(
+                          self._lcname, self.oldversion, sorted(existing),
+                          sorted(self.newasgs.values())))
+        self.journal.remove()
+
+    def ami_rollout_init(self):
+        """
+        ami_rollout_init: Call this method to perform an ami rollout to
+        defined, ECS container cluster."""
+        self.log.info('Creating AWS ECS AMI Update Job...')
+        self.log.info('Found {0} Container Instances: {1}'.format(
+            len(self.cinstances), self.cinstances))
+        self.log.info('Found the Common AMI-Images: {0}'.format(
+            self.currentamis))
+        self.log.info('Found the following ASGs to operate on: {0}'.format(
+            [i['AutoScalingGroupName'] for i in self.currentasgs]))
+        self.log.info('Found {0} instances inside corresponding ASGs'.format(
+            self.asgicount))
+        if self.newversion is None:
+            self.newversion = self.create_template_version()
+            self.journal.record('template-version-created',
+                                version=self.newversion)
+        self.log.info('Created launch template {0} version {1} from '
+                      'version {2}.....'.format(self._lcname,
+                                                self.newversion,
+                                                self.oldversion))
+        try:
+            self._replace_capacity()
+        except (SystemExit, ClientError, WaiterError):
+            self.rollback()
+            raise
+        self._step('default-version-set', self.set_default_version,
+                   self.newversion)
+        self.log.info('Set launch template {0} default version to '
+                      '{1}.....'.format(self._lcname, self.newversion))
+        self.journal.remove()
+        self.log.info('Finished AMI Updating ECS!!!!!')
+        self.log.debug('AWS client registry stats: {0}'.format(
+            client_registry.stats()))
@@ -1,46 +1,154 @@
 # pylint: disable=C0111,C0103,C1801,R0902,R0913,R0201,W0622
 import base64
+import math
+import os
 import time
 import re
-from itertools import groupby
+import uuid
+from itertools import zip_longest
 import progressbar
-import boto3
 from botocore.exceptions import ClientError
+from ecsopera.awsbatch import (paginate,
+                               batch_describe,
+                               chunked,
+                               ECS_DESCRIBE_LIMIT,
+                               ECS_INSTANCE_FILTER_LIMIT,
+                               ECS_UPDATE_STATE_LIMIT,
+                               ASG_DESCRIBE_LIMIT)
+from ecsopera.awsasgindex import ASGLaunchConfigIndex, launch_config_name
+from ecsopera.awscitracker import ContainerInstanceTracker
+from ecsopera.awsclients import client_registry
+from ecsopera.clustersnapshot import ClusterSnapshot
+from ecsopera.journal import RolloutJournal
+from ecsopera.placement import simulate_placement, task_requirements
+from ecsopera.poller import (Poller,
+                             DEFAULT_POLL_INTERVAL,
+                             DEFAULT_MAX_POLL_INTERVAL)
 from ecsopera.raiseexception import exception_handler
 
 
 class AWSECSAmiUpdate(object):
     """A class to assist with updating an AMI"""
 
-    def __init__(self, akey, skey, ami, cluster, lcname, timeout, log):
+    asgsource = staticmethod(launch_config_name)
+
+    def __init__(self, akey, skey, ami, cluster, lcname, timeout, log,
+                 asgcache=None, pollinterval=DEFAULT_POLL_INTERVAL,
+                 maxpollinterval=DEFAULT_MAX_POLL_INTERVAL, asgindex=None,
+                 region=None, rollingwave=None, journaldir='.',
+                 resume=False, placementcheck='warn'):
         self.accesskey = akey
         self.secretkey = skey
-        self.s = self.boto_session(akey, skey)
+        self.region = region
+        self.s = self.boto_session(akey, skey, region)
         self.ami = self.check_ami_id_format(ami)
         self._cluster = cluster
         self._lcname = lcname
         self._timeout = timeout
+        self.pollinterval = pollinterval
+        self.maxpollinterval = maxpollinterval
+        self.rollingwave = rollingwave
+        self.placementcheck = placementcheck
         self.log = log
+        if asgindex is None:
+            asgindex = ASGLaunchConfigIndex(self.client('autoscaling'),
+                                            cachepath=asgcache,
+                                            source=self.asgsource)
+        self.asgindex = asgindex
+        self.journal = RolloutJournal(os.path.join(
+            journaldir, self.journal_name(cluster, lcname, region)))
+        self._open_journal(resume)
         self.newamiobj = self.get_ami()
-        self.cinstances = self.get_ecs_container_instances()
-        self.ec2instances = self.get_ecs_instance_id()
+        discovered = self.journal.get('discovered')
+        if discovered is None:
+            self.snapshot = self.get_cluster_snapshot()
+            self.currentlc = self.get_asg_launch_conf()
+            self.currentasgs = self.get_asgs()
+            self.journal.record('discovered',
+                                ami=self.ami,
+                                rollingwave=self.rollingwave or 0,
+                                snapshot=self.snapshot.to_rows(),
+                                currentlc=self.currentlc,
+                                currentasgs=self.currentasgs)
+        else:
+            self._check_resume(discovered)
+            self.snapshot = ClusterSnapshot.from_rows(cluster,
+                                                      discovered['snapshot'])
+            self.currentlc = discovered['currentlc']
+            self.currentasgs = discovered['currentasgs']
+        self.cinstances = self.snapshot.cinstances
+        self.cimap = self.snapshot.cimap
+        self.ec2instances = list(self.cimap)
         self.currentamis = self.get_ecs_instance_amiid()
-        self.currentlc = self.get_asg_launch_conf()
-        self.currentasgs = self.get_asgs()
         self.asgicount = self._get_asg_instance_count()
         self.updateasgcount = 0
-        self.copiedlc = self.create_asg_launch_conf(self.currentlc,
-                                                    newlc=False,
-                                                    ami=None, itype=None)
+        planned = self.journal.get('asgs-planned')
+        self.newasgs = planned['newasgs'] if planned else {}
+        self.terminated = [e['instance']
+                           for e in self.journal.all('terminated')]
+        self.citracker = ContainerInstanceTracker(
+            self.describe_container_instances, known=self.cimap)
+        self.copiedlc = None
+        self.taskdefs = {}
         self.rdyscaled = False
         self.idrained = False
         self.newitime = 0
         self.draintime = 0
 
     @staticmethod
-    def boto_session(akey, skey):
-        return boto3.session.Session(aws_access_key_id=akey,
-                                     aws_secret_access_key=skey)
+    def journal_name(cluster, lcname, region=None):
+        """Return the journal file name of a cluster and LC rollout."""
+        name = '.ecsopera-amiupdate-{0}-{1}'.format(cluster, lcname)
+        if region:
+            name = '{0}-{1}'.format(name, region)
+        return '{0}.journal'.format(name)
+
+    def _open_journal(self, resume):
+        if resume:
+            if self.journal.load():
+                self.log.info('Resuming rollout from journal {0}, {1} '
+                              'completed steps....'.format(
+                                  self.journal.path,
+                                  len(self.journal.entries)))
+            else:
+                self.log.warn('No journal found at {0}, starting a new '
+                              'rollout....'.format(self.journal.path))
+        elif self.journal.exists():
+            self.log.error('Found the journal {0} of an unfinished rollout. '
+                           'Pass --resume to continue it or remove the '
+                           'journal....'.format(self.journal.path))
+            raise SystemExit('Job Cancelled...Exit')
+
+    def _check_resume(self, discovered):
+        """Refuse to resume a journalled rollout with other options."""
+        journalled = (discovered.get('ami'), discovered.get('rollingwave'))
+        if journalled != (self.ami, self.rollingwave or 0):
+            self.log.error('Journal {0} is of a rollout to {1} with '
+                           'rollingwave {2}, refusing to resume it to {3} '
+                           'with rollingwave {4}. Pass the journalled '
+                           'options or remove the journal....'.format(
+                               self.journal.path, journalled[0],
+                               journalled[1], self.ami,
+                               self.rollingwave or 0))
+            raise SystemExit('Job Cancelled...Exit')
+
+    def _step(self, name, func, *args):
+        """Run func unless the journal shows step name as completed."""
+        if self.journal.done(name):
+            self.log.info('Skipping completed step {0}....'.format(name))
+            return None
+        result = func(*args)
+        self.journal.record(name)
+        return result
+
+    @staticmethod
+    def boto_session(akey, skey, region=None):
+        return client_registry.session(akey, skey, region)
+
+    def client(self, service):
+        """Return the shared client for the passed service."""
+        return client_registry.client(self.accesskey, self.secretkey,
+                                      service, region=self.region)
 
     @staticmethod
     def check_ami_id_format(amiid):
@@ -80,44 +188,104 @@ class AWSECSAmiUpdate(object):
     @exception_handler(errors=(ClientError,))
     def get_ami(self):
         """Return AMI information from passed ami id list."""
-        return self.s.client('ec2').describe_images(ImageIds=[self.ami])
+        return self.client('ec2').describe_images(ImageIds=[self.ami])
 
     @exception_handler(errors=(ClientError, KeyError))
-    def get_ecs_container_instances(self):
-        """Return STATUS x container instances from ECS cluster."""
-        return self.s.client('ecs').list_container_instances(
-            cluster=self._cluster,
-            status='ACTIVE')['containerInstanceArns']
+    def get_ecs_container_instances(self, instanceids=None):
+        """
+        Return ACTIVE container instances from ECS cluster, only those of
+        the passed EC2 instance ids if any are passed.
+        """
+        if instanceids is None:
+            return list(paginate(self.client('ecs'),
+                                 'list_container_instances',
+                                 'containerInstanceArns',
+                                 cluster=self._cluster,
+                                 status='ACTIVE'))
+        arns = []
+        for chunk in chunked(sorted(instanceids), ECS_INSTANCE_FILTER_LIMIT):
+            arns.extend(paginate(self.client('ecs'),
+                                 'list_container_instances',
+                                 'containerInstanceArns',
+                                 cluster=self._cluster,
+                                 status='ACTIVE',
+                                 filter='ec2InstanceId in [{0}]'.format(
+                                     ', '.join(chunk))))
+        return arns
 
     @exception_handler(errors=(ClientError, KeyError))
-    def get_ecs_instance_id(self):
-        """Return ecs instance ids from ECS cluster."""
-        ci = self.s.client('ecs').describe_container_instances(
-            cluster=self._cluster,
-            containerInstances=self.cinstances)
-        return [i['ec2InstanceId'] for i in ci['containerInstances']]
+    def describe_container_instances(self, cinstances):
+        """Return described container instances from ECS cluster."""
+        return batch_describe(self.client('ecs').describe_container_instances,
+                              'containerInstances',
+                              cinstances,
+                              'containerInstances',
+                              ECS_DESCRIBE_LIMIT,
+                              cluster=self._cluster)
+
+    @exception_handler(errors=(ClientError, KeyError))
+    def get_service_tasks(self, cinstances):
+        """Return running service tasks placed on the passed instances."""
+        tarns = []
+        for cinstance in cinstances:
+            tarns.extend(paginate(self.client('ecs'),
+                                  'list_tasks',
+                                  'taskArns',
+                                  cluster=self._cluster,
+                                  containerInstance=cinstance,
+                                  desiredStatus='RUNNING'))
+        tasks = batch_describe(self.client('ecs').describe_tasks,
+                               'tasks',
+                               tarns,
+                               'tasks',
+                               ECS_DESCRIBE_LIMIT,
+                               cluster=self._cluster)
+        return [t for t in tasks
+                if t.get('group', '').startswith('service:')]
+
+    @exception_handler(errors=(ClientError, KeyError))
+    def get_task_definition(self, tdarn):
+        """Return the specified task definition."""
+        return self.client('ecs').describe_task_definition(
+            taskDefinition=tdarn)['taskDefinition']
+
+    @exception_handler(errors=(ClientError, KeyError))
+    def get_cluster_snapshot(self):
+        """Return a ClusterSnapshot of the ACTIVE container instances."""
+        return ClusterSnapshot.collect(self.client('ecs'), self.client('ec2'),
+                                       self._cluster)
+
+    @exception_handler(errors=(ClientError, KeyError))
+    def get_asg_instance_ids(self, asgnames):
+        """Return in service ec2 instance ids of the passed ASG names."""
+        asgs = batch_describe(
+            self.client('autoscaling').describe_auto_scaling_groups,
+            'AutoScalingGroupNames',
+            asgnames,
+            'AutoScalingGroups',
+            ASG_DESCRIBE_LIMIT)
+        return set(i['InstanceId'] for asg in asgs for i in asg['Instances']
+                   if not i['LifecycleState'].startswith('Terminat'))
 
-    @exception_handler(errors=(ClientError, IndexError, KeyError))
     def get_ecs_instance_amiid(self):
-        """Return sorted and grouped AMI ids from passed instances."""
-        res_ci = self.s.client('ec2').describe_instances(
-            InstanceIds=self.ec2instances)['Reservations']
-        instances = sum([[i for i in r['Instances']] for r in res_ci], [])
-        sorted_amis = groupby([i['ImageId'] for i in instances])
-        return [ami[0] for ami in sorted_amis]
+        """Return the sorted distinct AMI ids of the cluster instances."""
+        return self.snapshot.amis()
 
     @exception_handler(errors=(ClientError, IndexError, KeyError))
     def get_asg_launch_conf(self):
         """Return Launch Configuration object from LC name."""
-        return self.s.client('autoscaling').describe_launch_configurations(
+        return self.client('autoscaling').describe_launch_configurations(
             LaunchConfigurationNames=[self._lcname])['LaunchConfigurations'][0]
 
     @exception_handler(errors=(ClientError, KeyError))
     def get_asgs(self):
-        """Return managed ASGs that are from LC name."""
-        asgs = self.s.client('autoscaling').describe_auto_scaling_groups()['AutoScalingGroups']
-        return [asg for asg in asgs if asg['LaunchConfigurationName'] ==
-                self._lcname]
+        """
+        Return managed ASGs that are from LC name. The rollout mutates
+        them, so the ASGs of the cluster's instances are checked as well
+        to catch ASGs newly attached to a cached LC.
+        """
+        return self.asgindex.get_asgs(self._lcname,
+                                      instanceids=list(self.snapshot.cimap))
 
     @exception_handler(errors=(ClientError, KeyError))
     def create_asg_launch_conf(self, currentlc, newlc, ami, itype):
@@ -134,7 +302,7 @@ class AWSECSAmiUpdate(object):
             nitype = itype
         else:
             nitype = currentlc['InstanceType']
-        return self.s.client('autoscaling').create_launch_configuration(
+        return self.client('autoscaling').create_launch_configuration(
             LaunchConfigurationName=newlcname,
             ImageId=image,
             KeyName=currentlc['KeyName'],
@@ -145,61 +313,167 @@ class AWSECSAmiUpdate(object):
             InstanceMonitoring=currentlc['InstanceMonitoring'],
             EbsOptimized=currentlc['EbsOptimized'])
 
+    @exception_handler(errors=(ClientError, KeyError))
+    def launch_conf_exists(self, lcname):
+        """Return True if the specified LC exists."""
+        return bool(self.client('autoscaling').describe_launch_configurations(
+            LaunchConfigurationNames=[lcname])['LaunchConfigurations'])
+
+    def copy_launch_conf(self):
+        """Copy the current LC to <lcname>-copy unless already copied."""
+        if self.launch_conf_exists('{0}-copy'.format(self._lcname)):
+            return None
+        return self.create_asg_launch_conf(self.currentlc, newlc=False,
+                                           ami=None, itype=None)
+
+    def _replace_launch_conf(self):
+        if self.launch_conf_exists(self._lcname):
+            self.delete_launch_conf(self._lcname)
+        self.log.info('Deleted LC: {0}'.format(self._lcname))
+
+    def _create_new_launch_conf(self):
+        if not self.launch_conf_exists(self._lcname):
+            self.create_asg_launch_conf(self.currentlc,
+                                        newlc=True,
+                                        ami=self.ami,
+                                        itype=None)
+        self.log.info('Created new LC.....')
+
+    def _delete_copied_launch_conf(self):
+        copyname = '{0}-copy'.format(self._lcname)
+        if self.launch_conf_exists(copyname):
+            self.delete_launch_conf(copyname)
+
+    def launch_source(self):
+        """Return the launch parameters new ASGs are created with."""
+        return {'LaunchConfigurationName': self._lcname}
+
     @exception_handler(errors=(ClientError,))
     def update_asg_launch_conf(self, currentasg, lcname):
         """Update passed ASG with specified LC."""
-        return self.s.client('autoscaling').update_auto_scaling_group(
+        return self.client('autoscaling').update_auto_scaling_group(
             AutoScalingGroupName=currentasg['AutoScalingGroupName'],
             LaunchConfigurationName=lcname)
 
     @exception_handler(errors=(ClientError, KeyError))
-    def get_running_task_count(self):
+    def get_running_task_counts(self, cinstances=None):
+        """
+        Return container instance arn -> running task count in passed
+        cluster and container instances.
+        """
+        if cinstances is None:
+            cinstances = self.cinstances
+        rinstances = batch_describe(
+            self.client('ecs').describe_container_instances,
+            'containerInstances',
+            cinstances,
+            'containerInstances',
+            ECS_DESCRIBE_LIMIT,
+            cluster=self._cluster)
+        return dict((i['containerInstanceArn'], i['runningTasksCount'])
+                    for i in rinstances)
+
+    def get_running_task_count(self, cinstances=None):
         """
         Return running task count in passed cluster and container instances.
         """
-        rinstances = self.s.client('ecs').describe_container_instances(
-            cluster=self._cluster,
-            containerInstances=self.cinstances)['containerInstances']
-        rtask_count = 0
-        for i in rinstances:
-            rtask_count += i['runningTasksCount']
-        return rtask_count
+        return sum(self.get_running_task_counts(cinstances).values())
+
+    @staticmethod
+    def new_asg_name():
+        """Return a unique name for a new ASG."""
+        return 'ASG-{0}-{1}'.format(int(time.time()), uuid.uuid4().hex[:8])
 
     @exception_handler(errors=(ClientError,))
-    def create_asg(self, currentasg):
-        """Create ASG based on passed current ASG parameters and LC name."""
-        return self.s.client('autoscaling').create_auto_scaling_group(
-            AutoScalingGroupName='ASG-{0}'.format(int(time.time())),
-            LaunchConfigurationName=self._lcname,
-            MinSize=currentasg['MinSize'],
+    def create_asg(self, currentasg, asgname=None, desired=None):
+        """
+        Create ASG based on passed current ASG parameters and LC name,
+        optionally starting at desired capacity with a MinSize of 0.
+        """
+        if asgname is None:
+            asgname = self.new_asg_name()
+        if desired is None:
+            minsize = currentasg['MinSize']
+            desired = currentasg['DesiredCapacity']
+        else:
+            minsize = 0
+        return self.client('autoscaling').create_auto_scaling_group(
+            AutoScalingGroupName=asgname,
+            MinSize=minsize,
             MaxSize=currentasg['MaxSize'],
-            DesiredCapacity=currentasg['DesiredCapacity'],
+            DesiredCapacity=desired,
             VPCZoneIdentifier=currentasg['VPCZoneIdentifier'],
-            HealthCheckGracePeriod=currentasg['HealthCheckGracePeriod'])
+            HealthCheckGracePeriod=currentasg['HealthCheckGracePeriod'],
+            **self.launch_source())
+
+    @exception_handler(errors=(ClientError,))
+    def set_asg_capacity(self, asgname, minsize=None, maxsize=None,
+                         desired=None):
+        """Update the passed capacity settings of the specified ASG."""
+        capacity = {}
+        if minsize is not None:
+            capacity['MinSize'] = minsize
+        if maxsize is not None:
+            capacity['MaxSize'] = maxsize
+        if desired is not None:
+            capacity['DesiredCapacity'] = desired
+        return self.client('autoscaling').update_auto_scaling_group(
+            AutoScalingGroupName=asgname, **capacity)
+
+    @exception_handler(errors=(ClientError,))
+    def terminate_asg_instance(self, instanceid):
+        """Terminate the specified ASG instance, shrinking its ASG."""
+        asclient = self.client('autoscaling')
+        return asclient.terminate_instance_in_auto_scaling_group(
+            InstanceId=instanceid,
+            ShouldDecrementDesiredCapacity=True)
 
     @exception_handler(errors=(ClientError,))
     def delete_asg(self, asgname):
         """Delete specified ASG."""
-        return self.s.client('autoscaling').delete_auto_scaling_group(
+        return self.client('autoscaling').delete_auto_scaling_group(
             AutoScalingGroupName=asgname,
             ForceDelete=True)
 
     @exception_handler(errors=(ClientError,))
     def delete_launch_conf(self, lcname):
         """Delete specified LC."""
-        return self.s.client('autoscaling').delete_launch_configuration(
+        return self.client('autoscaling').delete_launch_configuration(
             LaunchConfigurationName=lcname)
 
-    @exception_handler(errors=(ClientError,))
-    def drain_ecs_container_instances(self):
+    @exception_handler(errors=(ClientError, KeyError))
+    def drain_ecs_container_instances(self, cinstances=None):
         """
         Drains container instances specified by passed container instances.
         """
-        return self.s.client('ecs').update_container_instances_state(
+        if cinstances is None:
+            cinstances = self.cinstances
+        return batch_describe(
+            self.client('ecs').update_container_instances_state,
+            'containerInstances',
+            cinstances,
+            'containerInstances',
+            ECS_UPDATE_STATE_LIMIT,
             cluster=self._cluster,
-            containerInstances=self.cinstances,
             status='DRAINING')
 
+    def activate_ecs_container_instances(self, cinstances):
+        """
+        Returns draining container instances specified by passed container
+        instances to ACTIVE.
+        """
+        draining = [ci['containerInstanceArn']
+                    for ci in self.describe_container_instances(cinstances)
+                    if ci['status'] == 'DRAINING']
+        batch_describe(self.client('ecs').update_container_instances_state,
+                       'containerInstances',
+                       draining,
+                       'containerInstances',
+                       ECS_UPDATE_STATE_LIMIT,
+                       cluster=self._cluster,
+                       status='ACTIVE')
+        return draining
+
     def _get_asg_instance_count(self):
         asg_i_count = 0
         for asg in self.currentasgs:
@@ -211,48 +485,291 @@ class AWSECSAmiUpdate(object):
             self.update_asg_launch_conf(asg, '{0}-copy'.format(self._lcname))
             self.updateasgcount += 1
 
-    def _upscale_asgs(self):
+    @exception_handler(errors=(ClientError, KeyError))
+    def get_existing_asg_names(self, asgnames):
+        """Return the passed ASG names that exist."""
+        asgs = batch_describe(
+            self.client('autoscaling').describe_auto_scaling_groups,
+            'AutoScalingGroupNames',
+            asgnames,
+            'AutoScalingGroups',
+            ASG_DESCRIBE_LIMIT)
+        return set(asg['AutoScalingGroupName'] for asg in asgs)
+
+    def _create_new_asgs(self, desired=None):
+        """
+        Create a new ASG per current ASG. The new names are journalled
+        before creation so a resumed rollout only creates missing ASGs.
+        """
+        if not self.newasgs:
+            for asg in self.currentasgs:
+                self.newasgs[asg['AutoScalingGroupName']] = (
+                    self.new_asg_name())
+            self.journal.record('asgs-planned', newasgs=self.newasgs)
+        existing = self.get_existing_asg_names(list(self.newasgs.values()))
         for asg in self.currentasgs:
-            self.create_asg(asg)
+            asgname = self.newasgs[asg['AutoScalingGroupName']]
+            if asgname not in existing:
+                self.create_asg(asg, asgname=asgname, desired=desired)
+        self.asgindex.invalidate(self._lcname)
+
+    def _upscale_asgs(self):
+        self._create_new_asgs()
 
-    def _poll_new_cinstances(self):
+    def _poller(self):
+        return Poller(self._timeout,
+                      interval=self.pollinterval,
+                      maxinterval=self.maxpollinterval)
+
+    def _poll_new_cinstances(self, expected=None):
+        """
+        _poll_new_cinstances: Internal method that waits until expected
+        instances of the new ASGs are registered as ACTIVE container
+        instances with a connected agent. Only the container instances of
+        the new ASG instances are listed, with an ec2InstanceId cluster
+        query filter, so unrelated scale events in the cluster are ignored
+        and each poll costs the same whatever the cluster size.
+        """
         scale_bar = progressbar.ProgressBar(
             max_value=progressbar.UnknownLength)
-        while not self.rdyscaled:
-            if self.newitime >= self._timeout:
-                return False
-            sinstances = self.get_ecs_container_instances()
-            if len(self.cinstances) * 2 == len(sinstances):
-                self.rdyscaled = True
-                return True
-            scale_bar.update(self.newitime)
-            self.log.info("Polling ECS Cluster For New Container Instances"
-                          ".....")
-            self.newitime += 5
-            time.sleep(5)
-
-    def _drain_old_cinstances(self):
+        if expected is None:
+            expected = sum(asg['DesiredCapacity'] for asg in self.currentasgs)
+        newasgs = list(self.newasgs.values())
+        ready = set()
+
+        def _scaled():
+            members = self.get_asg_instance_ids(newasgs)
+            ready.clear()
+            ready.update(self.citracker.refresh(
+                self.get_ecs_container_instances(members), members))
+            return len(ready) >= expected
+
+        def _tick(elapsed):
+            self.newitime = elapsed
+            scale_bar.update(int(elapsed))
+            self.log.info("Polling ECS Cluster For New Container Instances, "
+                          "{0} of {1} ready.....".format(len(ready), expected))
+
+        self.rdyscaled = self._poller().poll(_scaled, ontick=_tick)
+        return self.rdyscaled
+
+    def _check_placement(self, cinstances):
+        """
+        _check_placement: Internal method that simulates placing the
+        service tasks of the container instances about to be drained onto
+        the rest of the ACTIVE fleet, warning or refusing to drain when
+        they will not fit. In rolling mode the fleet is limited to the new
+        ASG instances, as the old ones are drained in later waves. Service
+        tasks are listed afresh for each wave as ECS may have moved them
+        since, while task definitions are fetched once per rollout.
+        """
+        if self.placementcheck == 'off':
+            return True
+        draining = set(cinstances)
+        active = [arn for arn in self.get_ecs_container_instances()
+                  if arn not in draining]
+        fleet = [ci for ci in self.describe_container_instances(active)
+                 if ci['status'] == 'ACTIVE']
+        if self.rollingwave:
+            members = self.get_asg_instance_ids(list(self.newasgs.values()))
+            fleet = [ci for ci in fleet if ci.get('ec2InstanceId') in members]
+        tasks = self.get_service_tasks(cinstances)
+        for tdarn in set(t['taskDefinitionArn'] for t in tasks):
+            if tdarn not in self.taskdefs:
+                self.taskdefs[tdarn] = task_requirements(
+                    self.get_task_definition(tdarn))
+        plan = simulate_placement(fleet,
+                                  [self.taskdefs[t['taskDefinitionArn']]
+                                   for t in tasks])
+        self.log.info('Placement check: {0} service tasks to move onto {1} '
+                      'container instances with {2} CPU units and {3} MiB '
+                      'free....'.format(len(tasks), plan.fleetsize,
+                                        plan.cpu, plan.memory))
+        if plan.fits:
+            return True
+        for (cpu, memory, ports), count in sorted(plan.unplaced.items()):
+            self.log.warn('{0} tasks needing {1} CPU units, {2} MiB and '
+                          'host ports {3} will not fit....'.format(
+                              count, cpu, memory, list(ports)))
+        if self.placementcheck == 'refuse':
+            self.log.error('New container instances cannot absorb {0} of {1} '
+                           'drained service tasks. Refusing to '
+                           'drain....'.format(plan.unplaced_count,
+                                              len(tasks)))
+            raise SystemExit('Job Cancelled...Exit')
+        self.log.warn('New container instances cannot absorb {0} of {1} '
+                      'drained service tasks, draining anyway....'.format(
+                          plan.unplaced_count, len(tasks)))
+        return False
+
+    def _remaining(self, cinstances):
+        """Return the passed container instances not yet terminated."""
+        terminated = set(self.cimap.get(iid) for iid in self.terminated)
+        return [arn for arn in cinstances if arn not in terminated]
+
+    def _asg_instance_ids(self):
+        return set(i['InstanceId'] for asg in self.currentasgs
+                   for i in asg['Instances'])
+
+    def _drain_old_cinstances(self, cinstances=None):
+        """
+        _drain_old_cinstances: Internal method that tracks the drain state of
+        every passed container instance, terminating each ASG managed
+        instance from its ASG as soon as it has no running tasks.
+        """
         drain_bar = progressbar.ProgressBar(
             max_value=progressbar.UnknownLength)
         self.log.info('Draining Existing Container Instances.....')
-        while not self.idrained:
-            if self.draintime >= self._timeout:
-                return False
-            dinstances = self.get_running_task_count()
-            if dinstances == 0:
-                self.idrained = True
-                self.log.info("Drained Instances Tasks Have Been Shifted"
-                              "....Finishing....")
-                return True
-            drain_bar.update(self.draintime)
-            self.log.info('Draining Container Instances.....')
-            self.draintime += 5
-            time.sleep(5)
+        if cinstances is None:
+            cinstances = self.cinstances
+        pending = set(self._remaining(cinstances))
+        arnmap = dict((arn, iid) for iid, arn in self.cimap.items())
+        asgmembers = self._asg_instance_ids()
+
+        def _drained():
+            counts = self.get_running_task_counts(sorted(pending))
+            pending.intersection_update(counts)
+            for arn, rcount in counts.items():
+                if rcount != 0:
+                    continue
+                pending.discard(arn)
+                iid = arnmap.get(arn)
+                if iid in asgmembers:
+                    self.terminate_asg_instance(iid)
+                    self.terminated.append(iid)
+                    self.journal.record('terminated', instance=iid)
+                    self.log.info('Container instance {0} drained, '
+                                  'terminated....'.format(iid or arn))
+                else:
+                    self.log.info('Container instance {0} drained, not ASG '
+                                  'managed so left running....'.format(
+                                      iid or arn))
+            return not pending
+
+        def _tick(elapsed):
+            self.draintime = elapsed
+            drain_bar.update(int(elapsed))
+            self.log.info('Draining Container Instances, {0} of {1} '
+                          'drained.....'.format(len(cinstances) -
+                                                len(pending),
+                                                len(cinstances)))
+
+        self.idrained = self._poller().poll(_drained, ontick=_tick)
+        if self.idrained:
+            self.log.info("Drained Instances Tasks Have Been Shifted"
+                          "....Finishing....")
+        return self.idrained
 
     def _delete_old_asgs(self):
         for asg in self.currentasgs:
             self.delete_asg(asg['AutoScalingGroupName'])
 
+    def _plan_waves(self):
+        """
+        Split the ASG managed container instances into waves of
+        rollingwave percent, interleaving ASGs so each wave is spread
+        across them. Returns lists of (asg name, ec2 instance id).
+        """
+        members = [[(asg['AutoScalingGroupName'], i['InstanceId'])
+                    for i in asg['Instances'] if i['InstanceId'] in self.cimap]
+                   for asg in self.currentasgs]
+        ordered = [m for ms in zip_longest(*members) for m in ms
+                   if m is not None]
+        size = max(1, int(math.ceil(len(ordered) *
+                                    self.rollingwave / 100.0)))
+        return [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+    def _full_rollout(self):
+        self.log.info('Doubling Up ASG count.....')
+        self._step('asgs-created', self._upscale_asgs)
+        self._step('old-drained', self._drain_old_asgs)
+        self._step('old-asgs-deleted', self._delete_old_asgs)
+
+    def _drain_old_asgs(self):
+        """
+        _drain_old_asgs: Internal method that waits for the doubled up
+        capacity, then drains the old ASG container instances onto it.
+        """
+        if not self._poll_new_cinstances():
+            self.log.error("Timeout reached on checking for healthy running"
+                           "container instances. Rollback needed....")
+            raise SystemExit('Job Cancelled...Exit')
+        self.log.info('New Member Container Instances Found....Finishing...')
+        for asg in self.currentasgs:
+            self.set_asg_capacity(asg['AutoScalingGroupName'], minsize=0)
+        self._check_placement(self._remaining(self.cinstances))
+        self.drain_ecs_container_instances(self._remaining(self.cinstances))
+        if not self._drain_old_cinstances():
+            self.log.error("Timeout reached on draining running tasks on old"
+                           "instances. Rollback needed....")
+            raise SystemExit('Job Cancelled...Exit')
+
+    def _rolling_rollout(self):
+        """
+        _rolling_rollout: Internal method that replaces capacity in waves.
+        Each wave scales the new ASGs up by the wave size, waits for the new
+        container instances, then drains and terminates the matching old
+        instances, bounding peak capacity to one extra wave.
+        """
+        if not self.journal.done('asgs-created'):
+            self._create_new_asgs(desired=0)
+            for asg in self.currentasgs:
+                self.set_asg_capacity(asg['AutoScalingGroupName'], minsize=0)
+            self.journal.record('asgs-created')
+        waves = self._plan_waves()
+        completed = set(e['wave'] for e in self.journal.all('wave'))
+        unmanaged = len(self.cinstances) - sum(len(w) for w in waves)
+        if unmanaged:
+            self.log.warn('{0} container instances are not in the managed '
+                          'ASGs and will not be replaced....'.format(
+                              unmanaged))
+        added = dict((name, 0) for name in self.newasgs.values())
+        replaced = 0
+        for i, wave in enumerate(waves):
+            self.log.info('Starting wave {0} of {1}: replacing {2} '
+                          'instances.....'.format(i + 1, len(waves),
+                                                  len(wave)))
+            for oldname, _ in wave:
+                added[self.newasgs[oldname]] += 1
+            if i in completed:
+                replaced += len(wave)
+                self.log.info('Skipping completed wave {0}....'.format(i + 1))
+                continue
+            for name, desired in added.items():
+                self.set_asg_capacity(name, desired=desired)
+            if not self._poll_new_cinstances(replaced + len(wave)):
+                self.log.error("Timeout reached on checking for healthy "
+                               "running container instances in wave {0}. "
+                               "Rollback needed....".format(i + 1))
+                raise SystemExit('Job Cancelled...Exit')
+            winstances = self._remaining([self.cimap[iid]
+                                          for _, iid in wave])
+            self._check_placement(winstances)
+            self.drain_ecs_container_instances(winstances)
+            if not self._drain_old_cinstances(winstances):
+                self.log.error("Timeout reached on draining running tasks "
+                               "on old instances in wave {0}. Rollback "
+                               "needed....".format(i + 1))
+                raise SystemExit('Job Cancelled...Exit')
+            replaced += len(wave)
+            self.journal.record('wave', wave=i)
+            self.log.info('Finished wave {0}, replaced {1} of {2} '
+                          'instances.....'.format(i + 1, replaced,
+                                                  len(self.cimap)))
+        for asg in self.currentasgs:
+            self.set_asg_capacity(self.newasgs[asg['AutoScalingGroupName']],
+                                  minsize=asg['MinSize'],
+                                  maxsize=asg['MaxSize'],
+                                  desired=asg['DesiredCapacity'])
+        self._step('old-asgs-deleted', self._delete_old_asgs)
+
+    def _replace_capacity(self):
+        if self.rollingwave:
+            self._rolling_rollout()
+        else:
+            self._full_rollout()
+        self.log.info('In process of deleting old ASG container instances....')
+
     def ami_rollout_init(self):
         """
         ami_rollout_init: Call this method to perform an ami rollout to
@@ -264,33 +781,19 @@ class AWSECSAmiUpdate(object):
             self.currentamis))
         self.log.info('Found the following ASGs to operate on: {0}'.format(
             [i['AutoScalingGroupName'] for i in self.currentasgs]))
-        self.log.info('Copied Launch Configuration {0}...'.format(
-            self.currentlc))
         self.log.info('Found {0} instances inside corresponding ASGs'.format(
             self.asgicount))
-        self._update_asg_lconf()
+        self.copiedlc = self._step('lc-copied', self.copy_launch_conf)
+        self.log.info('Copied Launch Configuration {0}...'.format(
+            self.currentlc))
+        self._step('asgs-repointed', self._update_asg_lconf)
         self.log.info('Updated {0} ASGs with copied LC.....'.format(
             self.updateasgcount))
-        self.delete_launch_conf(self._lcname)
-        self.log.info('Deleted LC: {0}'.format(self._lcname))
-        self.create_asg_launch_conf(self.currentlc,
-                                    newlc=True,
-                                    ami=self.ami,
-                                    itype=None)
-        self.log.info('Created new LC.....')
-        self.log.info('Doubling Up ASG count.....')
-        self._upscale_asgs()
-        if not self._poll_new_cinstances():
-            self.log.error("Timeout reached on checking for healthy running"
-                           "container instances. Rollback needed....")
-            raise SystemExit('Job Cancelled...Exit')
-        self.log.info('New Member Container Instances Found....Finishing...')
-        self.drain_ecs_container_instances()
-        if not self._drain_old_cinstances():
-            self.log.error("Timeout reached on draining running tasks on old"
-                           "instances. Rollback needed....")
-            raise SystemExit('Job Cancelled...Exit')
-        self._delete_old_asgs()
-        self.log.info('In process of deleting old ASG container instances....')
-        self.delete_launch_conf('{0}-copy'.format(self._lcname))
+        self._step('lc-deleted', self._replace_launch_conf)
+        self._step('lc-created', self._create_new_launch_conf)
+        self._replace_capacity()
+        self._step('copy-lc-deleted', self._delete_copied_launch_conf)
+        self.journal.remove()
         self.log.info('Finished AMI Updating ECS!!!!!')
+        self.log.debug('AWS client registry stats: {0}'.format(
+            client_registry.stats()))
@@ -0,0 +1,172 @@
+# pylint: disable=C0111,C0103,R0913
+import json
+import os
+import threading
+import time
+from ecsopera.awsbatch import (chunked,
+                               ASG_DESCRIBE_LIMIT,
+                               ASG_INSTANCE_DESCRIBE_LIMIT)
+
+# The autoscaling api does not accept more than 100 records per page.
+ASG_PAGE_SIZE = 100
+
+
+def launch_config_name(asg):
+    """Return the launch configuration name an ASG launches from."""
+    return asg.get('LaunchConfigurationName')
+
+
+def launch_template_name(asg):
+    """Return the launch template name an ASG launches from."""
+    return asg.get('LaunchTemplate', {}).get('LaunchTemplateName')
+
+
+class ASGLaunchConfigIndex(object):
+    """
+    A launch configuration name -> ASG name index.
+
+    describe_auto_scaling_groups can only filter by ASG name or tags, so the
+    index is built from a single paginated scan that keeps nothing but
+    the names, and matching ASGs are streamed back page by page. Once
+    built, ASGs are resolved by name so lookups only fetch the groups that
+    matter. The index can optionally be persisted to cachepath and is
+    reused until ttl seconds old or until a cached entry no longer
+    matches. A cached entry cannot reveal ASGs newly attached to an LC, so
+    callers about to mutate ASGs pass the EC2 instance ids they manage:
+    the ASGs of those instances are looked up with
+    describe_auto_scaling_instances and checked alongside the cached
+    names, and newly attached ones are added to the index without a scan.
+    get_asgs and invalidate are safe to share across threads. Pass
+    source=launch_template_name to index ASGs by launch template.
+    """
+
+    def __init__(self, client, cachepath=None, ttl=900,
+                 source=launch_config_name):
+        self.client = client
+        self.cachepath = cachepath
+        self.ttl = ttl
+        self.source = source
+        self.index = None
+        self.created = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if self.cachepath is None or not os.path.exists(self.cachepath):
+            return
+        try:
+            with open(self.cachepath) as f:
+                cache = json.load(f)
+            created = cache['created']
+            index = cache['index']
+        except (ValueError, KeyError, OSError):
+            return
+        if time.time() - created < self.ttl:
+            self.index = index
+            self.created = created
+
+    def _save(self):
+        if self.cachepath is None or self.index is None:
+            return
+        tmppath = '{0}.tmp'.format(self.cachepath)
+        with open(tmppath, 'w') as f:
+            json.dump({'created': self.created, 'index': self.index}, f)
+        os.replace(tmppath, self.cachepath)
+
+    def invalidate(self, lcname=None):
+        """Drop the passed LC from the index or the entire index."""
+        with self._lock:
+            if self.index is None:
+                return
+            if lcname is None:
+                self.index = None
+                if (self.cachepath is not None and
+                        os.path.exists(self.cachepath)):
+                    os.remove(self.cachepath)
+            else:
+                self.index.pop(lcname, None)
+                self._save()
+
+    def _iter_scan(self, lcname):
+        """Scan every ASG once, rebuilding the index as pages stream in."""
+        index = {}
+        paginator = self.client.get_paginator('describe_auto_scaling_groups')
+        pages = paginator.paginate(
+            PaginationConfig={'PageSize': ASG_PAGE_SIZE})
+        for page in pages:
+            for asg in page['AutoScalingGroups']:
+                name = self.source(asg)
+                if name is None:
+                    continue
+                index.setdefault(name, []).append(
+                    asg['AutoScalingGroupName'])
+                if name == lcname:
+                    yield asg
+        index.setdefault(lcname, [])
+        self.index = index
+        self.created = time.time()
+        self._save()
+
+    def _instance_asg_names(self, instanceids):
+        """Return the names of the ASGs the passed EC2 instances are in."""
+        names = set()
+        for chunk in chunked(sorted(instanceids),
+                             ASG_INSTANCE_DESCRIBE_LIMIT):
+            found = self.client.describe_auto_scaling_instances(
+                InstanceIds=chunk)['AutoScalingInstances']
+            names.update(i['AutoScalingGroupName'] for i in found)
+        return names
+
+    def _describe_cached(self, names, lcname, extra=()):
+        """
+        Describe cached ASG names, returning None if any are stale. The
+        extra ASG names are described too and returned if they use lcname.
+        """
+        names = list(names)
+        cached = set(names)
+        names.extend(sorted(set(extra) - cached))
+        asgs = []
+        for chunk in chunked(names, ASG_DESCRIBE_LIMIT):
+            found = self.client.describe_auto_scaling_groups(
+                AutoScalingGroupNames=chunk)['AutoScalingGroups']
+            found = dict((asg['AutoScalingGroupName'], asg) for asg in found)
+            for name in chunk:
+                asg = found.get(name)
+                matches = asg is not None and self.source(asg) == lcname
+                if name in cached and not matches:
+                    return None
+                if matches:
+                    asgs.append(asg)
+        return asgs
+
+    def iter_asgs(self, lcname, instanceids=None):
+        """
+        Yield the ASGs using the passed LC name. When instanceids are
+        passed the ASGs of those instances are checked too, so ASGs newly
+        attached to lcname are not hidden by a cached index.
+        """
+        if self.index is not None and lcname in self.index:
+            extra = ()
+            if instanceids:
+                extra = self._instance_asg_names(instanceids)
+            asgs = self._describe_cached(self.index[lcname], lcname, extra)
+            if asgs is not None:
+                names = [asg['AutoScalingGroupName'] for asg in asgs]
+                if names != self.index[lcname]:
+                    self.index[lcname] = names
+                    self._save()
+                for asg in asgs:
+                    yield asg
+                return
+        for asg in self._iter_scan(lcname):
+            yield asg
+
+    def get_asgs(self, lcname, instanceids=None):
+        """Return the ASGs using the passed LC name."""
+        with self._lock:
+            return list(self.iter_asgs(lcname, instanceids))
+
+    def get_asg_names(self, lcname, instanceids=None):
+        """Return the ASG names using the passed LC name."""
+        return [asg['AutoScalingGroupName']
+                for asg in self.get_asgs(lcname, instanceids)]
@@ -0,0 +1,50 @@
+# pylint: disable=C0111,C0103,R0913
+from concurrent.futures import ThreadPoolExecutor
+
+# Maximum number of identifiers accepted by a single describe call.
+ECS_DESCRIBE_LIMIT = 100
+ECS_SERVICES_LIMIT = 10
+ECS_UPDATE_STATE_LIMIT = 10
+EC2_DESCRIBE_LIMIT = 1000
+ASG_DESCRIBE_LIMIT = 100
+ASG_INSTANCE_DESCRIBE_LIMIT = 50
+# EC2 instance ids per ec2InstanceId in [...] cluster query filter, keeping
+# list_container_instances filter expressions well below their size limit.
+ECS_INSTANCE_FILTER_LIMIT = 50
+DEFAULT_WORKERS = 8
+
+
+def paginate(client, operation, key, **kwargs):
+    """Yield every item found under key across all pages of operation."""
+    for page in client.get_paginator(operation).paginate(**kwargs):
+        for item in page.get(key, []):
+            yield item
+
+
+def chunked(items, size):
+    """Split items into lists of at most size elements."""
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def batch_describe(call, argname, items, key, size,
+                   workers=DEFAULT_WORKERS, **kwargs):
+    """
+    Call a describe style api with items split into chunks of at most size,
+    fetching the chunks concurrently and returning the merged key results
+    in the original order.
+    """
+    chunks = chunked(items, size)
+    if not chunks:
+        return []
+
+    def _describe(chunk):
+        params = dict(kwargs)
+        params[argname] = chunk
+        return call(**params)[key]
+
+    if len(chunks) == 1:
+        return _describe(chunks[0])
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        results = pool.map(_describe, chunks)
+        return [item for result in results for item in result]
@@ -0,0 +1,50 @@
+# pylint: disable=C0111,C0103
+
+
+class ContainerInstanceTracker(object):
+    """
+    A per rollout index of EC2 instance id -> ECS container instance.
+
+    Container instance arns are listed each poll, but only arns not seen
+    before and arns of watched instances whose agent is not yet connected
+    are described, so the describe cost is proportional to cluster churn
+    rather than cluster size. Readiness is a set lookup by instance id.
+    """
+
+    def __init__(self, describe, known=None):
+        self.describe = describe
+        self.instances = {}
+        self.byinstance = {}
+        self.connected = set()
+        self.described = 0
+        for iid, arn in (known or {}).items():
+            self.instances[arn] = iid
+            self.byinstance[iid] = arn
+
+    def refresh(self, arns, watch):
+        """
+        Sync the index with the listed container instance arns and return
+        the watched EC2 instance ids that have an ACTIVE container instance
+        with a connected agent.
+        """
+        listed = set(arns)
+        for arn in [a for a in self.instances if a not in listed]:
+            iid = self.instances.pop(arn)
+            if self.byinstance.get(iid) == arn:
+                del self.byinstance[iid]
+                self.connected.discard(iid)
+        watch = set(watch)
+        stale = [self.byinstance[i] for i in watch - self.connected
+                 if i in self.byinstance]
+        pending = [a for a in arns if a not in self.instances] + stale
+        if pending:
+            for ci in self.describe(pending):
+                iid = ci['ec2InstanceId']
+                self.instances[ci['containerInstanceArn']] = iid
+                self.byinstance[iid] = ci['containerInstanceArn']
+                if ci['status'] == 'ACTIVE' and ci.get('agentConnected'):
+                    self.connected.add(iid)
+                else:
+                    self.connected.discard(iid)
+            self.described += len(pending)
+        return watch & self.connected
@@ -0,0 +1,77 @@
+# pylint: disable=C0111,C0103,R0913
+import json
+import threading
+import boto3
+from botocore.config import Config
+
+
+class AWSClientRegistry(object):
+    """
+    A process wide registry of boto3 sessions and clients.
+
+    Building a client re-runs botocore model loading and endpoint resolution
+    and opens a new HTTP connection pool, so clients are cached and shared
+    keyed by (credentials, region, service, config).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sessions = {}
+        self._clients = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _config_key(config):
+        if config is None:
+            return None
+        return json.dumps(config, sort_keys=True)
+
+    def session(self, akey, skey, region=None):
+        """Return the shared boto3 session for the passed credentials."""
+        key = (akey, skey, region)
+        with self._lock:
+            if key not in self._sessions:
+                self._sessions[key] = boto3.session.Session(
+                    aws_access_key_id=akey,
+                    aws_secret_access_key=skey,
+                    region_name=region)
+            return self._sessions[key]
+
+    def client(self, akey, skey, service, region=None, config=None):
+        """
+        Return a shared client, config is a dict of botocore Config
+        keyword arguments.
+        """
+        key = (akey, skey, region, service, self._config_key(config))
+        with self._lock:
+            if key in self._clients:
+                self.hits += 1
+                return self._clients[key]
+            self.misses += 1
+            session = self.session(akey, skey, region)
+            if config is not None:
+                client = session.client(service, config=Config(**config))
+            else:
+                client = session.client(service)
+            self._clients[key] = client
+            return client
+
+    def stats(self):
+        """Return client reuse statistics."""
+        with self._lock:
+            return {'clients': len(self._clients),
+                    'sessions': len(self._sessions),
+                    'hits': self.hits,
+                    'misses': self.misses}
+
+    def clear(self):
+        """Drop every cached session and client."""
+        with self._lock:
+            self._sessions.clear()
+            self._clients.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+client_registry = AWSClientRegistry()
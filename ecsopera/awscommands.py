@@ -1,10 +1,70 @@
 # pylint: disable=C0111,C0103,C1801,R0902,R0913,R0201,W0622
 import sys
+import yaml
 from ecsopera.awsamiupdate import AWSECSAmiUpdate
+from ecsopera.awsamitemplate import AWSECSAmiTemplateUpdate
+from ecsopera.awsasgindex import ASGLaunchConfigIndex, launch_template_name
+from ecsopera.awsclients import client_registry
 from ecsopera.awsecsdeploy import AWSECSDeploy
+from ecsopera.awsecsstatus import ECSServiceStatusScheduler
+from ecsopera.awss3cpdeploy import AWSS3CpDeploy
+from ecsopera.clustersnapshot import ClusterSnapshot
+from ecsopera.jobrunner import run_jobs, job_logger, log_job_summary
+from ecsopera.manifest import (DEFAULT_MANIFEST_WORKERS,
+                               load_manifest,
+                               run_manifest)
+from ecsopera.poller import DEFAULT_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL
+from ecsopera.s3pipeline import (MB,
+                                 DEFAULT_CONCURRENCY,
+                                 DEFAULT_MULTIPART_THRESHOLD,
+                                 DEFAULT_MULTIPART_CHUNKSIZE)
 from ecsopera.version import __version__
 
 
+def fan_out_regions(regions, log, func):
+    """
+    Run func(region, log) once per region, concurrently when more than one
+    region is passed. Each region runs in isolation with its own client
+    pool and prefixed logger.
+    """
+    if not regions:
+        regions = [None]
+    if len(regions) == 1:
+        return func(regions[0], log)
+    jobs = [(region, lambda r=region: func(r, job_logger(log, r)))
+            for region in regions]
+    results = run_jobs(jobs, len(jobs))
+    if log_job_summary(results, log):
+        raise SystemExit("Job Cancelled...Exit")
+
+
+def region_path(path, region, regions):
+    """Suffix a local cache path with the region when fanning out."""
+    if path is None or regions is None or len(regions) < 2:
+        return path
+    return '{0}.{1}'.format(path, region)
+
+
+def single_region(regions, log, reason):
+    """
+    Return the only region of regions, None if not set. Exit when more than
+    one region is passed to a command that does not fan out.
+    """
+    if regions and len(regions) > 1:
+        log.error("### {0} does not run in several regions, {1}. Pass a "
+                  "single --awsregion. Safely Exiting.... ###".format(
+                      log.cmdname.rstrip(':'), reason))
+        sys.exit(0)
+    return regions[0] if regions else None
+
+
+def ami_update_class(launchtemplate):
+    """Return the AMI update class for LC or launch template ASGs."""
+    if launchtemplate:
+        return AWSECSAmiTemplateUpdate
+    return AWSECSAmiUpdate
+
+
 def get_version(log):
     """Get ECSOpera Version."""
     log.cmdname = 'version'
@@ -12,20 +72,123 @@ def get_version(log):
     print("Version: {0}".format(__version__))
 
 
-def aws_ecs_ami_update(akey, skey, ami, cluster, lcname, timeout, log):
+def aws_ecs_ami_update(akey, skey, ami, cluster, lcname, timeout, log,
+                       asgcache=None, pollinterval=DEFAULT_POLL_INTERVAL,
+                       maxpollinterval=DEFAULT_MAX_POLL_INTERVAL,
+                       regions=None, rollingwave=None, launchtemplate=None,
+                       journaldir='.', resume=False, placementcheck='warn'):
     """AMI Update command."""
     log.cmdname = 'aws-ecs-amiupdate:'
     log.display_banner()
-    if ami is None or cluster is None or lcname is None:
-        log.error("### You have not provided a value for servicename/cluster/"
-                  "ami. Safely Exiting.... ###")
+    if ami is None or cluster is None or (lcname is None) == (
+            launchtemplate is None):
+        log.error("### You have not provided a value for cluster/ami or "
+                  "exactly one of launchcfg/launchtemplate. "
+                  "Safely Exiting.... ###")
+        sys.exit(0)
+    amiupdatecls = ami_update_class(launchtemplate)
+
+    def _update(region, rlog):
+        amiupdate = amiupdatecls(akey, skey, ami, cluster,
+                                 lcname or launchtemplate, timeout,
+                                 rlog,
+                                 asgcache=region_path(asgcache, region,
+                                                      regions),
+                                 pollinterval=pollinterval,
+                                 maxpollinterval=maxpollinterval,
+                                 region=region,
+                                 rollingwave=rollingwave,
+                                 journaldir=journaldir,
+                                 resume=resume,
+                                 placementcheck=placementcheck)
+        amiupdate.ami_rollout_init()
+
+    fan_out_regions(regions, log, _update)
+
+
+def aws_ecs_ami_update_batch(akey, skey, ami, targets, timeout, maxinflight,
+                             log, asgcache=None,
+                             pollinterval=DEFAULT_POLL_INTERVAL,
+                             maxpollinterval=DEFAULT_MAX_POLL_INTERVAL,
+                             regions=None, rollingwave=None,
+                             templatetargets=(), journaldir='.',
+                             resume=False, placementcheck='warn'):
+    """Multi Cluster AMI Update command."""
+    log.cmdname = 'aws-ecs-amiupdate-batch:'
+    log.display_banner()
+    if ami is None or not (targets or templatetargets):
+        log.error("### You have not provided a value for target/ami. "
+                  "Safely Exiting.... ###")
+        sys.exit(0)
+    for pairs in (targets, templatetargets):
+        names = [name for _, name in pairs]
+        duplicates = sorted(set(n for n in names if names.count(n) > 1))
+        if duplicates:
+            log.error("### Clusters sharing launch configuration/template "
+                      "{0} would be rolled out concurrently, update them "
+                      "separately. Safely Exiting.... ###".format(duplicates))
+            sys.exit(0)
+
+    def _update_region(region, rlog):
+        asgclient = client_registry.client(akey, skey, 'autoscaling',
+                                           region=region)
+        cachepath = region_path(asgcache, region, regions)
+        asgindexes = {
+            False: ASGLaunchConfigIndex(asgclient, cachepath=cachepath),
+            True: ASGLaunchConfigIndex(
+                asgclient,
+                cachepath=cachepath and '{0}.lt'.format(cachepath),
+                source=launch_template_name)}
+
+        def _update(cluster, name, launchtemplate):
+            amiupdatecls = ami_update_class(launchtemplate)
+            amiupdate = amiupdatecls(akey, skey, ami, cluster, name,
+                                     timeout, job_logger(rlog, cluster),
+                                     pollinterval=pollinterval,
+                                     maxpollinterval=maxpollinterval,
+                                     asgindex=asgindexes[launchtemplate],
+                                     region=region,
+                                     rollingwave=rollingwave,
+                                     journaldir=journaldir,
+                                     resume=resume,
+                                     placementcheck=placementcheck)
+            amiupdate.ami_rollout_init()
+
+        pairs = ([(c, n, False) for c, n in targets] +
+                 [(c, n, True) for c, n in templatetargets])
+        jobs = [(cluster, lambda c=cluster, n=name, lt=lt: _update(c, n, lt))
+                for cluster, name, lt in pairs]
+        results = run_jobs(jobs, maxinflight)
+        if log_job_summary(results, rlog):
+            raise SystemExit("Job Cancelled...Exit")
+
+    fan_out_regions(regions, log, _update_region)
+
+
+def aws_ecs_inventory(akey, skey, cluster, log, regions=None):
+    """ECS Cluster Inventory command."""
+    log.cmdname = 'aws-ecs-inventory:'
+    log.display_banner()
+    if cluster is None:
+        log.error("You have not provided an option value for cluster...")
         sys.exit(0)
-    amiupdate = AWSECSAmiUpdate(akey, skey, ami, cluster, lcname, timeout, log)
-    amiupdate.ami_rollout_init()
+
+    def _inventory(region, rlog):
+        snapshot = ClusterSnapshot.collect(
+            client_registry.client(akey, skey, 'ecs', region=region),
+            client_registry.client(akey, skey, 'ec2', region=region),
+            cluster)
+        for line in snapshot.report():
+            rlog.info(line)
+
+    fan_out_regions(regions, log, _inventory)
 
 
 def aws_ecs_deploy(akey, skey, servicename, cluster,
-                   image, dcount, min, max, timeout, log):
+                   image, dcount, min, max, timeout, log,
+                   pollinterval=DEFAULT_POLL_INTERVAL,
+                   maxpollinterval=DEFAULT_MAX_POLL_INTERVAL,
+                   regions=None):
     """ECS Deploy Command."""
     log.cmdname = 'aws-ecs-deploy:'
     log.display_banner()
@@ -33,7 +196,180 @@ def aws_ecs_deploy(akey, skey, servicename, cluster,
         log.error("You have not provided an option value for servicename/"
                   "cluster/image...")
         sys.exit(0)
-    ecsdeploy = AWSECSDeploy(akey, skey, servicename, cluster, image,
-                             dcount, min, max, timeout, log)
-    ecsdeploy.task_deploy_init()
 
+    def _deploy(region, rlog):
+        ecsdeploy = AWSECSDeploy(akey, skey, servicename, cluster, image,
+                                 dcount, min, max, timeout, rlog,
+                                 pollinterval=pollinterval,
+                                 maxpollinterval=maxpollinterval,
+                                 region=region)
+        if not ecsdeploy.task_deploy_init():
+            raise SystemExit("Deployment rolled back....")
+
+    fan_out_regions(regions, log, _deploy)
+
+
+def aws_ecs_deploy_batch(akey, skey, services, cluster, dcount, min, max,
+                         timeout, maxworkers, log,
+                         pollinterval=DEFAULT_POLL_INTERVAL,
+                         maxpollinterval=DEFAULT_MAX_POLL_INTERVAL,
+                         regions=None):
+    """ECS Batch Deploy Command."""
+    log.cmdname = 'aws-ecs-deploy-batch:'
+    log.display_banner()
+    if not services or cluster is None:
+        log.error("You have not provided an option value for service/"
+                  "cluster...")
+        sys.exit(0)
+    names = [name for name, _ in services]
+    duplicates = sorted(set(n for n in names if names.count(n) > 1))
+    if duplicates:
+        log.error("### Services {0} are listed more than once and would be "
+                  "deployed concurrently, deploy them separately. Safely "
+                  "Exiting.... ###".format(duplicates))
+        sys.exit(0)
+
+    def _deploy_region(region, rlog):
+        scheduler = ECSServiceStatusScheduler(
+            client_registry.client(akey, skey, 'ecs', region=region))
+
+        def _deploy(servicename, image):
+            ecsdeploy = AWSECSDeploy(akey, skey, servicename, cluster, image,
+                                     dcount, min, max, timeout,
+                                     job_logger(rlog, servicename),
+                                     pollinterval=pollinterval,
+                                     maxpollinterval=maxpollinterval,
+                                     statussource=scheduler,
+                                     region=region)
+            if not ecsdeploy.task_deploy_init():
+                raise SystemExit("Deployment rolled back....")
+
+        jobs = [(servicename,
+                 lambda sn=servicename, im=image: _deploy(sn, im))
+                for servicename, image in services]
+        try:
+            results = run_jobs(jobs, maxworkers)
+        finally:
+            scheduler.stop()
+        rlog.info("Shared service status polls made {0} describe_services "
+                  "calls....".format(scheduler.calls))
+        if log_job_summary(results, rlog):
+            raise SystemExit("Job Cancelled...Exit")
+
+    fan_out_regions(regions, log, _deploy_region)
+
+
+def aws_s3cp_deploy(akey, skey, source, destination, expires, cflistdistid,
+                    maxage, cleardst, invalcache, timeout, log,
+                    concurrency=DEFAULT_CONCURRENCY,
+                    multipartthreshold=DEFAULT_MULTIPART_THRESHOLD,
+                    multipartchunksize=DEFAULT_MULTIPART_CHUNKSIZE,
+                    sync=False, indexdir='.', prune=False, compress='off',
+                    verify=False, dedup=False, regions=None):
+    """S3 Copy Deploy Command."""
+    log.cmdname = 'aws-s3cp-deploy:'
+    log.display_banner()
+    if source is None or destination is None:
+        log.error("You have not provided an option value for source/"
+                  "destination...")
+        sys.exit(0)
+    if invalcache and cflistdistid is None:
+        log.error("You have not provided an option value for cflistdistid "
+                  "to invalidate...")
+        sys.exit(0)
+    region = single_region(regions, log,
+                           "S3 buckets and CloudFront are not regional")
+    s3deploy = AWSS3CpDeploy(akey, skey, source, destination, expires,
+                             cflistdistid, maxage, cleardst, invalcache,
+                             timeout, log,
+                             region=region,
+                             concurrency=concurrency,
+                             multipartthreshold=multipartthreshold,
+                             multipartchunksize=multipartchunksize,
+                             sync=sync,
+                             indexdir=indexdir,
+                             prune=prune,
+                             compress=compress,
+                             verify=verify,
+                             dedup=dedup)
+    s3deploy.s3cp_deploy_init()
+
+
+def aws_apply(akey, skey, path, maxworkers, log, regions=None):
+    """Apply Release Manifest Command."""
+    log.cmdname = 'apply:'
+    log.display_banner()
+    try:
+        manifest = load_manifest(path)
+    except (ValueError, yaml.YAMLError) as e:
+        log.error("Invalid manifest {0}: {1}".format(path, e))
+        raise SystemExit("Job Cancelled...Exit")
+    defregion = single_region(regions, log,
+                              "set a region on each manifest step instead")
+
+    def _ecs_deploy(step, slog):
+        ecsdeploy = AWSECSDeploy(akey, skey, step['service'],
+                                 step['cluster'], step['image'],
+                                 step.get('desiredcount', 2),
+                                 step.get('min', 100),
+                                 step.get('max', 200),
+                                 step.get('timeout', 300),
+                                 slog,
+                                 region=step.get('region', defregion))
+        if not ecsdeploy.task_deploy_init():
+            raise SystemExit("Deployment rolled back....")
+
+    def _ecs_amiupdate(step, slog):
+        amiupdatecls = ami_update_class('launchtemplate' in step)
+        amiupdate = amiupdatecls(akey, skey, step['ami'],
+                                 step['cluster'],
+                                 step.get('launchcfg',
+                                          step.get('launchtemplate')),
+                                 step.get('timeout', 300),
+                                 slog,
+                                 region=step.get('region', defregion),
+                                 rollingwave=step.get('rollingwave'),
+                                 journaldir=step.get('journaldir', '.'),
+                                 resume=step.get('resume', False),
+                                 placementcheck=step.get('placementcheck',
+                                                         'warn'))
+        amiupdate.ami_rollout_init()
+
+    def _s3_deploy(step, slog):
+        s3deploy = AWSS3CpDeploy(akey, skey, step['source'],
+                                 step['destination'],
+                                 step.get('expires'),
+                                 step.get('cflistdistid'),
+                                 step.get('maxage', 300),
+                                 step.get('cleardst', False),
+                                 step.get('invalcache', False),
+                                 step.get('timeout', 300),
+                                 slog,
+                                 region=step.get('region', defregion),
+                                 concurrency=step.get('concurrency',
+                                                      DEFAULT_CONCURRENCY),
+                                 multipartthreshold=step.get(
+                                     'multipartthreshold',
+                                     DEFAULT_MULTIPART_THRESHOLD // MB) * MB,
+                                 multipartchunksize=step.get(
+                                     'multipartchunksize',
+                                     DEFAULT_MULTIPART_CHUNKSIZE // MB) * MB,
+                                 sync=step.get('sync', False),
+                                 indexdir=step.get('indexdir', '.'),
+                                 prune=step.get('prune', False),
+                                 compress=step.get('compress', 'off'),
+                                 verify=step.get('verify', False),
+                                 dedup=step.get('dedup', False))
+        s3deploy.s3cp_deploy_init()
+
+    runners = {'ecs-deploy': _ecs_deploy,
+               'ecs-amiupdate': _ecs_amiupdate,
+               's3-deploy': _s3_deploy}
+    if maxworkers is None:
+        maxworkers = manifest.get('maxworkers', DEFAULT_MANIFEST_WORKERS)
+    elif 'maxworkers' in manifest:
+        log.info("Overriding manifest maxworkers {0} with {1}....".format(
+            manifest['maxworkers'], maxworkers))
+    results = run_manifest(manifest, runners, maxworkers, log)
+    if log_job_summary(results, log):
+        raise SystemExit("Job Cancelled...Exit")
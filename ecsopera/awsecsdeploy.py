@@ -1,8 +1,13 @@
 # pylint: disable=C0111,C0103,C1801,R0902,R0913,R0201,W0622
 import time
 from botocore.exceptions import ClientError
-import boto3
 import progressbar
+from ecsopera.awsbatch import paginate, batch_describe, ECS_DESCRIBE_LIMIT
+from ecsopera.awsclients import client_registry
+from ecsopera.awsecstaskcache import ECSTaskCache
+from ecsopera.poller import (Poller,
+                             DEFAULT_POLL_INTERVAL,
+                             DEFAULT_MAX_POLL_INTERVAL)
 from ecsopera.raiseexception import exception_handler
 
 
@@ -11,10 +16,15 @@ class AWSECSDeploy(object):
     # We Get that we should probably break this out into multiple objects
     # and find a better model.
     def __init__(self, akey, skey, servicename, cluster,
-                 image, dcount, min, max, timeout, log):
+                 image, dcount, min, max, timeout, log,
+                 pollinterval=DEFAULT_POLL_INTERVAL,
+                 maxpollinterval=DEFAULT_MAX_POLL_INTERVAL,
+                 statussource=None,
+                 region=None):
         self.accesskey = akey
         self.secretkey = skey
-        self.s = self.boto_session(akey, skey)
+        self.region = region
+        self.s = self.boto_session(akey, skey, region)
         self.servicename = servicename
         self.cluster = cluster
         self.image = image
@@ -22,6 +32,9 @@ class AWSECSDeploy(object):
         self.mintaskcount = min
         self.maxtaskcount = max
         self.timeout = timeout
+        self.pollinterval = pollinterval
+        self.maxpollinterval = maxpollinterval
+        self.statussource = statussource
         self.deployconf = {'maximumPercent': self.maxtaskcount,
                            'minimumHealthyPercent': self.mintaskcount}
         self.currenttaskarn = self.get_service_task_arn(self.cluster,
@@ -42,10 +55,14 @@ class AWSECSDeploy(object):
         self.newserviceobj = None
 
     @staticmethod
-    def boto_session(akey, skey):
+    def boto_session(akey, skey, region=None):
         """Create Boto Session Object."""
-        return boto3.session.Session(aws_access_key_id=akey,
-                                     aws_secret_access_key=skey)
+        return client_registry.session(akey, skey, region)
+
+    def client(self, service):
+        """Return the shared client for the passed service."""
+        return client_registry.client(self.accesskey, self.secretkey,
+                                      service, region=self.region)
 
     @exception_handler(errors=(ClientError, IndexError, KeyError))
     def get_service_task_arn(self, cluster, sname):
@@ -53,55 +70,64 @@ class AWSECSDeploy(object):
         Return the ARN of the current task from parsed cluster
         and service name.
         """
-        svc = self.s.client('ecs').describe_services(cluster=cluster,
-                                                     services=[sname])
+        svc = self.client('ecs').describe_services(cluster=cluster,
+                                                   services=[sname])
         return svc['services'][0]['taskDefinition']
 
     @exception_handler(errors=(ClientError,))
     def get_service_task_obj(self, tarn):
         """Return the Task Object from the parsed task ARN."""
-        return self.s.client('ecs').describe_task_definition(taskDefinition=tarn)
+        return self.client('ecs').describe_task_definition(taskDefinition=tarn)
 
     @exception_handler(errors=(ClientError,))
     def describe_service(self, cluster, sname):
         """Return service object from parsed service name."""
-        return self.s.client('ecs').describe_services(cluster=cluster,
-                                                      services=[sname])
+        return self.client('ecs').describe_services(cluster=cluster,
+                                                    services=[sname])
 
     @exception_handler(errors=(ClientError,))
     def get_tasks(self, cluster, service):
-        """Get the running tasks from the provided cluster and service."""
-        return self.s.client('ecs').list_tasks(cluster=cluster,
-                                               serviceName=service)
+        """Return the running task arns from the cluster and service."""
+        return list(paginate(self.client('ecs'),
+                             'list_tasks',
+                             'taskArns',
+                             cluster=cluster,
+                             serviceName=service))
 
     @exception_handler(errors=(ClientError, KeyError))
     def get_all_tasks(self, cluster, tasks):
         """Return and describe all tasks from cluster and task arns."""
-        return self.s.client('ecs').describe_tasks(
-            cluster=cluster, tasks=tasks)['tasks']
+        return batch_describe(self.client('ecs').describe_tasks,
+                              'tasks',
+                              tasks,
+                              'tasks',
+                              ECS_DESCRIBE_LIMIT,
+                              cluster=cluster)
 
     @exception_handler(errors=(ClientError,))
     def update_service(self, cluster, service, tarn, dc, depstrat):
         """Update the specified service with parsed task
         and deployment strategy."""
-        return self.s.client('ecs').update_service(cluster=cluster,
-                                                   service=service,
-                                                   taskDefinition=tarn,
-                                                   desiredCount=dc,
-                                                   deploymentConfiguration=depstrat)
+        return self.client('ecs').update_service(cluster=cluster,
+                                                 service=service,
+                                                 taskDefinition=tarn,
+                                                 desiredCount=dc,
+                                                 deploymentConfiguration=depstrat)
 
     @exception_handler(errors=(ClientError,))
     def reg_new_task_definition(self, fam, tarn, cdef):
         """Register New Task under parsed family."""
-        return self.s.client('ecs').register_task_definition(family=fam,
-                                                             taskRoleArn=tarn,
-                                                             containerDefinitions=cdef)
+        return self.client('ecs').register_task_definition(family=fam,
+                                                           taskRoleArn=tarn,
+                                                           containerDefinitions=cdef)
 
     def _describe_service(self):
+        if self.statussource is not None:
+            return self.statussource.describe(self.cluster, self.servicename)
         return self.describe_service(self.cluster, self.servicename)
 
     def _get_tasks(self):
-        return self.get_tasks(self.cluster, self.servicename)['taskArns']
+        return self.get_tasks(self.cluster, self.servicename)
 
     def _get_all_tasks(self, rtarns):
         return self.get_all_tasks(self.cluster, rtarns)
@@ -128,30 +154,88 @@ class AWSECSDeploy(object):
             return False
         return True
 
-    def _poll_new_task(self, tarn):
+    @staticmethod
+    def _get_deployment(svcobj, tarn):
+        """Return the service deployment running the passed task arn."""
+        for dep in svcobj['services'][0].get('deployments', []):
+            if dep['taskDefinition'] == tarn:
+                return dep
+        return None
+
+    def _deployment_failed(self, svcobj, tarn):
+        """Check if ECS has marked the deployment of tarn as failed."""
+        dep = self._get_deployment(svcobj, tarn)
+        return dep is not None and dep.get('rolloutState') == 'FAILED'
+
+    def _poller(self, deadline=None):
+        """
+        Return a Poller timing out after self.timeout seconds, or at the
+        passed monotonic deadline shared by several polling phases.
+        """
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+        return Poller(timeout,
+                      interval=self.pollinterval,
+                      maxinterval=self.maxpollinterval)
+
+    def _wait_deployment_ready(self, tarn, deadline=None):
+        """
+        _wait_deployment_ready: Internal method that waits until the
+        deployment of tarn is the PRIMARY service deployment, returning
+        False on timeout or if ECS reports its rollout as failed.
+        """
+        state = {}
+
+        def _primary():
+            state['svc'] = self._describe_service()
+            dep = self._get_deployment(state['svc'], tarn)
+            return dep is not None and dep['status'] == 'PRIMARY'
+
+        def _failed():
+            return self._deployment_failed(state['svc'], tarn)
+
+        return self._poller(deadline).poll(_primary, abort=_failed)
+
+    def _poll_new_task(self, tarn, deadline=None):
         """
         _poll_new_task: Internal method for polling ECS service for
         running tasks.
         """
         newtask_bar = progressbar.ProgressBar(
             max_value=progressbar.UnknownLength)
-        while not self.newtaskdeployed:
-            if self.jobruntime >= self.timeout:
-                return False
+        state = {}
+        taskcache = ECSTaskCache(self._get_all_tasks)
+
+        def _deployed():
             r_service = self._describe_service()
+            state['svc'] = r_service
             r_tasks_arns = self._get_tasks()
-            self.log.info("Following tasks found (use to troubleshoot):"
-                          "{0}".format(r_tasks_arns))
-            r_tasks = self._get_all_tasks(r_tasks_arns)
-            reg_task_arn = tarn
-            o_tasks = [i for i in r_tasks if i['taskDefinitionArn'] != reg_task_arn]
-            if self._success_condition(r_service, o_tasks, reg_task_arn):
-                self.newtaskdeployed = True
-                return True
-            newtask_bar.update(self.jobruntime)
+            n_tasks_arns = taskcache.refresh(r_tasks_arns)
+            self.log.info("Found {0} tasks ({1} new)....".format(
+                len(r_tasks_arns), len(n_tasks_arns)))
+            if n_tasks_arns:
+                self.log.debug("Following new tasks found (use to "
+                               "troubleshoot): {0}".format(n_tasks_arns))
+            o_tasks = taskcache.old_tasks(tarn)
+            return self._success_condition(r_service, o_tasks, tarn)
+
+        def _failed():
+            return self._deployment_failed(state['svc'], tarn)
+
+        def _tick(elapsed):
+            self.jobruntime = elapsed
+            newtask_bar.update(int(elapsed))
             self.log.info("Polling for new task deployment....")
-            self.jobruntime += 5
-            time.sleep(5)
+
+        poller = self._poller(deadline)
+        self.newtaskdeployed = poller.poll(_deployed,
+                                           abort=_failed,
+                                           ontick=_tick)
+        if poller.aborted:
+            self.log.error("ECS reported the deployment of {0} as "
+                           "failed....".format(tarn))
+        return self.newtaskdeployed
 
     def _task_rollback(self):
         """
@@ -172,7 +256,10 @@ class AWSECSDeploy(object):
         return bool(self._poll_new_task(self.currenttaskarn))
 
     def task_deploy_init(self):
-        """deploy_init: Call this method to begin a new ECS Task Deployment."""
+        """
+        deploy_init: Call this method to begin a new ECS Task Deployment.
+        Returns False if the deployment was rolled back.
+        """
         self.log.info("Starting New Task Deployment....")
         self.log.info("Found Current Task Def Image {0}".format(
             self.currenttaskimage))
@@ -189,18 +276,20 @@ class AWSECSDeploy(object):
                                                  self.dcount,
                                                  self.deployconf)
         self.log.info("Service {0} Updated".format(self.servicename))
-        self.log.info("Sleeping for 60 secs before polling cluster for"
-                      "new task....")
-        time.sleep(60)
-        self.log.info("Polling cluster for newly deployed task.. ###")
-        if self._poll_new_task(self.regtaskobj['taskDefinition']
-                               ['taskDefinitionArn']):
+        self.log.info("Waiting for new deployment to become PRIMARY....")
+        deadline = time.monotonic() + self.timeout
+        if (self._wait_deployment_ready(self.regtaskarn, deadline) and
+                self._poll_new_task(self.regtaskarn, deadline)):
             self.log.info("Finished ECS Deploy")
+            self.log.debug('AWS client registry stats: {0}'.format(
+                client_registry.stats()))
+            return True
         else:
             self.log.error("""Timeout reached on checking for healthy running new task.
                            Rollback needed ....""")
             self.jobruntime = 0
             if self._task_rollback():
                 self.log.info("Rollback Succeeded")
+                return False
             else:
                 raise SystemExit("Rollback Failed (check AWS console)....")
@@ -0,0 +1,90 @@
+# pylint: disable=C0111,C0103,R0902,W0703
+import threading
+import time
+from ecsopera.awsbatch import batch_describe, ECS_SERVICES_LIMIT
+
+
+class ECSServiceStatusScheduler(object):
+    """
+    Multiplex the describe_services polls of concurrent deployments.
+
+    A caller of describe blocks until the next refresh that starts after
+    its request. Each refresh waits gather seconds for other callers to
+    join and then describes every waiting service in batched
+    describe_services calls of up to 10 services per cluster.
+    """
+
+    def __init__(self, client, gather=0.5):
+        self.client = client
+        self.gather = gather
+        self._cond = threading.Condition()
+        self._waiting = set()
+        self._inflight = set()
+        self._results = {}
+        self._stopped = False
+        self.calls = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def describe(self, cluster, service):
+        """Return a fresh describe_services style response for service."""
+        key = (cluster, service)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Service status scheduler is stopped.")
+            self._waiting.add(key)
+            self._cond.notify_all()
+            while ((key in self._waiting or key in self._inflight) and
+                   not self._stopped):
+                self._cond.wait()
+            result = self._results.get(key)
+        if isinstance(result, Exception):
+            raise result
+        if result is None:
+            return {'services': [], 'failures': [{'arn': service,
+                                                  'reason': 'MISSING'}]}
+        return {'services': [result], 'failures': []}
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _describe_cluster(self, cluster, services):
+        try:
+            found = batch_describe(self.client.describe_services,
+                                   'services',
+                                   services,
+                                   'services',
+                                   ECS_SERVICES_LIMIT,
+                                   cluster=cluster)
+        except Exception as e:
+            return dict((s, e) for s in services)
+        self.calls += -(-len(services) // ECS_SERVICES_LIMIT)
+        return dict((s['serviceName'], s) for s in found)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._waiting and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            # Give other pollers a chance to join this refresh.
+            time.sleep(self.gather)
+            with self._cond:
+                self._inflight = self._waiting
+                self._waiting = set()
+            clusters = {}
+            for cluster, service in self._inflight:
+                clusters.setdefault(cluster, []).append(service)
+            results = {}
+            for cluster, services in clusters.items():
+                found = self._describe_cluster(cluster, services)
+                for service in services:
+                    results[(cluster, service)] = found.get(service)
+            with self._cond:
+                self._results.update(results)
+                self._inflight = set()
+                self._cond.notify_all()
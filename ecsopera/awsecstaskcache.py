@@ -0,0 +1,47 @@
+# pylint: disable=C0111,C0103
+
+# Times a listed task arn missing from describe responses is described.
+MISSING_TASK_ATTEMPTS = 3
+
+
+class ECSTaskCache(object):
+    """
+    A per deployment cache of task arn -> task definition arn.
+
+    A task's definition never changes once started, so only arns not seen
+    before are described and arns no longer listed are evicted, keeping
+    the describe cost proportional to task churn. Arns missing from the
+    describe response, e.g. from eventual consistency, are described again
+    on later refreshes up to attempts times in total, then left alone until
+    no longer listed so they are not described on every poll.
+    """
+
+    def __init__(self, describe, attempts=MISSING_TASK_ATTEMPTS):
+        self.describe = describe
+        self.attempts = attempts
+        self.tasks = {}
+        self.missing = {}
+        self.described = 0
+
+    def refresh(self, tarns):
+        """Sync the cache with the listed task arns, returning new arns."""
+        listed = set(tarns)
+        for arn in [a for a in self.tasks if a not in listed]:
+            del self.tasks[arn]
+        for arn in [a for a in self.missing if a not in listed]:
+            del self.missing[arn]
+        new = [a for a in tarns if a not in self.tasks and
+               self.missing.get(a, 0) < self.attempts]
+        if new:
+            for task in self.describe(new):
+                self.tasks[task['taskArn']] = task['taskDefinitionArn']
+                self.missing.pop(task['taskArn'], None)
+            for arn in new:
+                if arn not in self.tasks:
+                    self.missing[arn] = self.missing.get(arn, 0) + 1
+            self.described += len(new)
+        return new
+
+    def old_tasks(self, tarn):
+        """Return cached task arns not running the passed task definition."""
+        return [arn for arn, tdef in self.tasks.items() if tdef != tarn]
@@ -2,10 +2,29 @@
 import os
 import re
 from datetime import datetime
-import urllib.parse
 from botocore.exceptions import ClientError
-import boto3
+from ecsopera.awsclients import client_registry
+from ecsopera.cfinvalidation import invalidation_paths
+from ecsopera.hashindex import HashIndex, INDEX_NAME, part_size
+from ecsopera.jobrunner import run_jobs, log_job_summary
+from ecsopera.precompress import Precompressor, CACHE_NAME
 from ecsopera.raiseexception import exception_handler
+from ecsopera.s3pipeline import (transfer_config,
+                                 copied_etags,
+                                 copy_objects,
+                                 dedup_files,
+                                 delete_keys,
+                                 etag_parts,
+                                 listed,
+                                 iter_objects,
+                                 list_objects,
+                                 same_object,
+                                 upload_files,
+                                 walk_files,
+                                 DEFAULT_CONCURRENCY,
+                                 DEFAULT_MULTIPART_THRESHOLD,
+                                 DEFAULT_MULTIPART_CHUNKSIZE,
+                                 MB)
 
 
 class AWSS3CpDeploy(object):
@@ -13,10 +32,16 @@ class AWSS3CpDeploy(object):
     A class to assist with the copying of objects to s3 and cloudfront ops.
     """
     def __init__(self, akey, skey, source, destination, expires,
-                 cflistdistid, max_age, cleardst, invalcache, timeout, log):
+                 cflistdistid, max_age, cleardst, invalcache, timeout, log,
+                 region=None, concurrency=DEFAULT_CONCURRENCY,
+                 multipartthreshold=DEFAULT_MULTIPART_THRESHOLD,
+                 multipartchunksize=DEFAULT_MULTIPART_CHUNKSIZE,
+                 sync=False, indexdir='.', prune=False, compress='off',
+                 verify=False, dedup=False):
         self.accesskey = akey
         self.secretkey = skey
-        self.s = self.boto_session(akey, skey)
+        self.region = region
+        self.s = self.boto_session(akey, skey, region)
         self.source = source
         self.destination = destination
         self.expires = expires
@@ -25,81 +50,276 @@ class AWSS3CpDeploy(object):
         self.cleardst = cleardst
         self.invalcache = invalcache
         self.timeout = timeout
+        self.concurrency = concurrency
+        self.transferconfig = transfer_config(concurrency,
+                                              multipartthreshold,
+                                              multipartchunksize)
+        self.sync = sync
+        self.prune = prune
+        self.changedkeys = set()
+        self.indexpath = os.path.join(indexdir, INDEX_NAME)
+        self._hashindex = None
+        self.compress = compress
+        self.verify = verify
+        self.dedup = dedup
+        self.compresscache = os.path.join(indexdir, CACHE_NAME)
         self.jobruntime = 0
         self.log = log
 
     @staticmethod
-    def boto_session(akey, skey):
+    def boto_session(akey, skey, region=None):
         """Create Boto Session Object."""
-        return boto3.session.Session(aws_access_key_id=akey,
-                                     aws_secret_access_key=skey)
+        return client_registry.session(akey, skey, region)
+
+    def client(self, service, config=None):
+        """Return the shared client for the passed service."""
+        return client_registry.client(self.accesskey, self.secretkey,
+                                      service, region=self.region,
+                                      config=config)
+
+    def s3_client(self):
+        """Return an S3 client with a connection per concurrent request."""
+        return self.client('s3', config={
+            'max_pool_connections': max(self.concurrency, 10)})
 
     @exception_handler(errors=(ClientError,))
-    def invalidate_cf_dist(self, id, origin):
-        """Invalidate cloudfront distribution."""
+    def invalidate_cf_dist(self, id, origin, paths=None):
+        """Invalidate the changed objects of a cloudfront distribution."""
         s3dstcheck = re.match(r'(s3://)([\w\.-]{3,63})', origin, re.I)
-        self.log.info(s3dstcheck.group(2))
         if s3dstcheck:
-            self.log.info("Found bucket origin for cf invalidation...")
+            self.log.info("Found bucket origin {0} for cf "
+                          "invalidation...".format(s3dstcheck.group(2)))
         else:
             raise SystemExit("Bucket origin does not exist...")
-        s3 = boto3.resource('s3')
-        dst_bucket = s3.Bucket(s3dstcheck.group(2))
-        objects = [urllib.parse.quote_plus(o.key)
-                   for o in dst_bucket.objects.all()]
-        cf = self.s.client('cloudfront')
+        if paths is None:
+            paths = invalidation_paths(self.changedkeys)
+        cf = self.client('cloudfront')
         cf.create_invalidation(DistributionId=id,
                                InvalidationBatch={
                                    'Paths': {
-                                       'Quantity': 1,
-                                       'Items': ['/*']},
+                                       'Quantity': len(paths),
+                                       'Items': paths},
                                    'CallerReference': 'ref-{0}'.format(
                                        datetime.now())
                                })
+        self.log.info("Invalidating {0} paths of distribution "
+                      "{1}...".format(len(paths), id))
         return True
 
+    def invalidate_cf_dists(self, ids, origin):
+        """
+        Invalidate the changed objects of the comma separated cloudfront
+        distributions, concurrently when more than one is passed.
+        """
+        ids = [i.strip() for i in ids.split(',') if i.strip()]
+        if not self.changedkeys:
+            self.log.info("No objects changed, nothing to invalidate...")
+            return True
+        paths = invalidation_paths(self.changedkeys)
+        self.log.info("Invalidating {0} changed objects with {1} "
+                      "paths...".format(len(self.changedkeys), len(paths)))
+        if len(ids) == 1:
+            return self.invalidate_cf_dist(ids[0], origin, paths)
+        results = run_jobs([(i, lambda i=i: self.invalidate_cf_dist(
+            i, origin, paths)) for i in ids], len(ids))
+        return not log_job_summary(results, self.log)
+
+    @property
+    def hashindex(self):
+        """Return the persisted local file hash index, loaded once."""
+        if self._hashindex is None:
+            self._hashindex = HashIndex(self.indexpath).load()
+        return self._hashindex
+
+    def upload_etag(self, localp, size):
+        """Return the ETag localp of size bytes is uploaded with."""
+        config = self.transferconfig
+        partsize = part_size(size, config.multipart_threshold,
+                             config.multipart_chunksize)
+        return self.hashindex.etag(localp, partsize)
+
+    def local_etag(self, localp, key, size):
+        """Return the (ETag, size) key gets when localp is uploaded."""
+        return self.upload_etag(localp, size), size
+
+    @exception_handler(errors=(ClientError,))
+    def verify_uploads(self, files, dst):
+        """
+        Check the (local path, key, size, ...) files against a single listing
+        of the dst bucket, the ETag of every uploaded object must match the
+        ETag computed locally.
+        """
+        remote = list_objects(self.s3_client(), dst)
+        failed = [item[1] for item in files
+                  if remote.get(item[1]) != self.local_etag(*item[:3])]
+        self.hashindex.save()
+        if failed:
+            self.log.error("{0} uploaded objects failed verification: "
+                           "{1}....".format(len(failed), failed[:10]))
+            raise SystemExit("Job Cancelled...Exit")
+        self.log.info("Verified {0} uploaded objects....".format(
+            len(files)))
+
+    def changed_files(self, files, dst):
+        """
+        Return the (local path, key, size, ...) files whose size or ETag
+        differ from the object at key in the dst bucket, or that are
+        missing from it. Local ETags come from the persisted hash index so
+        only new or modified files are read.
+        """
+        remote = list_objects(self.s3_client(), dst)
+        index = self.hashindex
+        files = list(files)
+        changed = [item for item in files
+                   if remote.get(item[1]) != self.local_etag(*item[:3])]
+        index.save()
+        self.log.info("Sync found {0} of {1} files changed, {2} hashed, "
+                      "{3} from the hash index....".format(
+                          len(changed), len(files), index.misses,
+                          index.hits))
+        return changed
+
+    def changed_objects(self, src, dst, keys=None):
+        """
+        Return the (key, size, ETag) objects of the src bucket whose size or
+        ETag differ from the same key in the dst bucket, or that are
+        missing from it, see same_object. Only dst objects with a differing
+        multipart ETag are headed for the source ETag of their copy. Every
+        src key is added to the keys set if passed.
+        """
+        s3 = self.s3_client()
+        source = list_objects(s3, src)
+        if keys is not None:
+            keys.update(source)
+        remote = list_objects(s3, dst)
+        multipart = [k for k, obj in source.items()
+                     if k in remote and remote[k][1] == obj[1] and
+                     remote[k][0] != obj[0] and etag_parts(remote[k][0])]
+        copied = copied_etags(s3, dst, multipart, self.concurrency)
+        changed = [(k, obj[1], obj[0]) for k, obj in sorted(source.items())
+                   if not same_object(obj, remote.get(k), copied.get(k))]
+        self.log.info("Sync found {0} of {1} objects changed....".format(
+            len(changed), len(source)))
+        return changed
+
+    @exception_handler(errors=(ClientError,))
+    def clear_dst(self, dst):
+        """Delete every object of the dst bucket."""
+        self.log.info("Clearing destination bucket objects...")
+        s3 = self.s3_client()
+        delete_keys(s3, dst, (k for k, _, _ in listed(iter_objects(s3, dst),
+                                                      self.changedkeys)),
+                    self.concurrency, self.log)
+        self.log.info("All destination bucket objects removed...")
+
+    @exception_handler(errors=(ClientError,))
+    def prune_dst(self, dst, keys):
+        """Delete the objects of the dst bucket whose key is not in keys."""
+        self.log.info("Pruning destination bucket objects missing from "
+                      "source...")
+        s3 = self.s3_client()
+        dstkeys = set()
+        progress = delete_keys(s3, dst, (k for k, _, _ in
+                                         listed(iter_objects(s3, dst),
+                                                dstkeys)
+                                         if k not in keys),
+                               self.concurrency, self.log)
+        self.changedkeys.update(dstkeys.difference(keys))
+        self.log.info("Pruned {0} destination bucket objects...".format(
+            progress.done))
+
+    def copy_duplicates(self, dst, copies, ex_args, uploads):
+        """
+        Create the keys of duplicate files with server side copies of the
+        uploaded first file of their group and log what that saved.
+        """
+        saved = sum(c[1] for c in copies)
+        progress = copy_objects(self.s3_client(), dst, dst, copies, ex_args,
+                                self.transferconfig, self.log, len(copies),
+                                saved)
+        rate = uploads.transferred / max(uploads.elapsed, 0.001)
+        self.log.info("Deduplicated {0} files, {1:.1f} MiB not uploaded, "
+                      "~{2:.1f}s of uploads replaced by {3:.1f}s of server "
+                      "side copies....".format(len(copies), saved / float(MB),
+                                               saved / rate if rate else 0,
+                                               progress.elapsed))
+        return progress
+
     @exception_handler(errors=(ClientError,))
     def copy_obj_action(self, src, dst, exp, maxage, cleardst):
         """Perform s3cp from local absolute src to bucket."""
-        s3 = self.s.resource('s3')
+        precompressor = Precompressor(self.compress, self.compresscache,
+                                      self.hashindex, self.log)
         ex_args = {'CacheControl': 'public, max-age={0}'.format(maxage)}
         if exp:
             self.log.info("Specified expires, but max-age wins. Unlucky.")
         if cleardst:
-            self.log.info("Clearing destination bucket objects...")
-            # dst_bucket.objects.all().delete()
-            self.log.info("All destination bucket objects removed...")
-        for root, _, files in os.walk(src):
-            for filename in files:
-                # construct local path
-                localp = os.path.join(root, filename)
-                # construct relative path
-                relpath = os.path.relpath(localp, src)
-                self.log.info("Uploading files...")
-                s3.meta.client.upload_file(localp,
-                                           dst,
-                                           relpath,
-                                           ExtraArgs=ex_args)
-                self.log.info("{0} copied to {1}".format(localp, relpath))
+            self.clear_dst(dst)
+        files = list(walk_files(src))
+        keys = set(f[1] for f in files)
+        count = len(files)
+        size = sum(f[2] for f in files)
+        if self.compress != 'off':
+            size = None
+        files = precompressor.stage(files)
+        if self.sync:
+            files = self.changed_files(files, dst)
+            count, size = len(files), sum(f[2] for f in files)
+        elif self.verify or self.dedup:
+            files = list(files)
+        uploads, copies = files, []
+        if self.dedup:
+            uploads, copies = dedup_files(files, self.upload_etag)
+            count = len(uploads)
+            if size is not None:
+                size = sum(f[2] for f in uploads)
+        self.log.info("Uploading {0} files with {1} concurrent "
+                      "requests...".format(count, self.concurrency))
+        uploaded = set()
+        progress = upload_files(self.s3_client(), dst,
+                                listed(uploads, uploaded, 1), ex_args,
+                                self.transferconfig, self.log, count, size)
+        if copies:
+            self.copy_duplicates(dst, copies, ex_args, progress)
+        if self.compress != 'off' or self.dedup:
+            self.hashindex.save()
+        if self.verify:
+            self.verify_uploads(files, dst)
+        self.jobruntime = progress.elapsed
+        self.changedkeys.update(uploaded)
+        self.changedkeys.update(c[0] for c in copies)
+        if self.prune:
+            self.prune_dst(dst, keys)
         self.log.info("All files copied from local to dst bucket...")
         return True
 
     @exception_handler(errors=(ClientError,))
     def copy_s3obj_action(self, src, dst, exp, maxage, cleardst):
-        """Perform s3cp from bucket to bucket."""
-        s3 = self.s.resource('s3')
-        src_bucket = s3.Bucket(src)
+        """Perform a concurrent server side s3cp from bucket to bucket."""
+        s3 = self.s3_client()
         ex_args = {'CacheControl': 'public, max-age={0}'.format(maxage)}
         if exp:
             self.log.info("Specified expires, but max-age wins. Unlucky.")
         if cleardst:
-            self.log.info("Clearing destination bucket objects...")
-            # dst_bucket.objects.all().delete()
-            self.log.info("All destination bucket objects removed...")
-        for obj in src_bucket.objects.filter():
-            copy_source = {'Bucket': src,
-                           'Key': obj.key}
-            s3.meta.client.copy(copy_source, dst, obj.key, ExtraArgs=ex_args)
+            self.clear_dst(dst)
+        keys = set()
+        if self.sync:
+            objects = self.changed_objects(src, dst, keys)
+            files, size = len(objects), sum(o[1] for o in objects)
+        else:
+            objects = listed(iter_objects(s3, src), keys)
+            files = size = None
+        self.log.info("Copying objects from {0} to {1} with {2} concurrent "
+                      "requests...".format(src, dst, self.concurrency))
+        progress = copy_objects(s3, src, dst, objects, ex_args,
+                                self.transferconfig, self.log, files, size)
+        self.jobruntime = progress.elapsed
+        if self.sync:
+            self.changedkeys.update(o[0] for o in objects)
+        else:
+            self.changedkeys.update(keys)
+        if self.prune:
+            self.prune_dst(dst, keys)
         return True
 
     def s3cp_control(self, src, dst, exp, maxage, cleardst):
@@ -155,8 +375,8 @@ class AWSS3CpDeploy(object):
             self.log.info("s3cp job complete...")
         if self.invalcache:
             self.log.info("Creating cloudfront distribution invalidation...")
-            if not self.invalidate_cf_dist(self.cflistid,
-                                           self.destination):
+            if not self.invalidate_cf_dists(self.cflistid,
+                                            self.destination):
                 self.log.error("Cloudfront Invalidation failed...")
                 raise SystemExit("Job Cancelled...Exit")
             else:
@@ -164,3 +384,5 @@ class AWSS3CpDeploy(object):
         else:
             self.log.info("No Cloudfront Invalidation Required...")
         self.log.info("Job Finished!!!!...")
+        self.log.debug('AWS client registry stats: {0}'.format(
+            client_registry.stats()))
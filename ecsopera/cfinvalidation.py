@@ -0,0 +1,68 @@
+# pylint: disable=C0111,C0103
+from collections import Counter
+import urllib.parse
+
+# CloudFront allows 3000 file paths and 15 wildcard paths to be in progress
+# per distribution.
+CF_MAX_PATHS = 3000
+CF_MAX_WILDCARDS = 15
+INDEX_DOCUMENT = 'index.html'
+
+
+def key_dirs(key):
+    """Return every parent directory prefix of key, eg 'a/', 'a/b/'."""
+    parts = key.split('/')[:-1]
+    return ['/'.join(parts[:i]) + '/' for i in range(1, len(parts) + 1)]
+
+
+def cf_path(key):
+    return '/' + urllib.parse.quote(key, safe='/~')
+
+
+def key_paths(key):
+    """
+    Return the paths of key, including the directory path an index.html
+    key is also served at, eg 'a/index.html' -> '/a/index.html', '/a/'.
+    """
+    if key.rsplit('/', 1)[-1] != INDEX_DOCUMENT:
+        return [cf_path(key)]
+    return [cf_path(key), cf_path(key[:-len(INDEX_DOCUMENT)])]
+
+
+def invalidation_paths(keys, maxpaths=CF_MAX_PATHS,
+                       maxwildcards=CF_MAX_WILDCARDS):
+    """
+    Return the CloudFront paths invalidating the passed object keys.
+
+    Keys are invalidated individually, index.html keys together with
+    their directory path, while they fit within maxpaths. Otherwise
+    directories are collapsed into dir/* wildcards until they fit: the
+    directory covering the fewest paths that is enough on its own, else
+    the one covering the most paths. Falls back to /* when more than
+    maxwildcards would be needed.
+    """
+    paths = dict((k, key_paths(k)) for k in set(keys))
+    keys = sorted(paths)
+    wildcards = []
+    while True:
+        excess = sum(len(paths[k]) for k in keys) + len(wildcards) - maxpaths
+        if excess <= 0:
+            break
+        counts = Counter()
+        for k in keys:
+            for d in key_dirs(k):
+                counts[d] += len(paths[k])
+        if len(wildcards) == maxwildcards or not counts:
+            return ['/*']
+        enough = [d for d in counts if counts[d] - 1 >= excess]
+        if enough:
+            best = min(enough, key=lambda d: (counts[d], -d.count('/')))
+        else:
+            best = max(counts, key=lambda d: (counts[d], d.count('/')))
+        if counts[best] < 2:
+            return ['/*']
+        wildcards = [w for w in wildcards if not w.startswith(best)]
+        wildcards.append(best)
+        keys = [k for k in keys if not k.startswith(best)]
+    return (sorted(p for k in keys for p in paths[k]) +
+            [cf_path(w) + '*' for w in sorted(wildcards)])
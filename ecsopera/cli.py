@@ -2,10 +2,68 @@ import sys
 import logging
 import click
 from ecsopera.awscommands import (get_version,
+                                   aws_apply,
                                    aws_ecs_ami_update,
-                                   aws_ecs_deploy)
+                                   aws_ecs_ami_update_batch,
+                                   aws_ecs_deploy,
+                                   aws_ecs_inventory,
+                                   aws_s3cp_deploy,
+                                   aws_ecs_deploy_batch)
                                    
 from ecsopera.loghelper import LogHelper
+from ecsopera.manifest import DEFAULT_MANIFEST_WORKERS
+from ecsopera.placement import PLACEMENT_CHECKS
+from ecsopera.precompress import COMPRESS_ENCODINGS
+from ecsopera.poller import DEFAULT_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL
+from ecsopera.s3pipeline import (MB,
+                                 DEFAULT_CONCURRENCY,
+                                 DEFAULT_MULTIPART_THRESHOLD,
+                                 DEFAULT_MULTIPART_CHUNKSIZE)
+
+
+def _options(*options):
+    """Return a decorator applying options in the order they are listed."""
+    def decorator(func):
+        for option in reversed(options):
+            func = option(func)
+        return func
+    return decorator
+
+
+poll_options = _options(
+    click.option('--pollinterval',
+                 help="Initial interval (s) between status polls, backed "
+                      "off exponentially up to --maxpollinterval. "
+                      "(default 2s).",
+                 default=DEFAULT_POLL_INTERVAL,
+                 type=float),
+    click.option('--maxpollinterval',
+                 help="Maximum interval (s) between status polls. "
+                      "(default 15s).",
+                 default=DEFAULT_MAX_POLL_INTERVAL,
+                 type=float))
+
+rollout_options = _options(
+    click.option('--rollingwave',
+                 help="Replace capacity in rolling waves of this percentage "
+                      "of instances instead of doubling the cluster. "
+                      "(default 0, disabled).",
+                 default=0,
+                 type=click.IntRange(min=0, max=100)),
+    click.option('--journaldir',
+                 help="Directory the crash safe rollout journal is written "
+                      "to. (default current directory).",
+                 default='.',
+                 type=click.Path(file_okay=False)),
+    click.option('--resume',
+                 is_flag=True,
+                 help="Resume an interrupted rollout from its journal."),
+    click.option('--placementcheck',
+                 help="Simulate placing drained service tasks on the "
+                      "remaining capacity and warn, refuse to drain or skip "
+                      "the check when they will not fit. (default warn).",
+                 default='warn',
+                 type=click.Choice(PLACEMENT_CHECKS)))
 
 
 @click.group()
@@ -21,7 +79,9 @@ from ecsopera.loghelper import LogHelper
 @click.option('--awsregion',
               envvar='AWS_DEFAULT_REGION',
               default=None,
-              type=str)
+              type=str,
+              help="AWS region, or a comma separated list of regions to "
+                   "run deploys and AMI updates in concurrently.")
 @click.option('--debug',
               is_flag=True,
               help="Debug mode for true verbose output.")
@@ -42,6 +102,8 @@ def ecsopera(ecsoperaaccess, awsaccesskey, awssecretkey, awsregion, debug):
     ecsoperaaccess.obj = {'accesskey': awsaccesskey,
                            'secretkey': awssecretkey,
                            'region': awsregion,
+                           'regions': [r.strip() for r in awsregion.split(',')
+                                       if r.strip()],
                            'logger': log}
 
 
@@ -62,21 +124,45 @@ def version(ecsoperaaccess):
               help="The Launch Configuration name to operate on.",
               default=None,
               type=str)
+@click.option('--launchtemplate',
+              help="The EC2 Launch Template name to operate on instead of "
+                   "--launchcfg. The AMI is rolled out as a new template "
+                   "version.",
+              default=None,
+              type=str)
 @click.option('--timeout',
               help="Timeout (s) value for spinning up new container instances "
                    "and performing draining on existing instances. "
                    "(default 300s (5 mins)).",
               default=300,
               type=int)
+@click.option('--asgcache',
+              help="Optional file path to persist the launch configuration "
+                   "to ASG index between runs.",
+              default=None,
+              type=click.Path(dir_okay=False))
+@poll_options
+@rollout_options
 @click.pass_obj
-def aws_amiupdate(ecsoperaaccess, ami, cluster, launchcfg, timeout):
+def aws_amiupdate(ecsoperaaccess, ami, cluster, launchcfg, launchtemplate,
+                  timeout, asgcache, pollinterval, maxpollinterval,
+                  rollingwave, journaldir, resume, placementcheck):
     aws_ecs_ami_update(ecsoperaaccess['accesskey'],
                        ecsoperaaccess['secretkey'],
                        ami,
                        cluster,
                        launchcfg,
                        timeout,
-                       ecsoperaaccess['logger'])
+                       ecsoperaaccess['logger'],
+                       asgcache=asgcache,
+                       pollinterval=pollinterval,
+                       maxpollinterval=maxpollinterval,
+                       regions=ecsoperaaccess['regions'],
+                       rollingwave=rollingwave,
+                       launchtemplate=launchtemplate,
+                       journaldir=journaldir,
+                       resume=resume,
+                       placementcheck=placementcheck)
 
 
 @click.command('aws-ecs-deploy',
@@ -113,6 +199,7 @@ def aws_amiupdate(ecsoperaaccess, ami, cluster, launchcfg, timeout):
                    "(default 5 mins).",
               default=300,
               type=int)
+@poll_options
 @click.pass_obj
 def aws_ecsdeploy(ecsoperaaccess,
                   servicename,
@@ -121,7 +208,9 @@ def aws_ecsdeploy(ecsoperaaccess,
                   desiredcount,
                   min,
                   max,
-                  timeout):
+                  timeout,
+                  pollinterval,
+                  maxpollinterval):
     aws_ecs_deploy(ecsoperaaccess['accesskey'],
                    ecsoperaaccess['secretkey'],
                    servicename,
@@ -131,12 +220,322 @@ def aws_ecsdeploy(ecsoperaaccess,
                    min,
                    max,
                    timeout,
-                   ecsoperaaccess['logger'])
+                   ecsoperaaccess['logger'],
+                   pollinterval=pollinterval,
+                   maxpollinterval=maxpollinterval,
+                   regions=ecsoperaaccess['regions'])
+
+
+@click.command('aws-ecs-inventory',
+               short_help="Report the container instances, AMIs and ASGs "
+                          "of an ECS cluster.")
+@click.option('--cluster',
+              help="The ECS cluster name to operate on.",
+              default=None,
+              type=str)
+@click.pass_obj
+def aws_inventory(ecsoperaaccess, cluster):
+    aws_ecs_inventory(ecsoperaaccess['accesskey'],
+                      ecsoperaaccess['secretkey'],
+                      cluster,
+                      ecsoperaaccess['logger'],
+                      regions=ecsoperaaccess['regions'])
+
+
+@click.command('aws-s3cp-deploy',
+               short_help="Copy a local directory or bucket to a bucket and "
+                          "optionally invalidate CloudFront.")
+@click.option('--source',
+              help="Absolute local directory path or s3://bucket to copy "
+                   "from.",
+              default=None,
+              type=str)
+@click.option('--destination',
+              help="The s3://bucket to copy to.",
+              default=None,
+              type=str)
+@click.option('--expires',
+              help="Expires header value, max-age takes precedence.",
+              default=None,
+              type=str)
+@click.option('--cflistdistid',
+              help="Comma separated CloudFront distribution ids to "
+                   "invalidate.",
+              default=None,
+              type=str)
+@click.option('--maxage',
+              help="Cache-Control max-age (s) of copied objects. "
+                   "(default 300s).",
+              default=300,
+              type=int)
+@click.option('--cleardst',
+              is_flag=True,
+              help="Clear the destination bucket before copying.")
+@click.option('--invalcache',
+              is_flag=True,
+              help="Invalidate the CloudFront distribution after copying.")
+@click.option('--timeout',
+              help="Timeout value for the s3cp job. (default 5 mins).",
+              default=300,
+              type=int)
+@click.option('--concurrency',
+              help="Maximum number of concurrent S3 requests. "
+                   "(default {0}).".format(DEFAULT_CONCURRENCY),
+              default=DEFAULT_CONCURRENCY,
+              type=click.IntRange(min=1))
+@click.option('--multipartthreshold',
+              help="File size (MiB) from which uploads are split into "
+                   "multipart uploads. (default {0}).".format(
+                       DEFAULT_MULTIPART_THRESHOLD // MB),
+              default=DEFAULT_MULTIPART_THRESHOLD // MB,
+              type=click.IntRange(min=5))
+@click.option('--multipartchunksize',
+              help="Part size (MiB) of multipart uploads. "
+                   "(default {0}).".format(DEFAULT_MULTIPART_CHUNKSIZE // MB),
+              default=DEFAULT_MULTIPART_CHUNKSIZE // MB,
+              type=click.IntRange(min=5))
+@click.option('--sync',
+              is_flag=True,
+              help="Only copy new or changed objects, comparing ETags with "
+                   "the destination. Metadata such as --maxage is not "
+                   "compared.")
+@click.option('--indexdir',
+              help="Directory the local file hash index used by --sync and "
+                   "the --compress cache are kept in. (default current "
+                   "directory).",
+              default='.',
+              type=click.Path(file_okay=False))
+@click.option('--prune',
+              is_flag=True,
+              help="Delete destination objects missing from the source "
+                   "after copying.")
+@click.option('--compress',
+              help="Precompress text assets with gzip or brotli (br) and "
+                   "set their Content-Encoding. (default off).",
+              default='off',
+              type=click.Choice(COMPRESS_ENCODINGS))
+@click.option('--verify',
+              is_flag=True,
+              help="Check the ETag of every uploaded object against the "
+                   "locally computed one.")
+@click.option('--dedup',
+              is_flag=True,
+              help="Upload byte identical files once and create their other "
+                   "keys with server side copies.")
+@click.pass_obj
+def aws_s3cpdeploy(ecsoperaaccess,
+                   source,
+                   destination,
+                   expires,
+                   cflistdistid,
+                   maxage,
+                   cleardst,
+                   invalcache,
+                   timeout,
+                   concurrency,
+                   multipartthreshold,
+                   multipartchunksize,
+                   sync,
+                   indexdir,
+                   prune,
+                   compress,
+                   verify,
+                   dedup):
+    aws_s3cp_deploy(ecsoperaaccess['accesskey'],
+                    ecsoperaaccess['secretkey'],
+                    source,
+                    destination,
+                    expires,
+                    cflistdistid,
+                    maxage,
+                    cleardst,
+                    invalcache,
+                    timeout,
+                    ecsoperaaccess['logger'],
+                    concurrency=concurrency,
+                    multipartthreshold=multipartthreshold * MB,
+                    multipartchunksize=multipartchunksize * MB,
+                    sync=sync,
+                    indexdir=indexdir,
+                    prune=prune,
+                    compress=compress,
+                    verify=verify,
+                    dedup=dedup,
+                    regions=ecsoperaaccess['regions'])
+
+
+def _parse_pairs(value, fmt):
+    pairs = []
+    for pair in value:
+        key, sep, val = pair.partition('=')
+        if not sep or not key or not val:
+            raise click.BadParameter("{0} is not in {1} format.".format(pair,
+                                                                        fmt))
+        pairs.append((key, val))
+    return pairs
+
+
+def parse_service_images(ctx, param, value):
+    """Parse repeated SERVICE=IMAGE option values into tuples."""
+    return _parse_pairs(value, 'SERVICE=IMAGE')
+
+
+def parse_cluster_launchcfgs(ctx, param, value):
+    """Parse repeated CLUSTER=LAUNCHCFG option values into tuples."""
+    return _parse_pairs(value, 'CLUSTER=LAUNCHCFG')
+
+
+def parse_cluster_templates(ctx, param, value):
+    """Parse repeated CLUSTER=TEMPLATE option values into tuples."""
+    return _parse_pairs(value, 'CLUSTER=TEMPLATE')
+
+
+@click.command('aws-ecs-amiupdate-batch',
+               short_help='Update the container instance AMI of many '
+                          'clusters concurrently.')
+@click.option('--ami', help="The AMI image to ++ to.", default=None, type=str)
+@click.option('--target',
+              help="CLUSTER=LAUNCHCFG pair to update, repeat for each "
+                   "cluster.",
+              multiple=True,
+              callback=parse_cluster_launchcfgs)
+@click.option('--templatetarget',
+              help="CLUSTER=TEMPLATE pair to update from an EC2 Launch "
+                   "Template, repeat for each cluster.",
+              multiple=True,
+              callback=parse_cluster_templates)
+@click.option('--timeout',
+              help="Timeout (s) value for spinning up new container instances "
+                   "and performing draining on existing instances. "
+                   "(default 300s (5 mins)).",
+              default=300,
+              type=int)
+@click.option('--maxinflight',
+              help="Maximum number of clusters updated at once. "
+                   "(default 5).",
+              default=5,
+              type=click.IntRange(min=1))
+@click.option('--asgcache',
+              help="Optional file path to persist the launch configuration "
+                   "to ASG index between runs.",
+              default=None,
+              type=click.Path(dir_okay=False))
+@poll_options
+@rollout_options
+@click.pass_obj
+def aws_amiupdate_batch(ecsoperaaccess, ami, target, templatetarget, timeout,
+                        maxinflight, asgcache, pollinterval, maxpollinterval,
+                        rollingwave, journaldir, resume, placementcheck):
+    aws_ecs_ami_update_batch(ecsoperaaccess['accesskey'],
+                             ecsoperaaccess['secretkey'],
+                             ami,
+                             target,
+                             timeout,
+                             maxinflight,
+                             ecsoperaaccess['logger'],
+                             asgcache=asgcache,
+                             pollinterval=pollinterval,
+                             maxpollinterval=maxpollinterval,
+                             regions=ecsoperaaccess['regions'],
+                             rollingwave=rollingwave,
+                             templatetargets=templatetarget,
+                             journaldir=journaldir,
+                             resume=resume,
+                             placementcheck=placementcheck)
+
+
+@click.command('aws-ecs-deploy-batch',
+               short_help="Use this command to deploy new task definitions "
+                          "to many ECS services concurrently.")
+@click.option('--service',
+              help="SERVICE=IMAGE pair to deploy, repeat for each service.",
+              multiple=True,
+              callback=parse_service_images)
+@click.option('--cluster',
+              help="The ECS cluster name to operate on.",
+              default=None,
+              type=str)
+@click.option('--desiredcount',
+              help="The number of instantiations of the task to place "
+                   "and keep running in each service.",
+              default=2,
+              type=int)
+@click.option('--min',
+              help="minumumHealthyPercent: The lower limit on the number of "
+                   "running tasks during a deployment. (default: 100)",
+              default=100,
+              type=int)
+@click.option('--max',
+              help="maximumPercent: The upper limit on the number of running "
+                   "tasks during a deployment. (default: 200)",
+              default=200,
+              type=int)
+@click.option('--timeout',
+              help="Timeout value for checking for successful deployment "
+                   "of each service. (default 5 mins).",
+              default=300,
+              type=int)
+@click.option('--maxworkers',
+              help="Maximum number of services deployed at once. "
+                   "(default 10).",
+              default=10,
+              type=click.IntRange(min=1))
+@poll_options
+@click.pass_obj
+def aws_ecsdeploy_batch(ecsoperaaccess,
+                        service,
+                        cluster,
+                        desiredcount,
+                        min,
+                        max,
+                        timeout,
+                        maxworkers,
+                        pollinterval,
+                        maxpollinterval):
+    aws_ecs_deploy_batch(ecsoperaaccess['accesskey'],
+                         ecsoperaaccess['secretkey'],
+                         service,
+                         cluster,
+                         desiredcount,
+                         min,
+                         max,
+                         timeout,
+                         maxworkers,
+                         ecsoperaaccess['logger'],
+                         pollinterval=pollinterval,
+                         maxpollinterval=maxpollinterval,
+                         regions=ecsoperaaccess['regions'])
+
+
+@click.command('apply',
+               short_help="Apply a release manifest of deploys, AMI updates "
+                          "and S3 deploys.")
+@click.argument('manifest',
+                type=click.Path(exists=True, dir_okay=False))
+@click.option('--maxworkers',
+              help="Maximum number of manifest steps run at once, "
+                   "overriding the manifest maxworkers. (default "
+                   "{0}).".format(DEFAULT_MANIFEST_WORKERS),
+              default=None,
+              type=click.IntRange(min=1))
+@click.pass_obj
+def apply(ecsoperaaccess, manifest, maxworkers):
+    aws_apply(ecsoperaaccess['accesskey'],
+              ecsoperaaccess['secretkey'],
+              manifest,
+              maxworkers,
+              ecsoperaaccess['logger'],
+              regions=ecsoperaaccess['regions'])
 
 # Provider Commands
 ecsopera.add_command(version)
+ecsopera.add_command(apply)
 ecsopera.add_command(aws_amiupdate)
+ecsopera.add_command(aws_amiupdate_batch)
 ecsopera.add_command(aws_ecsdeploy)
+ecsopera.add_command(aws_ecsdeploy_batch)
+ecsopera.add_command(aws_inventory)
+ecsopera.add_command(aws_s3cpdeploy)
 
 if __name__ == "__main__":
     ecsopera()
@@ -0,0 +1,148 @@
+# pylint: disable=C0111,C0103,R0902,R0913
+from ecsopera.awsbatch import (paginate,
+                               batch_describe,
+                               ECS_DESCRIBE_LIMIT,
+                               EC2_DESCRIBE_LIMIT)
+
+ASG_TAG = 'aws:autoscaling:groupName'
+
+
+class InstanceRecord(object):
+    """A compact record of one container instance."""
+
+    __slots__ = ('instanceid', 'cinstancearn', 'ami', 'asg', 'status',
+                 'agentconnected', 'runningtasks', 'pendingtasks')
+
+    def __init__(self, instanceid, cinstancearn, ami=None, asg=None,
+                 status=None, agentconnected=False, runningtasks=0,
+                 pendingtasks=0):
+        self.instanceid = instanceid
+        self.cinstancearn = cinstancearn
+        self.ami = ami
+        self.asg = asg
+        self.status = status
+        self.agentconnected = agentconnected
+        self.runningtasks = runningtasks
+        self.pendingtasks = pendingtasks
+
+    def to_row(self):
+        return [getattr(self, f) for f in self.__slots__]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+class ClusterSnapshot(object):
+    """
+    A point in time inventory of an ECS cluster's container instances.
+
+    Only the fields ecsopera needs are kept from the ECS and EC2 describe
+    responses, one slotted InstanceRecord per instance, with AMI ->
+    instances and ASG -> instances indexes built once up front. ASG
+    membership comes from the aws:autoscaling:groupName instance tag so no
+    ASG calls are needed.
+    """
+
+    def __init__(self, cluster, records):
+        self.cluster = cluster
+        self.instances = {}
+        self.byarn = {}
+        self.byami = {}
+        self.byasg = {}
+        for record in records:
+            self.instances[record.instanceid] = record
+            self.byarn[record.cinstancearn] = record.instanceid
+            self.byami.setdefault(record.ami, []).append(record.instanceid)
+            self.byasg.setdefault(record.asg, []).append(record.instanceid)
+
+    @classmethod
+    def collect(cls, ecs, ec2, cluster, status='ACTIVE'):
+        """Build a snapshot of cluster from the passed ECS/EC2 clients."""
+        arns = list(paginate(ecs, 'list_container_instances',
+                             'containerInstanceArns', cluster=cluster,
+                             status=status))
+        records = {}
+        for ci in batch_describe(ecs.describe_container_instances,
+                                 'containerInstances', arns,
+                                 'containerInstances', ECS_DESCRIBE_LIMIT,
+                                 cluster=cluster):
+            records[ci['ec2InstanceId']] = InstanceRecord(
+                ci['ec2InstanceId'],
+                ci['containerInstanceArn'],
+                status=ci['status'],
+                agentconnected=ci.get('agentConnected', False),
+                runningtasks=ci.get('runningTasksCount', 0),
+                pendingtasks=ci.get('pendingTasksCount', 0))
+        for reservation in batch_describe(ec2.describe_instances,
+                                          'InstanceIds', list(records),
+                                          'Reservations',
+                                          EC2_DESCRIBE_LIMIT):
+            for i in reservation['Instances']:
+                record = records[i['InstanceId']]
+                record.ami = i['ImageId']
+                for tag in i.get('Tags', []):
+                    if tag['Key'] == ASG_TAG:
+                        record.asg = tag['Value']
+        return cls(cluster, [records[a] for a in sorted(records)])
+
+    def to_rows(self):
+        return [r.to_row() for r in self.instances.values()]
+
+    @classmethod
+    def from_rows(cls, cluster, rows):
+        return cls(cluster, [InstanceRecord.from_row(r) for r in rows])
+
+    @property
+    def cinstances(self):
+        return [r.cinstancearn for r in self.instances.values()]
+
+    @property
+    def cimap(self):
+        """Return ec2 instance id -> container instance arn."""
+        return dict((iid, r.cinstancearn)
+                    for iid, r in self.instances.items())
+
+    def amis(self):
+        """Return the distinct AMI ids, sorted."""
+        return sorted(a for a in self.byami if a is not None)
+
+    def ami_instances(self, ami):
+        return [self.instances[i] for i in self.byami.get(ami, [])]
+
+    def asg_instances(self, asg):
+        return [self.instances[i] for i in self.byasg.get(asg, [])]
+
+    def task_count(self, asg=None, ami=None):
+        """Return the running task count, optionally of one ASG or AMI."""
+        if asg is not None:
+            records = self.asg_instances(asg)
+        elif ami is not None:
+            records = self.ami_instances(ami)
+        else:
+            records = self.instances.values()
+        return sum(r.runningtasks for r in records)
+
+    def report(self):
+        """Return the inventory as a list of report lines."""
+        lines = ['Cluster {0}: {1} container instances, {2} running '
+                 'tasks'.format(self.cluster, len(self.instances),
+                                self.task_count())]
+        for ami in self.amis():
+            lines.append('  AMI {0}: {1} instances, {2} running '
+                         'tasks'.format(ami, len(self.byami[ami]),
+                                        self.task_count(ami=ami)))
+        for asg in sorted(a for a in self.byasg if a is not None):
+            amis = sorted(set(r.ami for r in self.asg_instances(asg)
+                              if r.ami is not None))
+            lines.append('  ASG {0}: {1} instances, {2} running tasks, AMIs '
+                         '{3}'.format(asg, len(self.byasg[asg]),
+                                      self.task_count(asg=asg), amis))
+        unmanaged = self.byasg.get(None, [])
+        if unmanaged:
+            lines.append('  Not ASG managed: {0}'.format(sorted(unmanaged)))
+        disconnected = sorted(iid for iid, r in self.instances.items()
+                              if not r.agentconnected)
+        if disconnected:
+            lines.append('  Agent disconnected: {0}'.format(disconnected))
+        return lines
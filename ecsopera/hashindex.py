@@ -0,0 +1,107 @@
+# pylint: disable=C0111,C0103
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from s3transfer.utils import ChunksizeAdjuster
+
+INDEX_NAME = '.ecsopera-s3sync.index'
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def part_size(size, threshold, chunksize):
+    """
+    Return the part size s3transfer splits an upload of size bytes into, or
+    0 when it is uploaded in a single request.
+    """
+    if size < threshold:
+        return 0
+    return ChunksizeAdjuster().adjust_chunksize(chunksize, size)
+
+
+def file_etag(path, partsize=0, workers=HASH_WORKERS):
+    """
+    Return the ETag S3 gives the file at path from a single read of a
+    memory map of it: the md5 of the content or, when uploaded in parts of
+    partsize bytes, the md5 of the part md5s suffixed with the number of
+    parts. Every byte is hashed once, parts by up to workers threads as
+    hashlib releases the GIL.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return hashlib.md5().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                if not partsize:
+                    return hashlib.md5(view).hexdigest()
+                offsets = range(0, size, partsize)
+
+                def _part(offset):
+                    return hashlib.md5(
+                        view[offset:offset + partsize]).digest()
+
+                if len(offsets) > 1 and workers > 1:
+                    with ThreadPoolExecutor(
+                            max_workers=min(workers, len(offsets))) as pool:
+                        parts = list(pool.map(_part, offsets))
+                else:
+                    parts = [_part(o) for o in offsets]
+    return '{0}-{1}'.format(hashlib.md5(b''.join(parts)).hexdigest(),
+                            len(parts))
+
+
+class HashIndex(object):
+    """
+    A persisted local path -> ETag per part size index.
+
+    Entries are only trusted while the file's inode, size and mtime are
+    unchanged, so an unchanged tree is compared against the destination
+    without reading a single file. Only the ETag for the part size asked
+    for is computed. The index is written atomically to path on save.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (ValueError, OSError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        tmppath = '{0}.tmp'.format(self.path)
+        with open(tmppath, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmppath, self.path)
+
+    def etag(self, localp, partsize=0):
+        """Return the ETag of localp uploaded in parts of partsize."""
+        localp = os.path.abspath(localp)
+        st = os.stat(localp)
+        stamp = [st.st_ino, st.st_size, st.st_mtime_ns]
+        entry = self.entries.get(localp)
+        if (entry is None or entry[:3] != stamp or
+                not isinstance(entry[3], dict)):
+            entry = self.entries[localp] = stamp + [{}]
+        etags = entry[3]
+        # json only has string keys
+        if str(partsize) in etags:
+            self.hits += 1
+            return etags[str(partsize)]
+        self.misses += 1
+        etags[str(partsize)] = file_etag(localp, partsize)
+        return etags[str(partsize)]
+
+    def md5(self, localp):
+        """Return the md5 of localp, its ETag of a single part upload."""
+        return self.etag(localp)
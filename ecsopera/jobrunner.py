@@ -0,0 +1,64 @@
+# pylint: disable=C0111,C0103,R0903,W0703
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobResult(object):
+    """The outcome of a single job run by run_jobs."""
+
+    def __init__(self, name, ok, value=None, error=None, elapsed=0):
+        self.name = name
+        self.ok = ok
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+
+def job_logger(log, name):
+    """Return a copy of log that prefixes messages with the job name."""
+    jlog = copy.copy(log)
+    jlog.cmdname = '{0} [{1}]'.format(log.cmdname, name)
+    return jlog
+
+
+def run_job(name, func):
+    """Run a single job, returning its JobResult."""
+    start = time.monotonic()
+    try:
+        value = func()
+    except (Exception, SystemExit) as e:
+        return JobResult(name, False, error=e,
+                         elapsed=time.monotonic() - start)
+    return JobResult(name, True, value=value,
+                     elapsed=time.monotonic() - start)
+
+
+def run_jobs(jobs, maxworkers):
+    """
+    Run (name, callable) jobs on a pool of at most maxworkers threads.
+
+    A failing job, including one raising SystemExit, does not affect the
+    others. Returns a JobResult per job in the passed order.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(maxworkers, len(jobs))) as pool:
+        futures = [pool.submit(run_job, name, func) for name, func in jobs]
+        return [f.result() for f in futures]
+
+
+def log_job_summary(results, log):
+    """Log a consolidated summary of job results, returning failed count."""
+    failed = [r for r in results if not r.ok]
+    for r in results:
+        if r.ok:
+            log.info('{0}: succeeded in {1:.0f}s'.format(r.name, r.elapsed))
+        else:
+            log.error('{0}: failed in {1:.0f}s: {2}'.format(r.name,
+                                                           r.elapsed,
+                                                           r.error))
+    log.info('{0} of {1} jobs succeeded.'.format(len(results) - len(failed),
+                                                  len(results)))
+    return len(failed)
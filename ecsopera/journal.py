@@ -0,0 +1,85 @@
+# pylint: disable=C0111,C0103
+import json
+import os
+import time
+
+
+class RolloutJournal(object):
+    """
+    An append-only, crash safe journal of completed rollout steps.
+
+    Every step is appended as one JSON line and fsynced before record
+    returns, so a step is only ever journalled once it has completed. On
+    load a torn final line left by a crash mid-write is truncated away.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Read the journal entries, dropping a torn final line."""
+        self.entries = []
+        if not self.exists():
+            return self.entries
+        good = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    self.entries.append(json.loads(line.decode('utf-8')))
+                except ValueError:
+                    break
+                good += len(line)
+        if good != os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good)
+                os.fsync(f.fileno())
+        return self.entries
+
+    def record(self, step, **data):
+        """Durably append a completed step with its data."""
+        entry = dict(data, step=step, time=time.time())
+        created = not self.exists()
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        if created:
+            self._sync_dir()
+        self.entries.append(json.loads(json.dumps(entry, default=str)))
+        return entry
+
+    def _sync_dir(self):
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)),
+                         os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def all(self, step):
+        """Return every journalled entry of the passed step."""
+        return [e for e in self.entries if e['step'] == step]
+
+    def get(self, step):
+        """Return the last journalled entry of the passed step or None."""
+        found = self.all(step)
+        return found[-1] if found else None
+
+    def done(self, step):
+        return self.get(step) is not None
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
+        self.entries = []
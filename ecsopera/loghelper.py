@@ -32,6 +32,9 @@ class LogHelper(object):
     def info(self, msg):
         return logging.info(self._join_log_msg(msg))
 
+    def debug(self, msg):
+        return logging.debug(self._join_log_msg(msg))
+
     # TODO: Include project info into this method as part of banner.
     def display_banner(self):
         print(self.banner)
@@ -0,0 +1,144 @@
+# pylint: disable=C0111,C0103
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import yaml
+from ecsopera.jobrunner import JobResult, run_job, job_logger
+
+DEFAULT_MANIFEST_WORKERS = 10
+
+# Required keys for each manifest step type, a tuple means exactly one of
+# the keys.
+STEP_TYPES = {
+    'ecs-deploy': ('cluster', 'service', 'image'),
+    'ecs-amiupdate': ('cluster', ('launchcfg', 'launchtemplate'), 'ami'),
+    's3-deploy': ('source', 'destination'),
+}
+
+
+def load_manifest(path):
+    """Load and validate a release manifest file."""
+    with open(path) as f:
+        manifest = yaml.safe_load(f)
+    validate_manifest(manifest)
+    return manifest
+
+
+def validate_manifest(manifest):
+    """Raise ValueError if the passed manifest is malformed."""
+    if not isinstance(manifest, dict) or not isinstance(
+            manifest.get('steps'), list) or not manifest['steps']:
+        raise ValueError("Manifest must contain a list of steps.")
+    maxworkers = manifest.get('maxworkers', DEFAULT_MANIFEST_WORKERS)
+    if (not isinstance(maxworkers, int) or isinstance(maxworkers, bool) or
+            maxworkers < 1):
+        raise ValueError("Manifest maxworkers must be a positive integer, "
+                         "got {0}.".format(maxworkers))
+    names = set()
+    launchsources = {}
+    for step in manifest['steps']:
+        if not isinstance(step, dict) or 'name' not in step:
+            raise ValueError("Every manifest step needs a name.")
+        if step['name'] in names:
+            raise ValueError("Duplicate manifest step {0}.".format(
+                step['name']))
+        names.add(step['name'])
+        if step.get('type') not in STEP_TYPES:
+            raise ValueError("Step {0} has unknown type {1}, expected one "
+                             "of {2}.".format(step['name'], step.get('type'),
+                                              sorted(STEP_TYPES)))
+        missing = [k for k in STEP_TYPES[step['type']]
+                   if not (set(k) if isinstance(k, tuple) else set([k])) &
+                   set(step)]
+        if missing:
+            raise ValueError("Step {0} is missing {1}.".format(step['name'],
+                                                                missing))
+        exclusive = [sorted(set(k) & set(step))
+                     for k in STEP_TYPES[step['type']]
+                     if isinstance(k, tuple) and len(set(k) & set(step)) > 1]
+        if exclusive:
+            raise ValueError("Step {0} sets more than one of {1}.".format(
+                step['name'], exclusive[0]))
+        if step['type'] == 'ecs-amiupdate':
+            source = (step.get('launchcfg', step.get('launchtemplate')),
+                      step.get('region'))
+            if source in launchsources:
+                raise ValueError("Steps {0} and {1} both update launch "
+                                 "configuration/template {2}.".format(
+                                     launchsources[source], step['name'],
+                                     source[0]))
+            launchsources[source] = step['name']
+    for step in manifest['steps']:
+        if not isinstance(step.get('depends_on', []), list):
+            raise ValueError("Step {0} depends_on must be a list of step "
+                             "names.".format(step['name']))
+        for dep in step.get('depends_on', []):
+            if dep not in names:
+                raise ValueError("Step {0} depends on unknown step "
+                                 "{1}.".format(step['name'], dep))
+    build_waves(manifest['steps'])
+
+
+def build_waves(steps):
+    """
+    Group steps into waves where every step only depends on steps in
+    earlier waves. Raises ValueError if the dependencies contain a cycle.
+    """
+    remaining = dict((s['name'], set(s.get('depends_on', []))) for s in steps)
+    order = [s['name'] for s in steps]
+    done = set()
+    waves = []
+    while remaining:
+        wave = [n for n in order if n in remaining and remaining[n] <= done]
+        if not wave:
+            raise ValueError("Manifest steps have a dependency cycle "
+                             "between {0}.".format(sorted(remaining)))
+        for name in wave:
+            del remaining[name]
+        done.update(wave)
+        waves.append(wave)
+    return waves
+
+
+def run_manifest(manifest, runners, maxworkers, log):
+    """
+    Run manifest steps on a pool of at most maxworkers threads, starting
+    each step as soon as the steps it depends on have finished. runners
+    maps a step type to a callable taking (step, log). Steps whose
+    dependencies failed are skipped. Returns a JobResult per step in
+    manifest order.
+    """
+    order = [s['name'] for s in manifest['steps']]
+    steps = dict((s['name'], s) for s in manifest['steps'])
+    waiting = dict((s['name'], set(s.get('depends_on', [])))
+                   for s in manifest['steps'])
+    done = set()
+    failed = set()
+    results = {}
+    running = set()
+
+    with ThreadPoolExecutor(max_workers=maxworkers) as pool:
+        while waiting or running:
+            for name in [n for n in order if n in waiting]:
+                blocked = failed & waiting[name]
+                if blocked:
+                    log.error("Skipping {0}, dependencies failed: {1}".format(
+                        name, sorted(blocked)))
+                    failed.add(name)
+                    results[name] = JobResult(name, False, error=SystemExit(
+                        "Skipped, dependencies failed."))
+                elif waiting[name] <= done:
+                    log.info("Starting step {0}....".format(name))
+                    step = steps[name]
+                    running.add(pool.submit(
+                        run_job, name, lambda s=step: runners[s['type']](
+                            s, job_logger(log, s['name']))))
+                else:
+                    continue
+                del waiting[name]
+            if not running:
+                continue
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                results[result.name] = result
+                (done if result.ok else failed).add(result.name)
+    return [results[name] for name in order]
@@ -0,0 +1,112 @@
+# pylint: disable=C0111,C0103
+from collections import Counter
+import numpy as np
+
+PLACEMENT_CHECKS = ('warn', 'refuse', 'off')
+
+
+def resource_value(resources, name):
+    """Return the value of the named ECS container instance resource."""
+    for res in resources:
+        if res['name'] == name:
+            if res['type'] == 'STRINGSET':
+                return res.get('stringSetValue', [])
+            return res.get('integerValue', 0)
+    return None
+
+
+def task_requirements(taskdef):
+    """
+    Return (cpu, memory, host ports) reserved by a task of the passed task
+    definition. Task level cpu/memory win over the container sums and only
+    static host ports of bridge and host mode tasks can clash.
+    """
+    containers = taskdef.get('containerDefinitions', [])
+    cpu = taskdef.get('cpu')
+    if cpu is None:
+        cpu = sum(c.get('cpu', 0) for c in containers)
+    memory = taskdef.get('memory')
+    if memory is None:
+        memory = sum(c.get('memoryReservation') or c.get('memory') or 0
+                     for c in containers)
+    mode = taskdef.get('networkMode', 'bridge')
+    ports = set()
+    if mode in ('bridge', 'host'):
+        for c in containers:
+            for mapping in c.get('portMappings', []):
+                port = mapping.get('hostPort')
+                if mode == 'host' and not port:
+                    port = mapping.get('containerPort')
+                if port:
+                    ports.add(int(port))
+    return int(cpu), int(memory), tuple(sorted(ports))
+
+
+class PlacementPlan(object):
+    """The outcome of simulating task placement onto a fleet."""
+
+    def __init__(self, fleetsize, cpu, memory, placed, unplaced):
+        self.fleetsize = fleetsize
+        self.cpu = cpu
+        self.memory = memory
+        self.placed = placed
+        self.unplaced = unplaced
+
+    @property
+    def fits(self):
+        return not self.unplaced
+
+    @property
+    def unplaced_count(self):
+        return sum(self.unplaced.values())
+
+
+def simulate_placement(fleet, tasks):
+    """
+    Simulate bin-packing tasks onto a fleet of described container
+    instances using their remainingResources.
+
+    tasks is a list of (cpu, memory, host ports) requirements, one per
+    task. Identical requirements are placed together, largest first, with
+    one vectorized first fit pass over the fleet per distinct requirement
+    so the cost grows with the number of task shapes, not tasks.
+    """
+    groups = Counter(tasks)
+    cpu = np.array([resource_value(ci['remainingResources'], 'CPU') or 0
+                    for ci in fleet], dtype=np.int64)
+    memory = np.array([resource_value(ci['remainingResources'], 'MEMORY') or 0
+                       for ci in fleet], dtype=np.int64)
+    ports = sorted(set(p for req in groups for p in req[2]))
+    portindex = dict((p, i) for i, p in enumerate(ports))
+    used = np.zeros((len(fleet), len(ports)), dtype=bool)
+    for i, ci in enumerate(fleet):
+        reserved = resource_value(ci['remainingResources'], 'PORTS') or []
+        for port in reserved:
+            if int(port) in portindex:
+                used[i, portindex[int(port)]] = True
+    total = (int(cpu.sum()), int(memory.sum()))
+    placed = {}
+    unplaced = {}
+    for req in sorted(groups, key=lambda r: (r[0], r[1], len(r[2])),
+                      reverse=True):
+        rcpu, rmemory, rports = req
+        count = groups[req]
+        capacity = np.full(len(fleet), count, dtype=np.int64)
+        if rcpu:
+            capacity = np.minimum(capacity, cpu // rcpu)
+        if rmemory:
+            capacity = np.minimum(capacity, memory // rmemory)
+        if rports:
+            columns = [portindex[p] for p in rports]
+            free = ~used[:, columns].any(axis=1)
+            capacity = np.where(free, np.minimum(capacity, 1), 0)
+        before = np.cumsum(capacity) - capacity
+        take = np.clip(count - before, 0, capacity)
+        cpu -= take * rcpu
+        memory -= take * rmemory
+        if rports:
+            used[np.ix_(take > 0, columns)] = True
+        placed[req] = int(take.sum())
+        if placed[req] < count:
+            unplaced[req] = count - placed[req]
+    return PlacementPlan(len(fleet), total[0], total[1], placed, unplaced)
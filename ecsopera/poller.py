@@ -0,0 +1,66 @@
+# pylint: disable=C0111,C0103,R0913
+import random
+import time
+
+DEFAULT_POLL_INTERVAL = 2
+DEFAULT_MAX_POLL_INTERVAL = 15
+
+
+class Poller(object):
+    """
+    Poll a check until it passes, an abort check fires or a deadline
+    measured on the monotonic clock is reached.
+
+    The sleep between checks starts at interval and grows by backoff up to
+    maxinterval, with +/- jitter applied so concurrent pollers spread out.
+    """
+
+    def __init__(self, timeout, interval=DEFAULT_POLL_INTERVAL,
+                 maxinterval=DEFAULT_MAX_POLL_INTERVAL, backoff=1.5,
+                 jitter=0.2, clock=time.monotonic, sleep=time.sleep):
+        if interval <= 0 or maxinterval < interval:
+            raise ValueError("Poll interval must be > 0 and <= max "
+                             "poll interval.")
+        self.timeout = timeout
+        self.interval = interval
+        self.maxinterval = maxinterval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.clock = clock
+        self.sleep = sleep
+        self.elapsed = 0
+        self.polls = 0
+        self.aborted = False
+
+    def _delay(self, interval, remaining):
+        delay = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0, min(delay, remaining))
+
+    def poll(self, until, abort=None, ontick=None):
+        """
+        Return True as soon as until() passes, or False on timeout or once
+        abort() passes. ontick is called with the elapsed seconds before
+        each sleep.
+        """
+        start = self.clock()
+        deadline = start + self.timeout
+        interval = self.interval
+        self.aborted = False
+        self.polls = 0
+        while True:
+            self.polls += 1
+            if until():
+                self.elapsed = self.clock() - start
+                return True
+            if abort is not None and abort():
+                self.elapsed = self.clock() - start
+                self.aborted = True
+                return False
+            now = self.clock()
+            self.elapsed = now - start
+            if now >= deadline:
+                return False
+            if ontick is not None:
+                ontick(self.elapsed)
+            self.sleep(self._delay(interval, deadline - now))
+            interval = min(interval * self.backoff, self.maxinterval)
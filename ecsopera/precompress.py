@@ -0,0 +1,176 @@
+# pylint: disable=C0111,C0103,R0902,R0913
+import gzip
+import io
+import mimetypes
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_ENCODINGS = ('off', 'gzip', 'br')
+CACHE_NAME = '.ecsopera-precompress'
+EXTENSIONS = {'gzip': '.gz', 'br': '.br'}
+# Files smaller than this gain nothing from compression.
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_TYPES = frozenset([
+    'application/javascript',
+    'application/x-javascript',
+    'application/json',
+    'application/manifest+json',
+    'application/xml',
+    'application/wasm',
+    'application/vnd.ms-fontobject',
+    'font/otf',
+    'font/ttf',
+    'application/x-font-ttf',
+    'image/svg+xml',
+    'image/x-icon',
+    'image/vnd.microsoft.icon',
+])
+
+
+def compressible(ctype):
+    return ctype is not None and (ctype.startswith('text/') or
+                                  ctype in COMPRESSIBLE_TYPES)
+
+
+def compress_data(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9,
+                       mtime=0) as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def compress_file(localp, cachep, encoding):
+    """
+    Compress localp into cachep, returning False and leaving an empty
+    cachep.raw marker instead when compression does not make it smaller.
+    Runs in a worker process.
+    """
+    with open(localp, 'rb') as f:
+        data = f.read()
+    compressed = compress_data(data, encoding)
+    if len(compressed) >= len(data):
+        cachep += '.raw'
+        compressed = b''
+    tmppath = '{0}.{1}.tmp'.format(cachep, os.getpid())
+    with open(tmppath, 'wb') as f:
+        f.write(compressed)
+    os.replace(tmppath, cachep)
+    return not cachep.endswith('.raw')
+
+
+class Precompressor(object):
+    """
+    A pipeline stage setting the Content-Type of (local path, key, size)
+    files and swapping compressible ones for a gzip or brotli compressed
+    copy with its Content-Encoding.
+
+    Compressed copies live in cachedir named by the md5 of their source,
+    taken from the hash index, so an unchanged file is neither read nor
+    recompressed. Cache misses are compressed in a process pool while
+    cached files are already passed on downstream.
+    """
+
+    def __init__(self, encoding, cachedir, index, log, workers=None):
+        if encoding == 'br' and brotli is None:
+            raise SystemExit("brotli is not installed, install it with pip "
+                             "install ecsopera[brotli]...Exit")
+        self.encoding = encoding
+        self.cachedir = cachedir
+        self.index = index
+        self.log = log
+        self.workers = workers
+        self.compressed = 0
+        self.cached = 0
+        self.rawsize = 0
+        self.size = 0
+
+    def cache_path(self, localp):
+        return os.path.join(self.cachedir, self.index.md5(localp) +
+                            EXTENSIONS[self.encoding])
+
+    def _cached(self, localp, key, size, extra, cachep):
+        self.rawsize += size
+        if os.path.exists(cachep):
+            size = os.path.getsize(cachep)
+            self.size += size
+            return cachep, key, size, dict(extra,
+                                           ContentEncoding=self.encoding)
+        self.size += size
+        return localp, key, size, extra
+
+    def stage(self, files):
+        """
+        Return an iterator of (upload path, key, size, extra args) for every
+        file. Cache misses are all submitted to the process pool before
+        this returns, so its workers are forked before the caller starts
+        any transfer threads, and are yielded as they complete. Files with
+        the same content share one cache path and so one compression.
+        """
+        ready = []
+        pending = {}
+        pool = None
+        try:
+            for localp, key, size in files:
+                ctype, cenc = mimetypes.guess_type(key)
+                extra = {}
+                if ctype is not None and cenc is None:
+                    extra['ContentType'] = ctype
+                if (self.encoding == 'off' or cenc is not None or
+                        size < MIN_COMPRESS_SIZE or not compressible(ctype)):
+                    ready.append((localp, key, size, extra))
+                    continue
+                cachep = self.cache_path(localp)
+                if (os.path.exists(cachep) or
+                        os.path.exists(cachep + '.raw')):
+                    self.cached += 1
+                    ready.append(self._cached(localp, key, size, extra,
+                                              cachep))
+                    continue
+                if cachep in pending:
+                    self.cached += 1
+                    pending[cachep][1].append((localp, key, size, extra,
+                                               cachep))
+                    continue
+                if pool is None:
+                    os.makedirs(self.cachedir, exist_ok=True)
+                    pool = ProcessPoolExecutor(max_workers=self.workers)
+                future = pool.submit(compress_file, localp, cachep,
+                                     self.encoding)
+                pending[cachep] = (future, [(localp, key, size, extra,
+                                             cachep)])
+        except BaseException:
+            if pool is not None:
+                pool.shutdown()
+            raise
+        return self._iter_staged(ready, pending, pool)
+
+    def _iter_staged(self, ready, pending, pool):
+        staged = dict(pending.values())
+        try:
+            for item in ready:
+                yield item
+            for future in as_completed(staged):
+                future.result()
+                self.compressed += 1
+                for item in staged[future]:
+                    yield self._cached(*item)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        if self.compressed or self.cached:
+            self.log_summary()
+
+    def log_summary(self):
+        self.log.info("Precompressed {0} files with {1}, {2} from cache, "
+                      "{3:.1f} MiB -> {4:.1f} MiB....".format(
+                          self.compressed + self.cached, self.encoding,
+                          self.cached, self.rawsize / 1048576.0,
+                          self.size / 1048576.0))
@@ -0,0 +1,342 @@
+# pylint: disable=C0111,C0103,R0913
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from botocore.exceptions import ClientError
+from s3transfer.manager import TransferConfig, TransferManager
+from s3transfer.subscribers import BaseSubscriber
+from ecsopera.awsbatch import paginate
+
+MB = 1024 * 1024
+DEFAULT_CONCURRENCY = 10
+DEFAULT_MULTIPART_THRESHOLD = 8 * MB
+DEFAULT_MULTIPART_CHUNKSIZE = 8 * MB
+PROGRESS_LOG_INTERVAL = 5
+FAILURES_LOGGED = 10
+# delete_objects does not accept more than 1000 keys per request.
+DELETE_BATCH_SIZE = 1000
+# User metadata key recording the source ETag of multipart copies.
+SOURCE_ETAG_METADATA = 'source-etag'
+COPIED_METADATA_FIELDS = ('CacheControl', 'ContentDisposition',
+                          'ContentEncoding', 'ContentLanguage',
+                          'ContentType', 'Expires')
+
+
+def transfer_config(concurrency=DEFAULT_CONCURRENCY,
+                    threshold=DEFAULT_MULTIPART_THRESHOLD,
+                    chunksize=DEFAULT_MULTIPART_CHUNKSIZE):
+    """Return an s3transfer config for concurrency in flight requests."""
+    return TransferConfig(multipart_threshold=threshold,
+                          multipart_chunksize=chunksize,
+                          max_request_concurrency=concurrency,
+                          max_submission_concurrency=concurrency,
+                          max_submission_queue_size=concurrency * 10)
+
+
+def walk_files(src):
+    """Yield (local path, key, size) for every file below src."""
+    for root, _, files in os.walk(src):
+        for filename in files:
+            localp = os.path.join(root, filename)
+            key = os.path.relpath(localp, src).replace(os.sep, '/')
+            yield localp, key, os.path.getsize(localp)
+
+
+def iter_objects(client, bucket):
+    """Yield (key, size, ETag) of every object in bucket, page by page."""
+    for o in paginate(client, 'list_objects_v2', 'Contents', Bucket=bucket):
+        yield o['Key'], o['Size'], o['ETag'].strip('"')
+
+
+def iter_batches(items, size):
+    """Lazily split an iterable into lists of at most size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def listed(objects, keys, index=0):
+    """Pass objects through, adding their index item to the keys set."""
+    for obj in objects:
+        keys.add(obj[index])
+        yield obj
+
+
+def list_objects(client, bucket):
+    """
+    Return key -> (ETag, size) of every object in bucket from a single
+    paginated listing.
+    """
+    return dict((key, (etag, size))
+                for key, size, etag in iter_objects(client, bucket))
+
+
+def etag_parts(etag):
+    """Return the number of parts of a multipart ETag, 0 for an md5."""
+    _, sep, parts = etag.strip('"').partition('-')
+    return int(parts) if sep else 0
+
+
+def same_object(src, dst, copied=None):
+    """
+    Return whether the (ETag, size) listings src and dst show the same
+    content. Copies above the multipart threshold get a multipart ETag
+    whatever the source ETag is, so for those the source ETag recorded on
+    dst when it was copied, copied, is compared instead. Equal sizes alone
+    never count as the same content.
+    """
+    if dst is None or src[1] != dst[1]:
+        return False
+    if src[0] == dst[0]:
+        return True
+    return copied is not None and copied.strip('"') == src[0].strip('"')
+
+
+def copied_etags(client, bucket, keys, workers):
+    """
+    Return key -> the source ETag copy_objects recorded on each of the keys
+    of bucket, heading workers objects at a time. Keys without one are
+    left out.
+    """
+    def _head(key):
+        meta = client.head_object(Bucket=bucket, Key=key)['Metadata']
+        return key, meta.get(SOURCE_ETAG_METADATA)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict((key, etag) for key, etag in pool.map(_head, keys)
+                    if etag is not None)
+
+
+def copy_metadata(head, extra_args, etag):
+    """
+    Return the extra args of a multipart copy: a multipart copy does not
+    keep the source metadata, so the head_object response head is copied
+    under extra_args along with the source ETag.
+    """
+    args = dict((field, head[field]) for field in COPIED_METADATA_FIELDS
+                if field in head)
+    args.update(extra_args)
+    args['Metadata'] = dict(head.get('Metadata', {}))
+    args['Metadata'][SOURCE_ETAG_METADATA] = etag.strip('"')
+    args['MetadataDirective'] = 'REPLACE'
+    return args
+
+
+class TransferProgress(object):
+    """
+    Thread safe progress of a batch of transfers, logged at most once every
+    interval seconds instead of once per object. files and size may be
+    None when the batch is streamed and its totals are not known.
+    """
+
+    def __init__(self, files, size, log, verb='Uploaded',
+                 interval=PROGRESS_LOG_INTERVAL, clock=time.monotonic):
+        self.files = files
+        self.size = size
+        self.log = log
+        self.verb = verb
+        self.interval = interval
+        self.clock = clock
+        self.done = 0
+        self.transferred = 0
+        self.failed = []
+        self.started = clock()
+        self._logged = self.started
+        self._lock = threading.Lock()
+
+    def add(self, transferred=0, done=0):
+        with self._lock:
+            self.transferred += transferred
+            self.done += done
+            now = self.clock()
+            if now - self._logged < self.interval:
+                return
+            self._logged = now
+        self.log_progress()
+
+    def fail(self, key, error):
+        with self._lock:
+            self.failed.append((key, error))
+
+    @property
+    def elapsed(self):
+        return self.clock() - self.started
+
+    def log_progress(self):
+        elapsed = max(self.elapsed, 0.001)
+        done = '{0}'.format(self.done)
+        transferred = '{0:.1f}'.format(self.transferred / float(MB))
+        if self.files is not None:
+            done = '{0}/{1}'.format(done, self.files)
+        if self.size is not None:
+            transferred = '{0}/{1:.1f}'.format(transferred,
+                                               self.size / float(MB))
+        self.log.info("{0} {1} objects, {2} MiB ({3:.1f} objects/s, "
+                      "{4:.1f} MiB/s)....".format(
+                          self.verb, done, transferred,
+                          self.done / elapsed,
+                          self.transferred / float(MB) / elapsed))
+
+    def raise_failed(self):
+        """Log the failed transfers and re-raise the first error."""
+        if not self.failed:
+            return
+        for key, error in self.failed[:FAILURES_LOGGED]:
+            self.log.error("{0} failed: {1}....".format(key, error))
+        if len(self.failed) > FAILURES_LOGGED:
+            self.log.error("{0} more transfers failed....".format(
+                len(self.failed) - FAILURES_LOGGED))
+        raise self.failed[0][1]
+
+
+class ProgressSubscriber(BaseSubscriber):
+    """
+    Feed s3transfer progress callbacks into a TransferProgress, recording
+    failures instead of keeping every future around. A known size and ETag
+    are handed to s3transfer up front so it does not head the object.
+    """
+
+    def __init__(self, progress, key, size=None, etag=None):
+        self.progress = progress
+        self.key = key
+        self.size = size
+        self.etag = etag
+
+    def on_queued(self, future, **kwargs):
+        if self.size is not None:
+            future.meta.provide_transfer_size(self.size)
+        if self.etag is not None and hasattr(future.meta,
+                                             'provide_object_etag'):
+            future.meta.provide_object_etag(self.etag)
+
+    def on_progress(self, future, bytes_transferred, **kwargs):
+        self.progress.add(transferred=bytes_transferred)
+
+    def on_done(self, future, **kwargs):
+        try:
+            future.result()
+        except Exception as e:  # pylint: disable=W0703
+            self.progress.fail(self.key, e)
+        self.progress.add(done=1)
+
+
+def upload_files(client, bucket, files, extra_args, config, log,
+                 count=None, size=None):
+    """
+    Upload (local path, key, size[, extra args]) files to bucket through
+    one shared TransferManager. Its thread pools bound the requests in
+    flight to the config's concurrency and large files are split into
+    multipart uploads that share the same pool. Per file extra args are
+    merged over extra_args. files may be lazy, count and size are the
+    totals reported when known. Returns the TransferProgress.
+    """
+    progress = TransferProgress(count, size, log)
+    with TransferManager(client, config) as manager:
+        for item in files:
+            localp, key = item[0], item[1]
+            args = dict(extra_args)
+            if len(item) > 3:
+                args.update(item[3])
+            manager.upload(localp, bucket, key, extra_args=args,
+                           subscribers=[ProgressSubscriber(progress, key)])
+    progress.log_progress()
+    progress.raise_failed()
+    return progress
+
+
+def copy_objects(client, src, dst, objects, extra_args, config, log,
+                 files=None, size=None):
+    """
+    Server side copy (key, size, ETag[, source key, extra args]) objects
+    from the src to the dst bucket through one shared TransferManager.
+    objects may be a lazy paginated listing: submission blocks once the
+    config's submission queue is full, so only a bounded number of copies
+    are in flight while later pages are fetched. Objects below the
+    multipart threshold are copied with a single copy_object request,
+    larger ones with a multipart copy that records the source ETag in the
+    copy's metadata, see same_object. Returns the TransferProgress.
+    """
+    progress = TransferProgress(files, size, log, verb='Copied')
+    with TransferManager(client, config) as manager:
+        for item in objects:
+            key, objsize, etag = item[:3]
+            srckey = item[3] if len(item) > 3 else key
+            args = dict(extra_args)
+            if len(item) > 4:
+                args.update(item[4])
+            if objsize >= config.multipart_threshold:
+                head = client.head_object(Bucket=src, Key=srckey)
+                objsize = head['ContentLength']
+                etag = head['ETag']
+                args = copy_metadata(head, args, etag)
+            subscriber = ProgressSubscriber(progress, key, objsize, etag)
+            manager.copy({'Bucket': src, 'Key': srckey}, dst, key,
+                         extra_args=args, subscribers=[subscriber])
+    progress.log_progress()
+    progress.raise_failed()
+    return progress
+
+
+def dedup_files(files, digest):
+    """
+    Split (local path, key, size[, extra args]) files into the first file
+    of every group sharing the same digest(local path, size), size and
+    extra args, and (key, size, digest, first key, extra args) copies of
+    the others.
+    """
+    first = {}
+    unique = []
+    copies = []
+    for item in files:
+        localp, key, size = item[:3]
+        extra = item[3] if len(item) > 3 else {}
+        group = (digest(localp, size), size,
+                 tuple(sorted(extra.items())))
+        if group in first:
+            copies.append((key, size, group[0], first[group], extra))
+        else:
+            first[group] = key
+            unique.append(item)
+    return unique, copies
+
+
+def delete_keys(client, bucket, keys, workers, log):
+    """
+    Delete keys from bucket with delete_objects batches of up to 1000 keys
+    run by workers threads. keys may be a lazy listing, at most twice
+    workers batches are queued while later keys are fetched. Returns the
+    TransferProgress.
+    """
+    progress = TransferProgress(None, None, log, verb='Deleted')
+
+    def _delete(batch):
+        errors = client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': k} for k in batch], 'Quiet': True}
+        ).get('Errors', [])
+        for error in errors:
+            progress.fail(error['Key'], ClientError(
+                {'Error': {'Code': error.get('Code'),
+                           'Message': error.get('Message')}},
+                'DeleteObjects'))
+        progress.add(done=len(batch) - len(errors))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for batch in iter_batches(keys, DELETE_BATCH_SIZE):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(pool.submit(_delete, batch))
+        for future in pending:
+            future.result()
+    progress.log_progress()
+    progress.raise_failed()
+    return progress
@@ -9,7 +9,9 @@ setup(name='ecsopera',
       license='MIT',
       packages=find_packages(exclude=['tests']),
       include_package_data=True,
-      install_requires=['click', 'boto3', 'moto', 'progressbar2', 'pytest'],
+      install_requires=['click', 'boto3', 'moto', 'progressbar2', 'pytest',
+                        'pyyaml', 'numpy'],
+      extras_require={'brotli': ['brotli']},
       zip_safe=False,
       entry_points={
         'console_scripts': [
@@ -0,0 +1,90 @@
+import moto
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from ecsopera.awsamitemplate import AWSECSAmiTemplateUpdate
+
+
+class TestAWSECSAmiTemplateUpdate(object):
+
+    @moto.mock_ec2
+    def test_create_template_version(self):
+        ec2 = boto3.client('ec2', region_name='eu-west-1')
+        ec2.create_launch_template(
+            LaunchTemplateName='lt1',
+            LaunchTemplateData={'ImageId': 'ami-12c6146b',
+                                'InstanceType': 't2.micro'})
+        amiupdate = AWSECSAmiTemplateUpdate.__new__(AWSECSAmiTemplateUpdate)
+        amiupdate.accesskey = 'akey'
+        amiupdate.secretkey = 'skey'
+        amiupdate.region = 'eu-west-1'
+        amiupdate.ami = 'ami-1234abcd'
+        amiupdate._lcname = 'lt1'
+        amiupdate.currentlc = amiupdate.get_asg_launch_conf()
+        assert amiupdate.oldversion == 1
+        amiupdate.newversion = amiupdate.create_template_version()
+        assert amiupdate.newversion == 2
+        assert amiupdate.launch_source() == {
+            'LaunchTemplate': {'LaunchTemplateName': 'lt1', 'Version': '2'}}
+        versions = ec2.describe_launch_template_versions(
+            LaunchTemplateName='lt1',
+            Versions=['2'])['LaunchTemplateVersions']
+        assert versions[0]['LaunchTemplateData']['ImageId'] == 'ami-1234abcd'
+        assert amiupdate.copy_launch_conf() is None
+
+    def test_rollback(self, mocker):
+        amiupdate = AWSECSAmiTemplateUpdate.__new__(AWSECSAmiTemplateUpdate)
+        amiupdate._lcname = 'lt1'
+        amiupdate.currentlc = {'VersionNumber': 1}
+        amiupdate.currentasgs = [
+            {'AutoScalingGroupName': 'old1', 'MinSize': 2, 'MaxSize': 6,
+             'DesiredCapacity': 3,
+             'LaunchTemplate': {'LaunchTemplateName': 'lt1',
+                                'Version': '$Latest'}},
+            {'AutoScalingGroupName': 'old2', 'MinSize': 1, 'MaxSize': 4,
+             'DesiredCapacity': 2,
+             'LaunchTemplate': {'LaunchTemplateName': 'lt1',
+                                'Version': '$Default'}}]
+        amiupdate.newasgs = {'old1': 'new1', 'old2': 'new2'}
+        amiupdate.cinstances = ['arn-1', 'arn-2']
+        amiupdate.cimap = {'i-1': 'arn-1', 'i-2': 'arn-2'}
+        amiupdate.terminated = ['i-1']
+        amiupdate.log = mocker.Mock()
+        amiupdate.journal = mocker.Mock()
+        mocker.patch.object(amiupdate, 'set_default_version')
+        mocker.patch.object(amiupdate, 'set_asg_template_version')
+        mocker.patch.object(amiupdate, 'set_asg_capacity')
+        mocker.patch.object(amiupdate, 'get_existing_asg_names',
+                            return_value=set(['old1', 'old2']))
+        mocker.patch.object(amiupdate, 'activate_ecs_container_instances',
+                            return_value=['arn-2'])
+        amiupdate.rollback()
+        amiupdate.set_default_version.assert_called_once_with(1)
+        assert sorted(c[0] for c in
+                      amiupdate.set_asg_template_version.call_args_list) == [
+            ('new1', 1), ('new2', 1), ('old1', 1)]
+        assert amiupdate.set_asg_capacity.call_args_list == [
+            mocker.call('old1', minsize=2, maxsize=6, desired=3),
+            mocker.call('old2', minsize=1, maxsize=4, desired=2)]
+        assert amiupdate.journal.remove.called
+        amiupdate.activate_ecs_container_instances.assert_called_once_with(
+            ['arn-2'])
+
+    def test_rollout_error_rolls_back(self, mocker):
+        amiupdate = AWSECSAmiTemplateUpdate.__new__(AWSECSAmiTemplateUpdate)
+        amiupdate._lcname = 'lt1'
+        amiupdate.currentlc = {'VersionNumber': 1}
+        amiupdate.newversion = 2
+        amiupdate.cinstances = []
+        amiupdate.currentamis = []
+        amiupdate.currentasgs = []
+        amiupdate.asgicount = 0
+        amiupdate.log = mocker.Mock()
+        error = ClientError({'Error': {'Code': 'Throttling'}},
+                            'UpdateAutoScalingGroup')
+        mocker.patch.object(amiupdate, '_replace_capacity',
+                            side_effect=error)
+        mocker.patch.object(amiupdate, 'rollback')
+        with pytest.raises(ClientError):
+            amiupdate.ami_rollout_init()
+        assert amiupdate.rollback.called
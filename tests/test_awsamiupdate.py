@@ -5,6 +5,8 @@ import boto3
 import re
 import json
 from itertools import groupby
+from ecsopera.awsamiupdate import AWSECSAmiUpdate
+from ecsopera.journal import RolloutJournal
 
 
 class TestAWSECSAmiUpdate(object):
@@ -314,6 +316,43 @@ class TestAWSECSAmiUpdate(object):
         for status in response_statuses:
             assert status == 'DRAINING'
 
+    def test_get_ecs_container_instances_filter(self, mocker):
+        amiupdate = AWSECSAmiUpdate.__new__(AWSECSAmiUpdate)
+        amiupdate._cluster = 'test_ecs_cluster'
+        ecs = mocker.Mock()
+        mocker.patch.object(amiupdate, 'client', return_value=ecs)
+        paginate = ecs.get_paginator.return_value.paginate
+        paginate.return_value = [{'containerInstanceArns': ['arn-1']}]
+        instanceids = ['i-{0:03d}'.format(i) for i in range(60)]
+        assert amiupdate.get_ecs_container_instances(instanceids) == [
+            'arn-1', 'arn-1']
+        filters = [c[1]['filter'] for c in paginate.call_args_list]
+        assert filters == [
+            'ec2InstanceId in [{0}]'.format(', '.join(instanceids[:50])),
+            'ec2InstanceId in [{0}]'.format(', '.join(instanceids[50:]))]
+        paginate.reset_mock()
+        assert amiupdate.get_ecs_container_instances(set()) == []
+        assert not paginate.called
+
+    def test_activate_ecs_container_instances(self, mocker):
+        amiupdate = AWSECSAmiUpdate.__new__(AWSECSAmiUpdate)
+        amiupdate._cluster = 'test_ecs_cluster'
+        ecs = mocker.Mock()
+        mocker.patch.object(amiupdate, 'client', return_value=ecs)
+        mocker.patch.object(
+            amiupdate, 'describe_container_instances',
+            return_value=[{'containerInstanceArn': 'arn-{0}'.format(i),
+                           'status': 'ACTIVE' if i % 4 else 'DRAINING'}
+                          for i in range(48)])
+        ecs.update_container_instances_state.return_value = {
+            'containerInstances': [], 'failures': []}
+        draining = amiupdate.activate_ecs_container_instances(['arn-0'])
+        assert draining == ['arn-{0}'.format(i) for i in range(0, 48, 4)]
+        calls = ecs.update_container_instances_state.call_args_list
+        assert [c[1]['containerInstances'] for c in calls] == [
+            draining[:10], draining[10:]]
+        assert all(c[1]['status'] == 'ACTIVE' for c in calls)
+
     @pytest.mark.parametrize('amistr, expected', [
         ('ami-809f84e6', 'ami-809f84e6'),
         ('ami-786f9v', None),
@@ -323,3 +362,146 @@ class TestAWSECSAmiUpdate(object):
         ])
     def test_check_ami_id_format(self, amistr, expected):
         assert self.check_ami_id_format(amistr) == expected
+
+    @pytest.mark.parametrize('rollingwave, expected', [
+        (100, [5]),
+        (50, [3, 2]),
+        (20, [1, 1, 1, 1, 1]),
+        (1, [1, 1, 1, 1, 1]),
+    ])
+    def test_plan_waves(self, rollingwave, expected):
+        amiupdate = AWSECSAmiUpdate.__new__(AWSECSAmiUpdate)
+        amiupdate.rollingwave = rollingwave
+        amiupdate.currentasgs = [
+            {'AutoScalingGroupName': 'asg-a',
+             'Instances': [{'InstanceId': 'i-a1'}, {'InstanceId': 'i-a2'},
+                           {'InstanceId': 'i-a3'}]},
+            {'AutoScalingGroupName': 'asg-b',
+             'Instances': [{'InstanceId': 'i-b1'}, {'InstanceId': 'i-b2'},
+                           {'InstanceId': 'i-unregistered'}]}]
+        amiupdate.cimap = dict((i, 'arn-' + i) for i in
+                               ['i-a1', 'i-a2', 'i-a3', 'i-b1', 'i-b2'])
+        waves = amiupdate._plan_waves()
+        assert [len(w) for w in waves] == expected
+        assert [m for w in waves for m in w][:2] == [('asg-a', 'i-a1'),
+                                                     ('asg-b', 'i-b1')]
+
+    def test_drain_terminates_drained_asg_instances(self, mocker, tmpdir):
+        amiupdate = AWSECSAmiUpdate.__new__(AWSECSAmiUpdate)
+        amiupdate.log = mocker.Mock()
+        amiupdate.journal = RolloutJournal(str(tmpdir.join('journal')))
+        amiupdate._timeout = 5
+        amiupdate.pollinterval = 0.01
+        amiupdate.maxpollinterval = 0.01
+        amiupdate.terminated = []
+        amiupdate.currentasgs = [
+            {'AutoScalingGroupName': 'asg-a',
+             'Instances': [{'InstanceId': 'i-a1'}, {'InstanceId': 'i-a2'}]}]
+        amiupdate.cimap = {'i-a1': 'arn-a1', 'i-a2': 'arn-a2',
+                           'i-manual': 'arn-manual'}
+        amiupdate.cinstances = ['arn-a1', 'arn-a2', 'arn-manual']
+        ticks = [{'arn-a1': 0, 'arn-a2': 3, 'arn-manual': 1},
+                 {'arn-a2': 0, 'arn-manual': 0}]
+        counts = mocker.patch.object(amiupdate, 'get_running_task_counts',
+                                     side_effect=ticks)
+        terminate = mocker.patch.object(amiupdate, 'terminate_asg_instance')
+        assert amiupdate._drain_old_cinstances() is True
+        assert terminate.call_args_list == [mocker.call('i-a1'),
+                                            mocker.call('i-a2')]
+        assert amiupdate.terminated == ['i-a1', 'i-a2']
+        assert [e['instance'] for e in amiupdate.journal.all(
+            'terminated')] == ['i-a1', 'i-a2']
+        assert counts.call_args_list[1] == mocker.call(['arn-a2',
+                                                        'arn-manual'])
+
+    @pytest.mark.parametrize('placementcheck', ['warn', 'refuse'])
+    def test_check_placement(self, mocker, placementcheck):
+        amiupdate = AWSECSAmiUpdate.__new__(AWSECSAmiUpdate)
+        amiupdate.log = mocker.Mock()
+        amiupdate.placementcheck = placementcheck
+        amiupdate.rollingwave = None
+        amiupdate.taskdefs = {}
+        amiupdate.cinstances = ['arn-old']
+        amiupdate.cimap = {}
+        amiupdate.terminated = []
+        resources = [{'name': 'CPU', 'type': 'INTEGER', 'integerValue': 512},
+                     {'name': 'MEMORY', 'type': 'INTEGER',
+                      'integerValue': 1024}]
+        mocker.patch.object(amiupdate, 'get_ecs_container_instances',
+                            return_value=['arn-old', 'arn-new'])
+        describe = mocker.patch.object(
+            amiupdate, 'describe_container_instances',
+            return_value=[{'status': 'ACTIVE',
+                           'remainingResources': resources}])
+        mocker.patch.object(amiupdate, 'get_service_tasks',
+                            return_value=[{'taskDefinitionArn': 'td:1',
+                                           'containerInstanceArn': 'arn-old'}
+                                          ] * 3)
+        mocker.patch.object(amiupdate, 'get_task_definition',
+                            return_value={'cpu': '256', 'memory': '256',
+                                          'containerDefinitions': []})
+        if placementcheck == 'refuse':
+            with pytest.raises(SystemExit):
+                amiupdate._check_placement(['arn-old'])
+        else:
+            assert amiupdate._check_placement(['arn-old']) is False
+        describe.assert_called_once_with(['arn-new'])
+
+    @pytest.mark.parametrize('ami, rollingwave, refused', [
+        ('ami-1234abcd', None, False),
+        ('ami-1234abcd', 0, False),
+        ('ami-5678abcd', None, True),
+        ('ami-1234abcd', 20, True),
+    ])
+    def test_check_resume(self, mocker, tmpdir, ami, rollingwave, refused):
+        amiupdate = AWSECSAmiUpdate.__new__(AWSECSAmiUpdate)
+        amiupdate.log = mocker.Mock()
+        amiupdate.journal = RolloutJournal(str(tmpdir.join('journal')))
+        amiupdate.ami = ami
+        amiupdate.rollingwave = rollingwave
+        discovered = {'ami': 'ami-1234abcd', 'rollingwave': 0}
+        if refused:
+            with pytest.raises(SystemExit):
+                amiupdate._check_resume(discovered)
+        else:
+            amiupdate._check_resume(discovered)
+
+    def test_check_placement_rolling(self, mocker):
+        amiupdate = AWSECSAmiUpdate.__new__(AWSECSAmiUpdate)
+        amiupdate.log = mocker.Mock()
+        amiupdate.placementcheck = 'refuse'
+        amiupdate.rollingwave = 50
+        amiupdate.newasgs = {'asg-old': 'asg-new'}
+        amiupdate.taskdefs = {}
+        amiupdate.cinstances = ['arn-old1', 'arn-old2']
+        amiupdate.cimap = {}
+        amiupdate.terminated = []
+        resources = [{'name': 'CPU', 'type': 'INTEGER', 'integerValue': 512},
+                     {'name': 'MEMORY', 'type': 'INTEGER',
+                      'integerValue': 1024}]
+        mocker.patch.object(amiupdate, 'get_ecs_container_instances',
+                            return_value=['arn-old1', 'arn-old2', 'arn-new'])
+        mocker.patch.object(
+            amiupdate, 'describe_container_instances',
+            return_value=[{'status': 'ACTIVE', 'ec2InstanceId': 'i-old2',
+                           'remainingResources': resources},
+                          {'status': 'ACTIVE', 'ec2InstanceId': 'i-new',
+                           'remainingResources': resources}])
+        mocker.patch.object(amiupdate, 'get_asg_instance_ids',
+                            return_value=set(['i-new']))
+        placed = ['arn-old1', 'arn-old2', 'arn-old2']
+        tasks = mocker.patch.object(
+            amiupdate, 'get_service_tasks',
+            side_effect=lambda cinstances: [
+                {'taskDefinitionArn': 'td:1', 'containerInstanceArn': arn}
+                for arn in placed if arn in cinstances])
+        taskdef = mocker.patch.object(
+            amiupdate, 'get_task_definition',
+            return_value={'cpu': '256', 'memory': '256',
+                          'containerDefinitions': []})
+        assert amiupdate._check_placement(['arn-old1']) is True
+        with pytest.raises(SystemExit):
+            amiupdate._check_placement(['arn-old1', 'arn-old2'])
+        assert tasks.call_args_list == [
+            mocker.call(['arn-old1']), mocker.call(['arn-old1', 'arn-old2'])]
+        taskdef.assert_called_once_with('td:1')
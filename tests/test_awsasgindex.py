@@ -0,0 +1,83 @@
+import os
+import moto
+import boto3
+from ecsopera.awsasgindex import ASGLaunchConfigIndex
+
+
+class TestASGLaunchConfigIndex(object):
+
+    def create_asgs(self, client):
+        for lc_name in ['test-lc', 'other-lc']:
+            client.create_launch_configuration(
+                LaunchConfigurationName=lc_name,
+                ImageId='ami-1234abcd',
+                InstanceType='t2.micro')
+        for i in range(5):
+            client.create_auto_scaling_group(
+                AutoScalingGroupName='test_asg_{0}'.format(i),
+                LaunchConfigurationName='test-lc' if i % 2 else 'other-lc',
+                MinSize=0,
+                MaxSize=20,
+                DesiredCapacity=0,
+                AvailabilityZones=['eu-west-1a'])
+
+    @moto.mock_autoscaling
+    def test_iter_asgs(self):
+        client = boto3.client('autoscaling', region_name='eu-west-1')
+        self.create_asgs(client)
+        index = ASGLaunchConfigIndex(client)
+        assert sorted(index.get_asg_names('test-lc')) == ['test_asg_1',
+                                                          'test_asg_3']
+        assert sorted(index.index['other-lc']) == ['test_asg_0',
+                                                   'test_asg_2',
+                                                   'test_asg_4']
+        assert index.get_asg_names('missing-lc') == []
+
+    @moto.mock_autoscaling
+    def test_cache_roundtrip(self, tmpdir):
+        client = boto3.client('autoscaling', region_name='eu-west-1')
+        self.create_asgs(client)
+        cachepath = str(tmpdir.join('asgindex.json'))
+        ASGLaunchConfigIndex(client, cachepath=cachepath).get_asg_names(
+            'test-lc')
+        assert os.path.exists(cachepath)
+        index = ASGLaunchConfigIndex(client, cachepath=cachepath)
+        assert sorted(index.index['test-lc']) == ['test_asg_1', 'test_asg_3']
+        assert len(index.get_asg_names('test-lc')) == 2
+
+    @moto.mock_autoscaling
+    def test_stale_cache_rescans(self, tmpdir):
+        client = boto3.client('autoscaling', region_name='eu-west-1')
+        self.create_asgs(client)
+        cachepath = str(tmpdir.join('asgindex.json'))
+        ASGLaunchConfigIndex(client, cachepath=cachepath).get_asg_names(
+            'test-lc')
+        client.update_auto_scaling_group(
+            AutoScalingGroupName='test_asg_1',
+            LaunchConfigurationName='other-lc')
+        index = ASGLaunchConfigIndex(client, cachepath=cachepath)
+        assert index.get_asg_names('test-lc') == ['test_asg_3']
+
+    @moto.mock_autoscaling
+    @moto.mock_ec2
+    def test_instanceids_find_new_asgs(self, tmpdir):
+        client = boto3.client('autoscaling', region_name='eu-west-1')
+        self.create_asgs(client)
+        cachepath = str(tmpdir.join('asgindex.json'))
+        ASGLaunchConfigIndex(client, cachepath=cachepath).get_asg_names(
+            'test-lc')
+        client.update_auto_scaling_group(
+            AutoScalingGroupName='test_asg_0',
+            LaunchConfigurationName='test-lc',
+            DesiredCapacity=1)
+        instanceids = [i['InstanceId'] for i in
+                       client.describe_auto_scaling_instances()[
+                           'AutoScalingInstances']]
+        index = ASGLaunchConfigIndex(client, cachepath=cachepath)
+        index._iter_scan = None
+        assert len(index.get_asg_names('test-lc')) == 2
+        assert sorted(index.get_asg_names('test-lc', instanceids)) == [
+            'test_asg_0', 'test_asg_1', 'test_asg_3']
+        index = ASGLaunchConfigIndex(client, cachepath=cachepath)
+        assert sorted(index.index['test-lc']) == [
+            'test_asg_0', 'test_asg_1', 'test_asg_3']
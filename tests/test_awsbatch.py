@@ -0,0 +1,31 @@
+import pytest
+from ecsopera.awsbatch import chunked, batch_describe
+
+
+class TestAWSBatch(object):
+
+    @pytest.mark.parametrize('count, size, expected', [
+        (0, 100, []),
+        (100, 100, [100]),
+        (250, 100, [100, 100, 50]),
+    ])
+    def test_chunked(self, count, size, expected):
+        assert [len(c) for c in chunked(range(count), size)] == expected
+
+    def test_batch_describe(self):
+        calls = []
+
+        def describe(cluster, containerInstances):
+            calls.append(len(containerInstances))
+            return {'containerInstances': [{'arn': i, 'cluster': cluster}
+                                           for i in containerInstances]}
+        arns = ['arn-{0}'.format(i) for i in range(601)]
+        res = batch_describe(describe, 'containerInstances', arns,
+                             'containerInstances', 100, cluster='test')
+        assert [i['arn'] for i in res] == arns
+        assert sorted(calls) == [1, 100, 100, 100, 100, 100, 100]
+
+    def test_batch_describe_empty(self):
+        def describe(**kwargs):
+            raise AssertionError('describe should not be called')
+        assert batch_describe(describe, 'tasks', [], 'tasks', 100) == []
@@ -0,0 +1,32 @@
+from ecsopera.awscitracker import ContainerInstanceTracker
+
+
+class TestContainerInstanceTracker(object):
+
+    def describe(self, arns):
+        self.calls.append(sorted(arns))
+        return [dict(self.cis[arn], containerInstanceArn=arn) for arn in arns]
+
+    def test_refresh(self):
+        self.calls = []
+        self.cis = {'ci-new1': {'ec2InstanceId': 'i-new1', 'status': 'ACTIVE',
+                                'agentConnected': False},
+                    'ci-new2': {'ec2InstanceId': 'i-new2', 'status': 'ACTIVE',
+                                'agentConnected': True},
+                    'ci-other': {'ec2InstanceId': 'i-other',
+                                 'status': 'ACTIVE', 'agentConnected': True}}
+        tracker = ContainerInstanceTracker(self.describe,
+                                           known={'i-old': 'ci-old'})
+        watch = ['i-new1', 'i-new2']
+        assert tracker.refresh(['ci-old', 'ci-new1', 'ci-other'],
+                               watch) == set()
+        self.cis['ci-new1']['agentConnected'] = True
+        assert tracker.refresh(['ci-old', 'ci-new1', 'ci-other', 'ci-new2'],
+                               watch) == set(['i-new1', 'i-new2'])
+        assert tracker.refresh(['ci-new1', 'ci-other', 'ci-new2'],
+                               watch) == set(['i-new1', 'i-new2'])
+        assert sorted(tracker.instances) == ['ci-new1', 'ci-new2',
+                                             'ci-other']
+        assert self.calls == [['ci-new1', 'ci-other'],
+                              ['ci-new1', 'ci-new2']]
+        assert tracker.described == 4
@@ -0,0 +1,34 @@
+import pytest
+from ecsopera.awsclients import AWSClientRegistry
+
+
+class TestAWSClientRegistry(object):
+
+    def test_client_reuse(self):
+        registry = AWSClientRegistry()
+        ecs = registry.client('akey', 'skey', 'ecs', region='eu-west-1')
+        assert registry.client('akey', 'skey', 'ecs',
+                               region='eu-west-1') is ecs
+        assert registry.stats()['hits'] == 1
+        assert registry.stats()['misses'] == 1
+
+    @pytest.mark.parametrize('other', [
+        ('akey2', 'skey', 'ecs', 'eu-west-1', None),
+        ('akey', 'skey', 'ecs', 'us-east-1', None),
+        ('akey', 'skey', 'autoscaling', 'eu-west-1', None),
+        ('akey', 'skey', 'ecs', 'eu-west-1', {'max_pool_connections': 20}),
+    ])
+    def test_client_keyed(self, other):
+        registry = AWSClientRegistry()
+        ecs = registry.client('akey', 'skey', 'ecs', region='eu-west-1')
+        akey, skey, service, region, config = other
+        assert registry.client(akey, skey, service, region=region,
+                               config=config) is not ecs
+        assert registry.stats()['clients'] == 2
+
+    def test_clear(self):
+        registry = AWSClientRegistry()
+        registry.client('akey', 'skey', 's3', region='eu-west-1')
+        registry.clear()
+        assert registry.stats() == {'clients': 0, 'sessions': 0,
+                                    'hits': 0, 'misses': 0}
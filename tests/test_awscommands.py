@@ -0,0 +1,82 @@
+import sys
+import logging
+import pytest
+from ecsopera.awscommands import (aws_apply,
+                                  aws_ecs_ami_update_batch,
+                                  aws_ecs_deploy_batch,
+                                  aws_s3cp_deploy,
+                                  fan_out_regions,
+                                  region_path)
+from ecsopera.loghelper import LogHelper
+
+
+class TestAWSCommands(object):
+
+    def logger(self):
+        return LogHelper(stream=sys.stdout, level=logging.INFO,
+                         fmt='%(levelname)s %(message)s')
+
+    @pytest.mark.parametrize('regions, expected', [
+        (None, [None]),
+        (['eu-west-1'], ['eu-west-1']),
+        (['eu-west-1', 'us-east-1'], ['eu-west-1', 'us-east-1']),
+    ])
+    def test_fan_out_regions(self, regions, expected):
+        seen = []
+        fan_out_regions(regions, self.logger(),
+                        lambda region, log: seen.append(region))
+        assert sorted(seen, key=str) == expected
+
+    def test_fan_out_regions_failure(self):
+        def _run(region, log):
+            if region == 'us-east-1':
+                raise SystemExit('Job Cancelled...Exit')
+        with pytest.raises(SystemExit):
+            fan_out_regions(['eu-west-1', 'us-east-1'], self.logger(), _run)
+
+    @pytest.mark.parametrize('path, region, regions, expected', [
+        (None, 'eu-west-1', ['eu-west-1', 'us-east-1'], None),
+        ('cache.json', 'eu-west-1', ['eu-west-1'], 'cache.json'),
+        ('cache.json', 'eu-west-1', ['eu-west-1', 'us-east-1'],
+         'cache.json.eu-west-1'),
+    ])
+    def test_region_path(self, path, region, regions, expected):
+        assert region_path(path, region, regions) == expected
+
+    def test_ami_update_batch_duplicate_launchcfg(self, mocker):
+        fanout = mocker.patch('ecsopera.awscommands.fan_out_regions')
+        with pytest.raises(SystemExit):
+            aws_ecs_ami_update_batch(
+                'akey', 'skey', 'ami-1234abcd',
+                [('c1', 'shared-lc'), ('c2', 'shared-lc')], 300, 5,
+                self.logger())
+        assert not fanout.called
+
+    def test_deploy_batch_duplicate_service(self, mocker):
+        fanout = mocker.patch('ecsopera.awscommands.fan_out_regions')
+        with pytest.raises(SystemExit):
+            aws_ecs_deploy_batch(
+                'akey', 'skey', [('web', 'img:1'), ('web', 'img:2')], 'c1',
+                None, None, None, 300, 5, self.logger())
+        assert not fanout.called
+
+    def test_s3cp_deploy_several_regions(self, mocker):
+        s3deploy = mocker.patch('ecsopera.awscommands.AWSS3CpDeploy')
+        with pytest.raises(SystemExit):
+            aws_s3cp_deploy('akey', 'skey', 'dist', 's3://bucket', None,
+                            None, 300, False, False, 300, self.logger(),
+                            regions=['eu-west-1', 'us-east-1'])
+        assert not s3deploy.called
+
+    def test_apply_several_regions(self, mocker, tmpdir):
+        manifest = tmpdir.join('manifest.yml')
+        manifest.write('- name: web\n'
+                       '  type: ecs-deploy\n'
+                       '  cluster: c1\n'
+                       '  service: web\n'
+                       '  image: img:1\n')
+        run = mocker.patch('ecsopera.awscommands.run_manifest')
+        with pytest.raises(SystemExit):
+            aws_apply('akey', 'skey', str(manifest), None, self.logger(),
+                      regions=['eu-west-1', 'us-east-1'])
+        assert not run.called
@@ -5,6 +5,7 @@ import boto3
 import re
 import json
 from itertools import groupby
+from ecsopera.awsecsdeploy import AWSECSDeploy
 
 
 class TestAWSECSDeploy(object):
@@ -370,3 +371,35 @@ class TestAWSECSDeploy(object):
     ])
     def test_check_ami_id_format(self, svcobj, tarn, otasks, expected):
         assert self._test__success_condition(svcobj, tarn, otasks) == expected
+
+    @pytest.mark.parametrize('svcobj, tarn, expected', [
+        ({'services': [{'deployments': [
+            {'taskDefinition': 'arn:aws:ecs:eu-west-1:xxxxxxxxxx:task-definition/ddm_task_dev:519',
+             'status': 'PRIMARY'},
+            {'taskDefinition': 'arn:aws:ecs:eu-west-1:xxxxxxxxxx:task-definition/ddm_task_dev:518',
+             'status': 'ACTIVE'}]}]},
+         'arn:aws:ecs:eu-west-1:xxxxxxxxxx:task-definition/ddm_task_dev:519',
+         'PRIMARY'),
+        ({'services': [{'deployments': [
+            {'taskDefinition': 'arn:aws:ecs:eu-west-1:xxxxxxxxxx:task-definition/ddm_task_dev:518',
+             'status': 'PRIMARY'}]}]},
+         'arn:aws:ecs:eu-west-1:xxxxxxxxxx:task-definition/ddm_task_dev:519',
+         None),
+        ({'services': [{}]},
+         'arn:aws:ecs:eu-west-1:xxxxxxxxxx:task-definition/ddm_task_dev:519',
+         None),
+    ])
+    def test_get_deployment(self, svcobj, tarn, expected):
+        dep = AWSECSDeploy._get_deployment(svcobj, tarn)
+        assert (dep and dep['status']) == expected
+
+    def test_poller_shares_deadline(self, mocker):
+        deploy = AWSECSDeploy.__new__(AWSECSDeploy)
+        deploy.timeout = 300
+        deploy.pollinterval = 2
+        deploy.maxpollinterval = 15
+        mocker.patch('ecsopera.awsecsdeploy.time.monotonic',
+                     return_value=1000)
+        assert deploy._poller().timeout == 300
+        assert deploy._poller(deadline=1120).timeout == 120
+        assert deploy._poller(deadline=900).timeout == 0
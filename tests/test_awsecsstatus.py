@@ -0,0 +1,42 @@
+import threading
+import moto
+import boto3
+from ecsopera.awsecsstatus import ECSServiceStatusScheduler
+
+
+class TestECSServiceStatusScheduler(object):
+
+    @moto.mock_ecs
+    def test_describe_batched(self):
+        client = boto3.client('ecs', region_name='eu-west-1')
+        client.create_cluster(clusterName='test_ecs_cluster')
+        tdef = client.register_task_definition(
+            family='test_ecs_task',
+            containerDefinitions=[{'name': 'hello_world',
+                                   'image': 'docker/hello-world:latest',
+                                   'memory': 400}])
+        services = ['test_ecs_service_{0}'.format(i) for i in range(25)]
+        for service in services:
+            client.create_service(
+                cluster='test_ecs_cluster',
+                serviceName=service,
+                taskDefinition=tdef['taskDefinition']['taskDefinitionArn'],
+                desiredCount=2)
+        scheduler = ECSServiceStatusScheduler(client, gather=0.5)
+        results = {}
+
+        def _describe(service):
+            results[service] = scheduler.describe('test_ecs_cluster',
+                                                  service)
+        threads = [threading.Thread(target=_describe, args=(s,))
+                   for s in services + ['missing_service']]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        scheduler.stop()
+        for service in services:
+            assert results[service]['services'][0][
+                'serviceName'] == service
+        assert results['missing_service']['services'] == []
+        assert scheduler.calls == 3
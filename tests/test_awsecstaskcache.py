@@ -0,0 +1,51 @@
+from ecsopera.awsecstaskcache import ECSTaskCache
+
+
+class TestECSTaskCache(object):
+
+    def describe(self, tarns):
+        self.calls.append(sorted(tarns))
+        return [{'taskArn': arn,
+                 'taskDefinitionArn': self.tdefs[arn]} for arn in tarns]
+
+    def test_refresh(self):
+        self.calls = []
+        self.tdefs = {'task-1': 'tdef:1', 'task-2': 'tdef:1',
+                      'task-3': 'tdef:2'}
+        cache = ECSTaskCache(self.describe)
+        assert cache.refresh(['task-1', 'task-2']) == ['task-1', 'task-2']
+        assert cache.old_tasks('tdef:2') == ['task-1', 'task-2']
+        assert cache.refresh(['task-2', 'task-3']) == ['task-3']
+        assert sorted(cache.tasks) == ['task-2', 'task-3']
+        assert cache.old_tasks('tdef:2') == ['task-2']
+        assert cache.refresh(['task-3']) == []
+        assert cache.old_tasks('tdef:2') == []
+        assert self.calls == [['task-1', 'task-2'], ['task-3']]
+        assert cache.described == 3
+
+    def test_refresh_missing(self):
+        self.calls = []
+        self.tdefs = {'task-1': 'tdef:1'}
+        cache = ECSTaskCache(lambda tarns: self.describe(
+            [a for a in tarns if a in self.tdefs]), attempts=2)
+        assert cache.refresh(['task-1', 'task-gone']) == ['task-1',
+                                                          'task-gone']
+        assert cache.missing == {'task-gone': 1}
+        assert cache.refresh(['task-1', 'task-gone']) == ['task-gone']
+        assert cache.missing == {'task-gone': 2}
+        assert cache.refresh(['task-1', 'task-gone']) == []
+        assert self.calls == [['task-1'], []]
+        cache.refresh(['task-1'])
+        assert cache.missing == {}
+
+    def test_refresh_missing_retried(self):
+        self.calls = []
+        self.tdefs = {}
+        cache = ECSTaskCache(lambda tarns: self.describe(
+            [a for a in tarns if a in self.tdefs]))
+        assert cache.refresh(['task-late']) == ['task-late']
+        self.tdefs['task-late'] = 'tdef:1'
+        assert cache.refresh(['task-late']) == ['task-late']
+        assert cache.tasks == {'task-late': 'tdef:1'}
+        assert cache.missing == {}
+        assert cache.refresh(['task-late']) == []
@@ -0,0 +1,225 @@
+import gzip
+import pytest
+import sys
+import logging
+import moto
+import boto3
+from ecsopera.awss3cpdeploy import AWSS3CpDeploy
+from ecsopera.loghelper import LogHelper
+from ecsopera.s3pipeline import MB, walk_files
+
+
+class TestAWSS3CpDeploy(object):
+
+    def logger(self):
+        return LogHelper(stream=sys.stdout, level=logging.INFO,
+                         fmt='%(levelname)s %(message)s')
+
+    def s3deploy(self, source, destination, **kwargs):
+        return AWSS3CpDeploy('akey', 'skey', source, destination, None, None,
+                             300, False, False, 300, self.logger(),
+                             region='us-east-1', **kwargs)
+
+    def write_site(self, tmpdir):
+        files = {}
+        for i in range(25):
+            key = 'assets/{0}/file{1}.js'.format(i % 3, i)
+            tmpdir.join(key).write('console.log({0});'.format(i),
+                                   ensure=True)
+            files[key] = 'console.log({0});'.format(i).encode()
+        tmpdir.join('index.html').write('<html></html>')
+        files['index.html'] = b'<html></html>'
+        tmpdir.join('big.bin').write_binary(b'x' * (6 * MB))
+        files['big.bin'] = b'x' * (6 * MB)
+        return files
+
+    @moto.mock_s3
+    def test_copy_obj_action(self, tmpdir):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='dst')
+        files = self.write_site(tmpdir)
+        s3deploy = self.s3deploy(str(tmpdir), 's3://dst', concurrency=4,
+                                 multipartthreshold=5 * MB,
+                                 multipartchunksize=5 * MB)
+        assert s3deploy.copy_obj_action(str(tmpdir), 'dst', None, 60, False)
+        keys = [o['Key'] for o in s3.list_objects_v2(
+            Bucket='dst')['Contents']]
+        assert sorted(keys) == sorted(files)
+        big = s3.head_object(Bucket='dst', Key='big.bin')
+        assert big['ETag'].endswith('-2"')
+        obj = s3.get_object(Bucket='dst', Key='assets/1/file4.js')
+        assert obj['Body'].read() == files['assets/1/file4.js']
+        assert obj['CacheControl'] == 'public, max-age=60'
+
+    @moto.mock_s3
+    def test_copy_obj_action_sync(self, tmpdir):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='dst')
+        site = tmpdir.mkdir('site')
+        for i in range(10):
+            site.join('page{0}.html'.format(i)).write(str(i))
+        s3.put_object(Bucket='dst', Key='page0.html', Body=b'stale')
+        s3deploy = self.s3deploy(str(site), 's3://dst', sync=True,
+                                 indexdir=str(tmpdir))
+        changed = s3deploy.changed_files(list(walk_files(str(site))), 'dst')
+        assert len(changed) == 10
+        s3deploy.copy_obj_action(str(site), 'dst', None, 60, False)
+        assert s3.get_object(Bucket='dst',
+                             Key='page0.html')['Body'].read() == b'0'
+        site.join('page3.html').write('changed')
+        changed = s3deploy.changed_files(list(walk_files(str(site))), 'dst')
+        assert [c[1] for c in changed] == ['page3.html']
+
+    @moto.mock_s3
+    def test_changed_objects(self):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        for bucket in ('src', 'dst'):
+            s3.create_bucket(Bucket=bucket)
+        for key in ('a', 'b', 'c'):
+            s3.put_object(Bucket='src', Key=key, Body=key.encode())
+        s3.put_object(Bucket='dst', Key='a', Body=b'a')
+        s3.put_object(Bucket='dst', Key='b', Body=b'old')
+        s3deploy = self.s3deploy('s3://src', 's3://dst', sync=True)
+        assert [o[:2] for o in s3deploy.changed_objects('src', 'dst')] == [
+            ('b', 1), ('c', 1)]
+
+    @moto.mock_s3
+    def test_changed_objects_multipart_copy(self):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        for bucket in ('src', 'dst'):
+            s3.create_bucket(Bucket=bucket)
+        s3.put_object(Bucket='src', Key='big.bin', Body=b'x' * (6 * MB))
+        s3deploy = self.s3deploy('s3://src', 's3://dst', sync=True,
+                                 multipartthreshold=5 * MB,
+                                 multipartchunksize=5 * MB)
+        assert s3deploy.copy_s3obj_action('src', 'dst', None, 60, False)
+        assert s3.head_object(Bucket='dst',
+                              Key='big.bin')['ETag'].endswith('-2"')
+        assert s3deploy.changed_objects('src', 'dst') == []
+
+    @moto.mock_s3
+    def test_changed_objects_multipart_copy_same_size(self):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        for bucket in ('src', 'dst'):
+            s3.create_bucket(Bucket=bucket)
+        s3.put_object(Bucket='src', Key='big.bin', Body=b'x' * (6 * MB),
+                      ContentType='application/octet-stream')
+        s3deploy = self.s3deploy('s3://src', 's3://dst', sync=True,
+                                 multipartthreshold=5 * MB,
+                                 multipartchunksize=5 * MB)
+        assert s3deploy.copy_s3obj_action('src', 'dst', None, 60, False)
+        head = s3.head_object(Bucket='dst', Key='big.bin')
+        assert head['ContentType'] == 'application/octet-stream'
+        s3.put_object(Bucket='src', Key='big.bin', Body=b'y' * (6 * MB))
+        assert [o[:2] for o in s3deploy.changed_objects('src', 'dst')] == [
+            ('big.bin', 6 * MB)]
+        assert s3deploy.copy_s3obj_action('src', 'dst', None, 60, False)
+        assert s3.get_object(Bucket='dst',
+                             Key='big.bin')['Body'].read(1) == b'y'
+        assert s3deploy.changed_objects('src', 'dst') == []
+
+    @moto.mock_s3
+    def test_copy_s3obj_action(self):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        for bucket in ('src', 'dst'):
+            s3.create_bucket(Bucket=bucket)
+        for i in range(30):
+            s3.put_object(Bucket='src', Key='obj{0}'.format(i),
+                          Body=str(i).encode(), ContentType='text/plain')
+        s3deploy = self.s3deploy('s3://src', 's3://dst', concurrency=4)
+        assert s3deploy.copy_s3obj_action('src', 'dst', None, 60, False)
+        keys = [o['Key'] for o in s3.list_objects_v2(
+            Bucket='dst')['Contents']]
+        assert len(keys) == 30
+        obj = s3.get_object(Bucket='dst', Key='obj7')
+        assert obj['Body'].read() == b'7'
+        assert obj['ContentType'] == 'text/plain'
+
+    @moto.mock_s3
+    def test_clear_dst(self):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='dst')
+        for i in range(2500):
+            s3.put_object(Bucket='dst', Key='old{0}'.format(i), Body=b'')
+        s3deploy = self.s3deploy('s3://src', 's3://dst', concurrency=2)
+        s3deploy.clear_dst('dst')
+        assert s3.list_objects_v2(Bucket='dst')['KeyCount'] == 0
+
+    @moto.mock_s3
+    def test_copy_obj_action_prune(self, tmpdir):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='dst')
+        for key in ('index.html', 'stale.js', 'old/app.css'):
+            s3.put_object(Bucket='dst', Key=key, Body=b'old')
+        tmpdir.join('index.html').write('new')
+        tmpdir.join('app.js').write('new')
+        s3deploy = self.s3deploy(str(tmpdir), 's3://dst', prune=True)
+        s3deploy.copy_obj_action(str(tmpdir), 'dst', None, 60, False)
+        keys = [o['Key'] for o in s3.list_objects_v2(
+            Bucket='dst')['Contents']]
+        assert sorted(keys) == ['app.js', 'index.html']
+
+    def test_invalidate_cf_dists(self, mocker):
+        s3deploy = self.s3deploy('/src', 's3://dst')
+        cf = mocker.Mock()
+        mocker.patch.object(s3deploy, 'client', return_value=cf)
+        assert s3deploy.invalidate_cf_dists('E1', 's3://dst')
+        assert not cf.create_invalidation.called
+        s3deploy.changedkeys.update(['index.html', 'js/app.js'])
+        assert s3deploy.invalidate_cf_dists('E1, E2', 's3://dst')
+        calls = sorted(c[1]['DistributionId']
+                       for c in cf.create_invalidation.call_args_list)
+        assert calls == ['E1', 'E2']
+        batch = cf.create_invalidation.call_args[1]['InvalidationBatch']
+        assert batch['Paths'] == {'Quantity': 3,
+                                  'Items': ['/', '/index.html',
+                                            '/js/app.js']}
+
+    @moto.mock_s3
+    def test_copy_obj_action_compress(self, tmpdir):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='dst')
+        site = tmpdir.mkdir('site')
+        site.join('index.html').write('<p>hello</p>\n' * 200)
+        s3deploy = self.s3deploy(str(site), 's3://dst', compress='gzip',
+                                 indexdir=str(tmpdir))
+        s3deploy.copy_obj_action(str(site), 'dst', None, 60, False)
+        obj = s3.get_object(Bucket='dst', Key='index.html')
+        assert obj['ContentType'] == 'text/html'
+        assert obj['ContentEncoding'].startswith('gzip')
+        assert gzip.decompress(obj['Body'].read()) == site.join(
+            'index.html').read_binary()
+        assert s3deploy.changedkeys == set(['index.html'])
+
+    @moto.mock_s3
+    def test_verify_uploads(self, tmpdir):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='dst')
+        site = tmpdir.mkdir('site')
+        for i in range(5):
+            site.join('f{0}.txt'.format(i)).write(str(i))
+        s3deploy = self.s3deploy(str(site), 's3://dst', verify=True,
+                                 indexdir=str(tmpdir))
+        s3deploy.copy_obj_action(str(site), 'dst', None, 60, False)
+        s3.put_object(Bucket='dst', Key='f3.txt', Body=b'x')
+        with pytest.raises(SystemExit):
+            s3deploy.verify_uploads(list(walk_files(str(site))), 'dst')
+
+    @moto.mock_s3
+    def test_copy_obj_action_dedup(self, tmpdir, mocker):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='dst')
+        site = tmpdir.mkdir('site')
+        for path in ('fonts/a.woff', 'vendor/x/a.woff', 'vendor/y/a.woff'):
+            site.join(path).write_binary(b'font' * 1000, ensure=True)
+        site.join('b.woff').write_binary(b'other')
+        s3deploy = self.s3deploy(str(site), 's3://dst', dedup=True,
+                                 indexdir=str(tmpdir))
+        spy = mocker.spy(s3deploy, 'copy_duplicates')
+        s3deploy.copy_obj_action(str(site), 'dst', None, 60, False)
+        _, copies, _, uploads = spy.call_args[0]
+        assert (uploads.done, len(copies)) == (2, 2)
+        obj = s3.get_object(Bucket='dst', Key='vendor/y/a.woff')
+        assert obj['Body'].read() == b'font' * 1000
+        assert obj['CacheControl'] == 'public, max-age=60'
+        assert len(s3deploy.changedkeys) == 4
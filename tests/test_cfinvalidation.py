@@ -0,0 +1,41 @@
+from ecsopera.cfinvalidation import invalidation_paths, key_dirs, key_paths
+
+
+class TestCFInvalidation(object):
+
+    def test_key_dirs(self):
+        assert key_dirs('index.html') == []
+        assert key_dirs('a/b/c.js') == ['a/', 'a/b/']
+
+    def test_paths_individual(self):
+        assert invalidation_paths(['b.js', 'a dir/x+y.css', 'b.js']) == [
+            '/a%20dir/x%2By.css', '/b.js']
+
+    def test_key_paths(self):
+        assert key_paths('index.html') == ['/index.html', '/']
+        assert key_paths('docs/a b/index.html') == [
+            '/docs/a%20b/index.html', '/docs/a%20b/']
+        assert key_paths('docs/myindex.html') == ['/docs/myindex.html']
+
+    def test_paths_index(self):
+        assert invalidation_paths(['docs/index.html', 'docs/a.html']) == [
+            '/docs/', '/docs/a.html', '/docs/index.html']
+        keys = ['docs/index.html'] + ['docs/{0}.html'.format(i)
+                                      for i in range(3)]
+        assert invalidation_paths(keys, maxpaths=4) == ['/docs/*']
+
+    def test_paths_collapsed(self):
+        keys = (['index.html', 'img/logo.png'] +
+                ['static/js/{0}.js'.format(i) for i in range(10)] +
+                ['static/css/{0}.css'.format(i) for i in range(3)])
+        assert invalidation_paths(keys, maxpaths=5) == [
+            '/', '/img/logo.png', '/index.html', '/static/*']
+        assert invalidation_paths(keys, maxpaths=8) == [
+            '/', '/img/logo.png', '/index.html', '/static/css/0.css',
+            '/static/css/1.css', '/static/css/2.css', '/static/js/*']
+
+    def test_paths_wildcard_limit(self):
+        keys = ['d{0}/{1}.js'.format(d, i) for d in range(5) for i in range(3)]
+        assert invalidation_paths(keys, maxpaths=4, maxwildcards=2) == ['/*']
+        assert len(invalidation_paths(keys, maxpaths=5)) == 5
+        assert invalidation_paths(['a.js', 'b.js'], maxpaths=1) == ['/*']
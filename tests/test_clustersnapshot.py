@@ -0,0 +1,52 @@
+import json
+import moto
+import boto3
+from ecsopera.clustersnapshot import (ClusterSnapshot, InstanceRecord,
+                                      ASG_TAG)
+
+
+class TestClusterSnapshot(object):
+
+    def register(self, ec2, ecs, ami, asg=None):
+        tags = [{'ResourceType': 'instance',
+                 'Tags': [{'Key': ASG_TAG, 'Value': asg}]}] if asg else []
+        instance = ec2.run_instances(ImageId=ami, MinCount=1, MaxCount=1,
+                                     TagSpecifications=tags)['Instances'][0]
+        doc = json.dumps({'instanceId': instance['InstanceId'],
+                          'region': 'eu-west-1'})
+        ecs.register_container_instance(cluster='test',
+                                        instanceIdentityDocument=doc)
+        return instance['InstanceId']
+
+    @moto.mock_ec2
+    @moto.mock_ecs
+    def test_collect(self):
+        ec2 = boto3.client('ec2', region_name='eu-west-1')
+        ecs = boto3.client('ecs', region_name='eu-west-1')
+        ecs.create_cluster(clusterName='test')
+        old = [self.register(ec2, ecs, 'ami-12c6146b', 'asg-a')
+               for _ in range(3)]
+        new = self.register(ec2, ecs, 'ami-1e749f67', 'asg-b')
+        manual = self.register(ec2, ecs, 'ami-12c6146b')
+        snapshot = ClusterSnapshot.collect(ecs, ec2, 'test')
+        assert snapshot.amis() == ['ami-12c6146b', 'ami-1e749f67']
+        assert sorted(snapshot.byami['ami-12c6146b']) == sorted(old +
+                                                                [manual])
+        assert sorted(snapshot.byasg['asg-a']) == sorted(old)
+        assert [r.instanceid for r in snapshot.asg_instances('asg-b')] == [
+            new]
+        assert snapshot.byasg[None] == [manual]
+        assert sorted(snapshot.cimap) == sorted(old + [new, manual])
+        assert snapshot.task_count() == 0
+        report = snapshot.report()
+        assert report[0].startswith('Cluster test: 5 container instances')
+        assert len(report) == 6
+        restored = ClusterSnapshot.from_rows('test', json.loads(
+            json.dumps(snapshot.to_rows())))
+        assert restored.cimap == snapshot.cimap
+        assert restored.byasg == snapshot.byasg
+
+    def test_instance_record_slots(self):
+        record = InstanceRecord('i-1', 'arn-1', ami='ami-1', runningtasks=2)
+        assert not hasattr(record, '__dict__')
+        assert InstanceRecord.from_row(record.to_row()).runningtasks == 2
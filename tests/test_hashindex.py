@@ -0,0 +1,74 @@
+import hashlib
+import os
+from ecsopera import hashindex
+from ecsopera.hashindex import HashIndex, file_etag, part_size
+from ecsopera.s3pipeline import MB
+
+
+class TestHashIndex(object):
+
+    def test_file_etag(self, tmpdir):
+        data = b'a' * (5 * MB) + b'b' * (5 * MB) + b'c'
+        path = tmpdir.join('f.bin')
+        path.write_binary(data)
+        assert file_etag(str(path)) == hashlib.md5(data).hexdigest()
+        parts = b''.join(hashlib.md5(p).digest() for p in
+                         (data[:5 * MB], data[5 * MB:10 * MB], data[10 * MB:]))
+        assert file_etag(str(path), 5 * MB) == '{0}-3'.format(
+            hashlib.md5(parts).hexdigest())
+
+    def test_part_size(self):
+        assert part_size(MB, 8 * MB, 8 * MB) == 0
+        assert part_size(8 * MB, 8 * MB, 8 * MB) == 8 * MB
+        assert part_size(200 * 1024 * MB, 8 * MB, 8 * MB) == 32 * MB
+
+    def test_etag_cached(self, tmpdir):
+        path = tmpdir.join('f.txt')
+        path.write('hello')
+        index = HashIndex(str(tmpdir.join('index')))
+        etag = index.etag(str(path))
+        assert etag == hashlib.md5(b'hello').hexdigest()
+        index.save()
+        index = HashIndex(str(tmpdir.join('index'))).load()
+        assert index.etag(str(path)) == etag
+        assert (index.hits, index.misses) == (1, 0)
+        path.write('hello world')
+        assert index.etag(str(path)) == hashlib.md5(
+            b'hello world').hexdigest()
+        assert index.misses == 1
+
+    def test_file_etag_workers(self, tmpdir):
+        data = os.urandom(3 * MB + 17)
+        path = tmpdir.join('f.bin')
+        path.write_binary(data)
+        etag = file_etag(str(path), MB, workers=4)
+        assert etag == file_etag(str(path), MB, workers=1)
+        assert etag.endswith('-4')
+        tmpdir.join('empty').write('')
+        assert file_etag(str(tmpdir.join('empty')), MB) == (
+            hashlib.md5().hexdigest())
+
+    def test_etag_per_part_size(self, tmpdir, mocker):
+        path = tmpdir.join('f.bin')
+        path.write_binary(b'x' * 100)
+        index = HashIndex(str(tmpdir.join('index')))
+        spy = mocker.spy(hashindex, 'file_etag')
+        assert index.etag(str(path), 64).endswith('-2')
+        assert index.md5(str(path)) == hashlib.md5(b'x' * 100).hexdigest()
+        assert index.etag(str(path), 64).endswith('-2')
+        assert index.md5(str(path)) == hashlib.md5(b'x' * 100).hexdigest()
+        assert (index.hits, index.misses) == (2, 2)
+        assert spy.call_args_list == [mocker.call(str(path), 64),
+                                      mocker.call(str(path), 0)]
+
+    def test_replaced_file_rehashed(self, tmpdir):
+        path = tmpdir.join('f.txt')
+        path.write('aaaa')
+        index = HashIndex(str(tmpdir.join('index')))
+        index.etag(str(path))
+        st = os.stat(str(path))
+        tmpdir.join('g.txt').write('bbbb')
+        os.utime(str(tmpdir.join('g.txt')), ns=(st.st_atime_ns,
+                                                st.st_mtime_ns))
+        os.replace(str(tmpdir.join('g.txt')), str(path))
+        assert index.etag(str(path)) == hashlib.md5(b'bbbb').hexdigest()
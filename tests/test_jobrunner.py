@@ -0,0 +1,31 @@
+import sys
+import logging
+from ecsopera.jobrunner import run_jobs, job_logger, log_job_summary
+from ecsopera.loghelper import LogHelper
+
+
+class TestJobRunner(object):
+
+    def fail(self):
+        raise SystemExit('Job Cancelled...Exit')
+
+    def test_run_jobs(self):
+        jobs = [('ok', lambda: 1), ('fail', self.fail), ('ok2', lambda: 2)]
+        results = run_jobs(jobs, 2)
+        assert [r.name for r in results] == ['ok', 'fail', 'ok2']
+        assert [r.ok for r in results] == [True, False, True]
+        assert [r.value for r in results] == [1, None, 2]
+        assert isinstance(results[1].error, SystemExit)
+
+    def test_run_no_jobs(self):
+        assert run_jobs([], 4) == []
+
+    def test_job_logger(self):
+        log = LogHelper(stream=sys.stdout, level=logging.INFO,
+                        fmt='%(levelname)s %(message)s')
+        log.cmdname = 'aws-ecs-deploy-batch:'
+        jlog = job_logger(log, 'service')
+        assert jlog.cmdname == 'aws-ecs-deploy-batch: [service]'
+        assert log.cmdname == 'aws-ecs-deploy-batch:'
+        results = run_jobs([('ok', lambda: 1), ('fail', self.fail)], 2)
+        assert log_job_summary(results, log) == 1
@@ -0,0 +1,32 @@
+from ecsopera.journal import RolloutJournal
+
+
+class TestRolloutJournal(object):
+
+    def test_record_and_load(self, tmpdir):
+        path = str(tmpdir.join('rollout.journal'))
+        journal = RolloutJournal(path)
+        assert journal.load() == []
+        journal.record('discovered', cinstances=['arn-1'])
+        journal.record('terminated', instance='i-1')
+        journal.record('terminated', instance='i-2')
+        resumed = RolloutJournal(path)
+        assert len(resumed.load()) == 3
+        assert resumed.get('discovered')['cinstances'] == ['arn-1']
+        assert [e['instance'] for e in resumed.all('terminated')] == [
+            'i-1', 'i-2']
+        assert resumed.done('terminated')
+        assert not resumed.done('old-asgs-deleted')
+        resumed.remove()
+        assert not resumed.exists()
+
+    def test_load_truncates_torn_line(self, tmpdir):
+        path = tmpdir.join('rollout.journal')
+        journal = RolloutJournal(str(path))
+        journal.record('lc-copied')
+        path.write('{"step": "asgs-rep', mode='a')
+        resumed = RolloutJournal(str(path))
+        assert [e['step'] for e in resumed.load()] == ['lc-copied']
+        resumed.record('asgs-repointed')
+        assert [e['step'] for e in RolloutJournal(str(path)).load()] == [
+            'lc-copied', 'asgs-repointed']
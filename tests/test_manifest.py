@@ -0,0 +1,137 @@
+import sys
+import logging
+import threading
+import pytest
+from ecsopera.loghelper import LogHelper
+from ecsopera.manifest import (load_manifest, validate_manifest, build_waves,
+                               run_manifest)
+
+MANIFEST = """
+maxworkers: 4
+steps:
+  - name: ami-prod
+    type: ecs-amiupdate
+    cluster: prod
+    launchcfg: prod-lc
+    ami: ami-1234abcd
+  - name: api
+    type: ecs-deploy
+    cluster: prod
+    service: api
+    image: repo/api:1.2
+    depends_on: [ami-prod]
+  - name: worker
+    type: ecs-deploy
+    cluster: prod
+    service: worker
+    image: repo/worker:1.2
+    depends_on: [ami-prod]
+  - name: static
+    type: s3-deploy
+    source: ./dist
+    destination: s3://static-bucket
+  - name: smoke
+    type: ecs-deploy
+    cluster: prod
+    service: smoke
+    image: repo/smoke:1.2
+    depends_on: [api, static]
+"""
+
+
+class TestManifest(object):
+
+    def logger(self):
+        return LogHelper(stream=sys.stdout, level=logging.INFO,
+                         fmt='%(levelname)s %(message)s')
+
+    def manifest(self, tmpdir):
+        path = tmpdir.join('manifest.yml')
+        path.write(MANIFEST)
+        return load_manifest(str(path))
+
+    def test_build_waves(self, tmpdir):
+        assert build_waves(self.manifest(tmpdir)['steps']) == [
+            ['ami-prod', 'static'], ['api', 'worker'], ['smoke']]
+
+    @pytest.mark.parametrize('steps', [
+        [],
+        [{'name': 'a', 'type': 'unknown'}],
+        [{'name': 'a', 'type': 's3-deploy', 'source': '.'}],
+        [{'name': 'a', 'type': 'ecs-amiupdate', 'cluster': 'c',
+          'ami': 'ami-1234abcd'}],
+        [{'name': 'a', 'type': 'ecs-amiupdate', 'cluster': 'c',
+          'launchcfg': 'lc', 'launchtemplate': 'lt', 'ami': 'ami-1234abcd'}],
+        [{'name': 'a', 'type': 's3-deploy', 'source': '.',
+          'destination': 's3://b', 'depends_on': ['missing']}],
+        [{'name': 'a', 'type': 's3-deploy', 'source': '.',
+          'destination': 's3://b'},
+         {'name': 'b', 'type': 's3-deploy', 'source': '.',
+          'destination': 's3://b', 'depends_on': 'a'}],
+        [{'name': 'a', 'type': 's3-deploy', 'source': '.',
+          'destination': 's3://b', 'depends_on': ['b']},
+         {'name': 'b', 'type': 's3-deploy', 'source': '.',
+          'destination': 's3://b', 'depends_on': ['a']}],
+        [{'name': 'a', 'type': 's3-deploy', 'source': '.',
+          'destination': 's3://b'},
+         {'name': 'a', 'type': 's3-deploy', 'source': '.',
+          'destination': 's3://b'}],
+    ])
+    def test_validate_manifest(self, steps):
+        with pytest.raises(ValueError):
+            validate_manifest({'steps': steps})
+
+    @pytest.mark.parametrize('maxworkers', [0, -1, 'ten', True])
+    def test_validate_manifest_maxworkers(self, maxworkers):
+        with pytest.raises(ValueError):
+            validate_manifest({'maxworkers': maxworkers, 'steps': [
+                {'name': 'a', 'type': 's3-deploy', 'source': '.',
+                 'destination': 's3://b'}]})
+
+    def test_validate_manifest_shared_launchcfg(self):
+        step = {'type': 'ecs-amiupdate', 'launchcfg': 'lc',
+                'ami': 'ami-1234abcd'}
+        steps = [dict(step, name='a', cluster='c1'),
+                 dict(step, name='b', cluster='c2')]
+        with pytest.raises(ValueError):
+            validate_manifest({'steps': steps})
+        steps[1]['region'] = 'us-east-1'
+        validate_manifest({'steps': steps})
+
+    def test_run_manifest_ready_queue(self, tmpdir):
+        started = threading.Event()
+
+        def _run(step, log):
+            if step['name'] == 'static':
+                # ready steps must not wait for static to finish.
+                assert started.wait(5)
+            if step['name'] == 'api':
+                started.set()
+
+        runners = {'ecs-deploy': _run, 'ecs-amiupdate': _run,
+                   's3-deploy': _run}
+        results = run_manifest(self.manifest(tmpdir), runners, 4,
+                               self.logger())
+        assert [r.name for r in results] == ['ami-prod', 'api', 'worker',
+                                             'static', 'smoke']
+        assert all(r.ok for r in results)
+
+    def test_run_manifest(self, tmpdir):
+        ran = []
+        lock = threading.Lock()
+
+        def _run(step, log):
+            with lock:
+                ran.append(step['name'])
+            if step['name'] == 'api':
+                raise SystemExit('Deployment rolled back....')
+
+        runners = {'ecs-deploy': _run, 'ecs-amiupdate': _run,
+                   's3-deploy': _run}
+        results = run_manifest(self.manifest(tmpdir), runners, 4,
+                               self.logger())
+        outcome = dict((r.name, r.ok) for r in results)
+        assert outcome == {'ami-prod': True, 'static': True, 'api': False,
+                           'worker': True, 'smoke': False}
+        assert 'smoke' not in ran
+        assert sorted(ran[:2]) == ['ami-prod', 'static']
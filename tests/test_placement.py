@@ -0,0 +1,58 @@
+import pytest
+from ecsopera.placement import (resource_value, task_requirements,
+                                simulate_placement)
+
+
+def container_instance(cpu, memory, ports=()):
+    return {'remainingResources': [
+        {'name': 'CPU', 'type': 'INTEGER', 'integerValue': cpu},
+        {'name': 'MEMORY', 'type': 'INTEGER', 'integerValue': memory},
+        {'name': 'PORTS', 'type': 'STRINGSET',
+         'stringSetValue': [str(p) for p in ports]}]}
+
+
+class TestPlacement(object):
+
+    def test_resource_value(self):
+        resources = container_instance(1024, 2048, [22])['remainingResources']
+        assert resource_value(resources, 'CPU') == 1024
+        assert resource_value(resources, 'PORTS') == ['22']
+        assert resource_value(resources, 'PORTS_UDP') is None
+
+    @pytest.mark.parametrize('taskdef,expected', [
+        ({'containerDefinitions': [
+            {'cpu': 128, 'memory': 256,
+             'portMappings': [{'containerPort': 80, 'hostPort': 8080}]},
+            {'cpu': 64, 'memoryReservation': 64,
+             'portMappings': [{'containerPort': 9000, 'hostPort': 0}]}]},
+         (192, 320, (8080,))),
+        ({'networkMode': 'host', 'cpu': '512', 'memory': '1024',
+          'containerDefinitions': [
+              {'portMappings': [{'containerPort': 80}]}]},
+         (512, 1024, (80,))),
+        ({'networkMode': 'awsvpc', 'cpu': '256', 'memory': '512',
+          'containerDefinitions': [
+              {'portMappings': [{'containerPort': 80, 'hostPort': 80}]}]},
+         (256, 512, ())),
+    ])
+    def test_task_requirements(self, taskdef, expected):
+        assert task_requirements(taskdef) == expected
+
+    def test_simulate_placement(self):
+        fleet = [container_instance(1024, 4096, [22, 80]),
+                 container_instance(1024, 4096, [22])]
+        plan = simulate_placement(fleet, [(256, 512, ())] * 6 +
+                                  [(128, 128, (80,))] * 2)
+        assert plan.fleetsize == 2
+        assert plan.cpu == 2048
+        assert plan.placed == {(256, 512, ()): 6, (128, 128, (80,)): 1}
+        assert plan.unplaced == {(128, 128, (80,)): 1}
+        assert not plan.fits
+        assert plan.unplaced_count == 1
+
+    def test_simulate_placement_fits(self):
+        fleet = [container_instance(4096, 16384) for _ in range(100)]
+        plan = simulate_placement(fleet, [(128, 256, ())] * 3000 +
+                                  [(0, 128, (8080,))] * 100)
+        assert plan.fits
+        assert simulate_placement([], []).fits
@@ -0,0 +1,63 @@
+import pytest
+from ecsopera.poller import Poller
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.sleeps.append(secs)
+        self.now += secs
+
+
+class TestPoller(object):
+
+    def poller(self, fake, timeout=60, **kwargs):
+        return Poller(timeout, clock=fake.clock, sleep=fake.sleep, **kwargs)
+
+    def test_poll_success(self):
+        fake = FakeClock()
+        results = iter([False, False, True])
+        poller = self.poller(fake, jitter=0)
+        assert poller.poll(lambda: next(results)) is True
+        assert poller.polls == 3
+        assert fake.sleeps == [2, 3]
+
+    def test_poll_timeout(self):
+        fake = FakeClock()
+        poller = self.poller(fake, timeout=60, jitter=0)
+        assert poller.poll(lambda: False) is False
+        assert poller.elapsed == 60
+        assert max(fake.sleeps) == 15
+
+    def test_poll_abort(self):
+        fake = FakeClock()
+        poller = self.poller(fake)
+        assert poller.poll(lambda: False, abort=lambda: True) is False
+        assert poller.aborted
+        assert fake.sleeps == []
+
+    def test_poll_jitter(self):
+        fake = FakeClock()
+        poller = self.poller(fake, interval=10, maxinterval=10, jitter=0.2)
+        poller.poll(lambda: False)
+        assert all(0 <= s <= 12 for s in fake.sleeps)
+
+    def test_ontick(self):
+        fake = FakeClock()
+        ticks = []
+        results = iter([False, False, True])
+        poller = self.poller(fake, jitter=0)
+        poller.poll(lambda: next(results), ontick=ticks.append)
+        assert ticks == [0, 2]
+
+    @pytest.mark.parametrize('interval, maxinterval', [(0, 10), (10, 5)])
+    def test_bad_intervals(self, interval, maxinterval):
+        with pytest.raises(ValueError):
+            Poller(60, interval=interval, maxinterval=maxinterval)
@@ -0,0 +1,99 @@
+import gzip
+import os
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from ecsopera.hashindex import HashIndex
+from ecsopera.precompress import (Precompressor, compress_file,
+                                  compressible)
+from ecsopera.s3pipeline import walk_files
+
+
+class TestPrecompress(object):
+
+    def write_site(self, tmpdir):
+        site = tmpdir.mkdir('site')
+        site.join('app.js').write('var a = 1;\n' * 500)
+        site.join('style.css').write('a{}')
+        site.join('logo.png').write_binary(b'\x89PNG' * 500)
+        site.join('random.txt').write_binary(os.urandom(4096))
+        site.join('dist.tar.gz').write_binary(b'x' * 4096)
+        return site
+
+    def stage(self, tmpdir, mocker, encoding='gzip'):
+        site = tmpdir.join('site')
+        precompressor = Precompressor(encoding, str(tmpdir.join('cache')),
+                                      HashIndex(str(tmpdir.join('index'))),
+                                      mocker.Mock(), workers=2)
+        files = dict((f[1], f) for f in precompressor.stage(
+            walk_files(str(site))))
+        return precompressor, files
+
+    def test_compressible(self):
+        assert compressible('text/html')
+        assert compressible('image/svg+xml')
+        assert not compressible('image/png')
+        assert not compressible(None)
+
+    def test_stage(self, tmpdir, mocker):
+        site = self.write_site(tmpdir)
+        precompressor, files = self.stage(tmpdir, mocker)
+        assert (precompressor.compressed, precompressor.cached) == (2, 0)
+        localp, _, size, extra = files['app.js']
+        assert extra['ContentEncoding'] == 'gzip'
+        assert extra['ContentType'].endswith('/javascript')
+        assert size == os.path.getsize(localp) < 5500
+        with gzip.open(localp) as f:
+            assert f.read() == site.join('app.js').read_binary()
+        assert files['style.css'][3] == {'ContentType': 'text/css'}
+        assert files['logo.png'][3] == {'ContentType': 'image/png'}
+        assert files['random.txt'][0] == str(site.join('random.txt'))
+        assert files['random.txt'][3] == {'ContentType': 'text/plain'}
+        assert files['dist.tar.gz'][3] == {}
+
+    def test_stage_cached(self, tmpdir, mocker):
+        self.write_site(tmpdir)
+        self.stage(tmpdir, mocker)
+        compress = mocker.patch('ecsopera.precompress.compress_file')
+        precompressor, files = self.stage(tmpdir, mocker)
+        assert not compress.called
+        assert (precompressor.compressed, precompressor.cached) == (0, 2)
+        assert files['app.js'][3]['ContentEncoding'] == 'gzip'
+        assert 'ContentEncoding' not in files['random.txt'][3]
+
+    def test_stage_submits_eagerly(self, tmpdir, mocker):
+        site = self.write_site(tmpdir)
+        precompressor = Precompressor('gzip', str(tmpdir.join('cache')),
+                                      HashIndex(str(tmpdir.join('index'))),
+                                      mocker.Mock(), workers=2)
+        submitted = []
+
+        class Pool(ThreadPoolExecutor):
+            def submit(self, func, *args):
+                submitted.append(args[0])
+                return super(Pool, self).submit(func, *args)
+
+        mocker.patch('ecsopera.precompress.ProcessPoolExecutor', Pool)
+        staged = precompressor.stage(walk_files(str(site)))
+        assert sorted(os.path.basename(p) for p in submitted) == [
+            'app.js', 'random.txt']
+        assert len(list(staged)) == 5
+        assert precompressor.compressed == 2
+
+    def test_stage_same_content(self, tmpdir, mocker):
+        site = self.write_site(tmpdir)
+        site.join('vendor').mkdir().join('app.js').write(
+            site.join('app.js').read())
+        compress = mocker.patch('ecsopera.precompress.compress_file',
+                                wraps=compress_file)
+        mocker.patch('ecsopera.precompress.ProcessPoolExecutor',
+                     ThreadPoolExecutor)
+        precompressor, files = self.stage(tmpdir, mocker)
+        assert compress.call_count == 2
+        assert (precompressor.compressed, precompressor.cached) == (2, 1)
+        assert files['vendor/app.js'][0] == files['app.js'][0]
+        assert files['vendor/app.js'][3]['ContentEncoding'] == 'gzip'
+
+    def test_brotli_missing(self, tmpdir, mocker):
+        mocker.patch('ecsopera.precompress.brotli', None)
+        with pytest.raises(SystemExit):
+            Precompressor('br', str(tmpdir), None, mocker.Mock())
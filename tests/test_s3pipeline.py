@@ -0,0 +1,99 @@
+import pytest
+from botocore.exceptions import ClientError
+from ecsopera.s3pipeline import (TransferProgress,
+                                 dedup_files,
+                                 delete_keys,
+                                 iter_batches,
+                                 same_object,
+                                 walk_files,
+                                 MB)
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestS3Pipeline(object):
+
+    def test_walk_files(self, tmpdir):
+        tmpdir.join('a', 'b.txt').write('abc', ensure=True)
+        tmpdir.join('c.txt').write('')
+        assert sorted((k, s) for _, k, s in walk_files(str(tmpdir))) == [
+            ('a/b.txt', 3), ('c.txt', 0)]
+
+    def test_transfer_progress(self, mocker):
+        log = mocker.Mock()
+        clock = FakeClock()
+        progress = TransferProgress(3, 3 * MB, log, interval=5, clock=clock)
+        progress.add(transferred=MB)
+        progress.add(done=1)
+        assert log.info.call_count == 0
+        clock.now = 6
+        progress.add(transferred=2 * MB, done=2)
+        assert log.info.call_count == 1
+        assert progress.done == 3
+        assert progress.transferred == 3 * MB
+        assert 'Uploaded 3/3 objects, 3.0/3.0 MiB' in log.info.call_args[0][0]
+
+    def test_raise_failed(self, mocker):
+        log = mocker.Mock()
+        progress = TransferProgress(None, None, log, verb='Copied')
+        progress.raise_failed()
+        for i in range(12):
+            progress.fail('k{0}'.format(i), ValueError(i))
+        with pytest.raises(ValueError):
+            progress.raise_failed()
+        assert log.error.call_count == 11
+        progress.log_progress()
+        assert 'Copied 0 objects, 0.0 MiB' in log.info.call_args[0][0]
+
+    def test_iter_batches(self):
+        assert list(iter_batches(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+        assert list(iter_batches([], 2)) == []
+
+    def test_delete_keys(self, mocker):
+        client = mocker.Mock()
+        client.delete_objects.return_value = {}
+        progress = delete_keys(client, 'b', ('k{0}'.format(i)
+                                             for i in range(2001)),
+                               4, mocker.Mock())
+        assert progress.done == 2001
+        sizes = sorted(len(c[1]['Delete']['Objects'])
+                       for c in client.delete_objects.call_args_list)
+        assert sizes == [1, 1000, 1000]
+
+    def test_delete_keys_errors(self, mocker):
+        client = mocker.Mock()
+        client.delete_objects.return_value = {'Errors': [
+            {'Key': 'k1', 'Code': 'AccessDenied', 'Message': 'denied'}]}
+        with pytest.raises(ClientError):
+            delete_keys(client, 'b', ['k0', 'k1'], 2, mocker.Mock())
+
+    def test_dedup_files(self):
+        files = [('/a', 'a.woff', 3, {'ContentType': 'font/woff'}),
+                 ('/b', 'vendor/a.woff', 3, {'ContentType': 'font/woff'}),
+                 ('/c', 'c.txt', 3, {'ContentType': 'text/plain'}),
+                 ('/d', 'd.txt', 3)]
+        digests = {'/a': 'x', '/b': 'x', '/c': 'x', '/d': 'y'}
+        unique, copies = dedup_files(files,
+                                     lambda p, size: digests[p])
+        assert [f[1] for f in unique] == ['a.woff', 'c.txt', 'd.txt']
+        assert copies == [('vendor/a.woff', 3, 'x', 'a.woff',
+                           {'ContentType': 'font/woff'})]
+
+    @pytest.mark.parametrize('src, dst, copied, expected', [
+        (('"abc"', 3), ('"abc"', 3), None, True),
+        (('"abc"', 3), ('"abd"', 3), None, False),
+        (('"abc"', 3), ('"abc"', 4), None, False),
+        (('"abc"', 3), None, None, False),
+        (('"abc"', 9 * MB), ('"def-2"', 9 * MB), None, False),
+        (('"abc"', 9 * MB), ('"def-2"', 9 * MB), 'abc', True),
+        (('"abc-3"', 9 * MB), ('"def-2"', 9 * MB), 'abc-2', False),
+    ])
+    def test_same_object(self, src, dst, copied, expected):
+        assert same_object(src, dst, copied) is expected